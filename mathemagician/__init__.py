@@ -3,17 +3,114 @@ from sys import version_info
 if version_info < (3, 12):
     raise RuntimeError('mathemagician requires Python 3.12')
 
-from .path import path_init
-path_init()
-
-__all__ = []
-__modules__ = [
-    'achievements', 'cliengine', 'datatype', 'entities', 'game', 'items',
-    'path', 'profile', 'util',
-]
-
-for module_name in __modules__:
-    module = __import__(f'mathemagician.{module_name}', fromlist=['*'])
-    __all__.extend(module.__all__)
-    for name in module.__all__:
-        globals()[name] = module.__dict__[name]
+from importlib import import_module
+
+# Public names of each module, imported lazily on first attribute access.
+# Keep in sync with the __all__ of each module.
+__exports__ = {
+    'achievements': [
+        'Acheivement', 'AchievementDefinition', 'AchievementTracker',
+        'load_achievements',
+    ],
+    'autosave': ['AutosaveScheduler'],
+    'bench': [
+        'BENCHMARKS', 'benchmark', 'time_benchmark', 'run_benchmark',
+        'run_benchmarks', 'compare_results', 'print_results',
+    ],
+    'cliengine': ['parse_value', 'CliEngine'],
+    'datapack': [
+        'PACK_MAGIC', 'PACK_VERSION', 'PACK_HEADER', 'PACK_NAME',
+        'build_pack', 'read_pack_header',
+    ],
+    'datatype': ['DataType', 'Variable'],
+    'entities': [
+        'Field', 'Component', 'Health', 'Attack', 'Damage', 'Poison',
+        'Regeneration', 'COMPONENTS', 'WorldState', 'World',
+        'deal_damage', 'attack_with_answer',
+        'damage_system', 'status_system', 'death_system', 'tick',
+    ],
+    'events': ['EVENT_TYPES', 'Event', 'EventBus'],
+    'evaluator': [
+        'ExpressionError', 'SandboxError',
+        'compile_expression', 'evaluate_expression',
+        'SandboxPool', 'get_sandbox',
+    ],
+    'game': ['Game'],
+    'instrument': [
+        'SECTIONS', 'Histogram', 'Recorder',
+        'enable', 'disable', 'configure', 'get_recorder', 'timed', 'capture',
+        'stats_rows', 'export_stats', 'print_stats',
+    ],
+    'items': ['Item', 'Empty'],
+    'loadtest': [
+        'DEFAULT_COMMANDS', 'percentile', 'run_player', 'run_load_test',
+        'print_report',
+    ],
+    'locks': ['LockError', 'ProfileLock', 'lock_holder'],
+    'memstats': [
+        'MemorySnapshot', 'enable', 'disable', 'configure', 'is_enabled',
+        'instance_counts', 'take_snapshot', 'subsystem_sizes', 'top_sites',
+        'compare_snapshots', 'print_report', 'print_diff',
+    ],
+    'numbertheory': [
+        'SPF_LIMIT', 'Sieve', 'get_sieve',
+        'primes_up_to', 'primes_between', 'nth_prime',
+        'is_prime', 'smallest_prime_factor', 'factorize', 'divisors',
+        'totient', 'divisor_sum', 'gcd', 'lcm',
+        'is_prime_many', 'factorize_many', 'totient_many', 'divisor_sum_many',
+        'gcd_many', 'lcm_many',
+    ],
+    'path': [
+        'MAIN_DIR', 'PROFILES_DIR', 'EXPORTS_DIR', 'DATA_DIR', 'DATA_PACK', 'SETTINGS_JSON',
+        'path_init',
+        'has_data', 'read_data', 'load_data', 'view_data',
+        'has_file', 'read_file', 'load_file', 'write_file', 'dump_file',
+    ],
+    'problems': [
+        'TOPICS', 'DIFFICULTIES', 'Problem', 'ProblemBank',
+        'problem_seed', 'generate_problems',
+    ],
+    'profile': ['Profile', 'ProfileInstance'],
+    'screen': ['Screen'],
+    'server': ['DEFAULT_PORT', 'Session', 'Server', 'serve'],
+    'shortcuts': ['Shortcuts', 'add_shortcut_commands'],
+    'stats': [
+        'STATS_JSON', 'STATS_LOG', 'STATS_LOCK', 'METRICS',
+        'ProfileStats', 'Leaderboard', 'StatsIndex', 'get_stats',
+    ],
+    'terminal': ['RESET_COLOR', 'TerminalWriter'],
+    'util': [
+        'is_type', 'interrupt_safe',
+        'print_text', 'print_prompt', 'print_command', 'print_title',
+        'print_success', 'print_error', 'print_warning', 'print_info',
+        'load_color', 'load_color_scheme', 'get_settings', 'save_settings',
+        'COLOR_SCHEME',
+        'clear', 'clear_color', 'get_color', 'get_writer', 'set_writer',
+        'flush_output', 'set_session', 'in_session', 'read_line',
+    ],
+    'views': ['View', 'InventoryView', 'StatusView'],
+}
+__modules__ = [*__exports__]
+__all__ = [name for names in __exports__.values() for name in names]
+
+_export_modules = {name: module_name
+                   for module_name, names in __exports__.items()
+                   for name in names}
+
+
+def __getattr__(name: str):
+    """Import modules and their public names on first access."""
+    if name in __exports__:
+        return import_module(f'mathemagician.{name}')
+    if name in _export_modules:
+        module = import_module(f'mathemagician.{_export_modules[name]}')
+        value = getattr(module, name)
+        # COLOR_SCHEME is loaded lazily, so it is not cached here.
+        if name != 'COLOR_SCHEME':
+            globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__() -> list[str]:
+    return [*globals(), *__modules__, *__all__]
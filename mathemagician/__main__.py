@@ -1,23 +1,72 @@
-from sys import version_info
+from sys import argv, executable, version_info
 
 if version_info < (3, 12):
     raise RuntimeError('mathemagician requires Python 3.12')
 
-from .path import path_init
-path_init()
+from os import environ
+from pathlib import Path
+from subprocess import run
+from tempfile import TemporaryDirectory
 
 from .game import Game
 from .profile import ProfileInstance
 
+# Modules that library users and batch tools import on their own,
+# with the import-time budget for each in milliseconds.
+IMPORT_BUDGETS = {
+    'mathemagician': 10,
+    'mathemagician.datatype': 25,
+    'mathemagician.myjson': 40,
+}
+
 
 def main():
     game = Game()
     game.run()
 
 
+def check_import_time(module_name: str, budget: float) -> bool:
+    """
+    Import a module in a fresh interpreter with an empty home directory.
+    Return whether the import fits the budget without creating the main
+    directory.
+    """
+    code = ('from time import perf_counter\n'
+            'start = perf_counter()\n'
+            f'import {module_name}\n'
+            'print((perf_counter() - start) * 1000)\n')
+    with TemporaryDirectory() as home:
+        env = {**environ, 'HOME': home, 'USERPROFILE': home}
+        result = run([executable, '-c', code], env=env, capture_output=True,
+                     text=True, cwd=Path(__file__).parent.parent)
+        touched_home = (Path(home) / 'mathemagician').exists()
+    if result.returncode != 0:
+        print(f'FAIL {module_name}: import failed\n{result.stderr}')
+        return False
+    elapsed = float(result.stdout.split()[-1])
+    if touched_home:
+        print(f'FAIL {module_name}: import created the main directory')
+        return False
+    if elapsed > budget:
+        print(f'FAIL {module_name}: {elapsed:.1f}ms > {budget}ms')
+        return False
+    print(f'ok   {module_name}: {elapsed:.1f}ms <= {budget}ms')
+    return True
+
+
 def test():
-    pass
+    passed = True
+    for module_name, budget in IMPORT_BUDGETS.items():
+        passed &= check_import_time(module_name, budget)
+    if not passed:
+        raise SystemExit(1)
 
 
 if __name__ == '__main__':
-    main()
+    if argv[1:] == ['test']:
+        test()
+    elif argv[1:2] == ['serve']:
+        from .server import main as serve
+        serve(argv[2:])
+    else:
+        main()
@@ -1,10 +1,25 @@
 """
-Achievements module, used to store acheivement data.
+Achievements module, used to store acheivement data and track progress.
+
+Achievement definitions are loaded from data/achievements.json. Each one
+counts an event type, optionally only events whose data matches a filter,
+and is earned once its counter reaches a threshold. Definitions sharing a
+counter are kept sorted by threshold and indexed by event type, so an event
+only touches the counters that could unlock something.
 """
 
+from time import time
+from types import FunctionType
+
 from .datatype import DataType, Variable
+from .events import EVENT_TYPES, Event, EventBus
+from .path import load_data
+from .util import print_warning
 
-__all__ = ['Acheivement']
+__all__ = [
+    'Acheivement', 'AchievementDefinition', 'AchievementTracker',
+    'load_achievements',
+]
 
 
 class Acheivement(DataType):
@@ -21,3 +36,139 @@ class Acheivement(DataType):
         Variable('name', str, lambda: 'AcheivementName'),
         Variable('timestamp', int, lambda: 0),
     ]
+
+
+class AchievementDefinition(DataType):
+    """
+    Achievement definition data type, used to describe how to earn one.
+
+    Variables:
+        id: str
+            The identifier of the achievement, stored when it is earned.
+        name: str
+            The name of the achievement.
+        description: str
+            How to earn the achievement.
+        event: str
+            The event type counted for the achievement.
+        threshold: int
+            The count needed to earn the achievement.
+        filter: dict
+            Event data that must match for an event to be counted.
+    """
+    variables = [
+        Variable('id', str),
+        Variable('name', str),
+        Variable('description', str, lambda: ''),
+        Variable('event', str),
+        Variable('threshold', int, lambda: 1),
+        Variable('filter', dict, lambda: {}),
+    ]
+
+    @property
+    def counter(self) -> str:
+        """The key of the progress counter of the achievement."""
+        if not self.filter:
+            return self.event
+        conditions = ','.join(f'{key}={value}'
+                              for key, value in sorted(self.filter.items()))
+        return f'{self.event}[{conditions}]'
+
+
+_definitions = None
+
+
+def load_achievements() -> list[AchievementDefinition]:
+    """Load the achievement definitions on first use."""
+    global _definitions
+    if _definitions is None:
+        _definitions = []
+        for data in load_data('achievements.json') or []:
+            if not AchievementDefinition.is_valid(data):
+                print_warning(f'Invalid achievement: {data}')
+                continue
+            definition = AchievementDefinition.load(data)
+            if definition.event not in EVENT_TYPES:
+                print_warning(f'Invalid event for achievement'
+                              f' {definition.id}: {definition.event}')
+                continue
+            _definitions.append(definition)
+    return _definitions
+
+
+class _Counter:
+    """Progress counter shared by the definitions with the same key."""
+    __slots__ = ('key', 'filter', 'pending', 'next')
+
+    def __init__(self, key: str, filter_: dict,
+                 pending: list[AchievementDefinition]):
+        self.key = key
+        self.filter = [*filter_.items()]
+        self.pending = sorted(pending, key=lambda definition: definition.threshold)
+        self.next = 0
+
+
+class AchievementTracker:
+    """
+    Achievement tracker, used to keep progress counters and earn achievements.
+
+    Variables:
+        progress: dict[str, int]
+            The progress counters, updated in place.
+        earned: list[Acheivement]
+            The earned achievements, appended to in place.
+        on_unlock: FunctionType | None
+            Called with the definition of each newly earned achievement.
+    """
+    progress: dict[str, int]
+    earned: list[Acheivement]
+    on_unlock: FunctionType | None
+
+    def __init__(self, definitions: list[AchievementDefinition],
+                 progress: dict[str, int], earned: list[Acheivement],
+                 on_unlock: FunctionType | None = None):
+        self.progress = progress
+        self.earned = earned
+        self.on_unlock = on_unlock
+        self.definitions = {definition.id: definition for definition in definitions}
+        earned_ids = {achievement.name for achievement in earned}
+        groups: dict[str, list[AchievementDefinition]] = {}
+        for definition in definitions:
+            if definition.id not in earned_ids:
+                groups.setdefault(definition.counter, []).append(definition)
+        self.index: dict[str, list[_Counter]] = {}
+        for key, pending in groups.items():
+            counter = _Counter(key, pending[0].filter, pending)
+            self.index.setdefault(pending[0].event, []).append(counter)
+
+    def attach(self, bus: EventBus):
+        """Subscribe to the event types that can earn achievements."""
+        for type_ in self.index:
+            bus.subscribe(type_, self.handle)
+
+    def handle(self, event: Event):
+        """Count an event and earn the achievements it completes."""
+        counters = self.index.get(event.type)
+        if not counters:
+            return
+        data = event.data
+        finished = False
+        for counter in counters:
+            if any(data.get(key) != value for key, value in counter.filter):
+                continue
+            value = self.progress.get(counter.key, 0) + event.amount
+            self.progress[counter.key] = value
+            pending = counter.pending
+            while counter.next < len(pending) and pending[counter.next].threshold <= value:
+                self.unlock(pending[counter.next])
+                counter.next += 1
+            finished |= counter.next == len(pending)
+        if finished:
+            self.index[event.type] = [counter for counter in counters
+                                      if counter.next < len(counter.pending)]
+
+    def unlock(self, definition: AchievementDefinition):
+        """Earn an achievement."""
+        self.earned.append(Acheivement(definition.id, int(time())))
+        if self.on_unlock is not None:
+            self.on_unlock(definition)
@@ -0,0 +1,149 @@
+"""
+Autosave scheduler, used to save profiles in the background.
+
+Changes are counted as they are made, and a save is only made when there
+are unsaved changes. A save becomes due once the interval has passed since
+the last save, and is then made as soon as no command has run for the idle
+time, so a burst of changes is coalesced into one save. Piling up enough
+changes makes a save due right away.
+"""
+
+from contextvars import copy_context
+from threading import Condition, Lock, RLock, Thread
+from time import monotonic
+from types import FunctionType
+
+from .util import print_warning
+
+__all__ = ['AutosaveScheduler']
+
+
+class AutosaveScheduler:
+    """
+    Autosave scheduler, used to save data on a background thread.
+
+    Variables:
+        lock: RLock
+            The lock held while the data is changed, taken for snapshots.
+        snapshot: FunctionType
+            Function returning a copy of the data to save.
+        write: FunctionType
+            Function writing a snapshot to storage.
+        interval: float
+            The minimum time between autosaves in seconds, 0 to disable.
+        idle: float
+            The time without commands to wait for before saving in seconds.
+        max_changes: int
+            The number of changes that makes a save due, 0 to disable.
+    """
+    lock: RLock
+    snapshot: FunctionType
+    write: FunctionType
+    interval: float
+    idle: float
+    max_changes: int
+
+    def __init__(self, lock: RLock, snapshot: FunctionType, write: FunctionType,
+                 interval: float = 60, idle: float = 5, max_changes: int = 20):
+        self.lock = lock
+        self.snapshot = snapshot
+        self.write = write
+        self.interval = interval
+        self.idle = idle
+        self.max_changes = max_changes
+        self.condition = Condition()
+        self.save_lock = Lock()
+        self.version = 0
+        self.saved_version = 0
+        self.last_save = monotonic()
+        self.last_activity = monotonic()
+        self.running = False
+        self.thread = None
+
+    @property
+    def dirty(self) -> bool:
+        """Whether there are unsaved changes."""
+        return self.version != self.saved_version
+
+    def start(self):
+        """Start the background thread, unless autosave is disabled."""
+        if self.interval <= 0 or self.thread is not None:
+            return
+        self.running = True
+        # The thread runs in a copy of the context, so its warnings go to
+        # the output of the session that started it.
+        self.thread = Thread(target=copy_context().run, args=(self._run,),
+                             name='autosave', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the background thread without saving."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def touch(self):
+        """Record that a command has run."""
+        with self.condition:
+            self.last_activity = monotonic()
+
+    def mark_changed(self):
+        """Record a change to the data."""
+        with self.condition:
+            self.version += 1
+            self.last_activity = monotonic()
+            self.condition.notify()
+
+    def save(self, force: bool = False) -> bool:
+        """
+        Save the data now if there are unsaved changes or if forced.
+        Return whether the data was saved.
+        """
+        with self.lock:
+            with self.condition:
+                version = self.version
+                if not force and version == self.saved_version:
+                    return False
+            data = self.snapshot()
+        # Encoding and writing happen outside the data lock. Snapshots
+        # older than the last written one are dropped.
+        with self.save_lock:
+            with self.condition:
+                if version < self.saved_version:
+                    return False
+            self.write(data)
+            with self.condition:
+                self.saved_version = version
+                self.last_save = monotonic()
+        return True
+
+    def _due_in(self) -> float | None:
+        """Return the seconds until a save is due, or None if not dirty."""
+        if not self.dirty:
+            return
+        now = monotonic()
+        if self.max_changes and self.version - self.saved_version >= self.max_changes:
+            return 0
+        due = max(self.last_save + self.interval, self.last_activity + self.idle)
+        return due - now
+
+    def _run(self):
+        """Wait for saves to become due and make them."""
+        while True:
+            with self.condition:
+                while self.running:
+                    wait = self._due_in()
+                    if wait is not None and wait <= 0:
+                        break
+                    self.condition.wait(wait)
+                else:
+                    return
+            try:
+                self.save()
+            except OSError as error:
+                print_warning(f'Autosave failed: {error}')
+                with self.condition:
+                    self.last_save = monotonic()
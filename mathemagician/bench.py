@@ -0,0 +1,371 @@
+"""
+Benchmark suite, used to measure performance work and catch regressions.
+
+Micro benchmarks time the building blocks: CliEngine.parse with many
+commands and with a compiled macro, DataType construction, load and dump,
+util.is_type, myjson.dumps on a large generated profile and factoring
+with the number theory kernel. Macro benchmarks time Profile.save and
+listing profiles over synthetic stores of several sizes. Each benchmark,
+and each size, runs in a fresh process with a fresh scratch main
+directory, so no run sees the store or caches of another, and the real
+main directory is never touched. Each benchmark is calibrated to run long
+enough to time, then repeated, keeping the best and median time per call.
+
+Usage:
+    python -m mathemagician.bench [--output FILE] [--compare FILE]
+        [--threshold FRACTION] [--filter TEXT] [--repeat N]
+        [--min-time SECONDS] [--sizes N,N,...]
+
+With --compare, the results are compared to a previous output file and
+the exit status is 1 if any benchmark got slower than the threshold.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from json import dump, load
+from multiprocessing import get_context
+from os import environ
+from platform import platform, python_version
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from types import FunctionType
+
+__all__ = [
+    'BENCHMARKS', 'benchmark', 'time_benchmark', 'run_benchmark', 'run_benchmarks',
+    'compare_results', 'print_results',
+]
+
+# Benchmarks by name, each a setup function taking the store size
+# (None for micro benchmarks) and returning the function to time.
+BENCHMARKS: dict[str, tuple[str, FunctionType]] = {}
+DEFAULT_SIZES = [10, 100, 1000]
+
+
+def benchmark(name: str, kind: str = 'micro') -> FunctionType:
+    """Decorator to add a benchmark, of kind micro or macro."""
+    def decorator(setup: FunctionType) -> FunctionType:
+        BENCHMARKS[name] = (kind, setup)
+        return setup
+    return decorator
+
+
+def _large_profile_data(items: int = 1024, achievements: int = 256,
+                        counters: int = 256) -> dict:
+    """Generate the dumped data of a large profile."""
+    from .achievements import Acheivement
+    from .items import Empty, Item
+    from .profile import Profile
+
+    profile = Profile('benchmark', 1700000000, items)
+    profile.inventory = [Item(f'item {index}') if index % 3 else Empty()
+                         for index in range(items)]
+    profile.achievements = [Acheivement(f'achievement_{index}', 1700000000 + index)
+                            for index in range(achievements)]
+    profile.progress = {f'counter_{index}': index for index in range(counters)}
+    profile.totals = {'solved': 1000, 'failed': 100}
+    return profile.dump()
+
+
+@benchmark('cliengine.parse')
+def bench_parse(size: None) -> FunctionType:
+    from .cliengine import CliEngine
+
+    class Target:
+        engine = CliEngine()
+        add_command = engine.add_command
+        parse = engine.parse
+
+    def handler(self, **kwargs):
+        pass
+
+    for index in range(200):
+        Target.add_command(f'command{index} <name> [count:int]')(handler)
+    Target.add_command('answer <answer:number>')(handler)
+    target = Target()
+    return lambda: target.parse(target, 'answer 1.5')
+
+
+@benchmark('cliengine.macro')
+def bench_macro(size: None) -> FunctionType:
+    from .cliengine import CliEngine
+    from .shortcuts import Shortcuts
+
+    class Target:
+        engine = CliEngine()
+        add_command = engine.add_command
+        parse = engine.parse
+
+    def handler(self, **kwargs):
+        pass
+
+    for index in range(200):
+        Target.add_command(f'command{index} <name> [count:int]')(handler)
+    Target.add_command('answer <answer:number>')(handler)
+    target = Target()
+    target.shortcuts = Shortcuts(Target.engine)
+    target.shortcuts.define_macro('grind', '; '.join(['answer 1.5'] * 10))
+    return lambda: target.parse(target, 'grind')
+
+
+@benchmark('datatype.construct')
+def bench_construct(size: None) -> FunctionType:
+    from .profile import Profile
+
+    return lambda: Profile('benchmark')
+
+
+@benchmark('datatype.dump')
+def bench_dump(size: None) -> FunctionType:
+    from .profile import Profile
+
+    profile = Profile.load(_large_profile_data())
+    return profile.dump
+
+
+@benchmark('datatype.load')
+def bench_load(size: None) -> FunctionType:
+    from .profile import Profile
+
+    data = _large_profile_data()
+    return lambda: Profile.load(data)
+
+
+@benchmark('util.is_type')
+def bench_is_type(size: None) -> FunctionType:
+    from .util import is_type
+
+    value = {f'counter_{index}': index for index in range(1024)}
+    return lambda: is_type(value, dict[str, int])
+
+
+@benchmark('myjson.dumps')
+def bench_dumps(size: None) -> FunctionType:
+    from .myjson import dumps
+
+    data = _large_profile_data()
+    return lambda: dumps(data)
+
+
+@benchmark('numbertheory.factorize_many')
+def bench_factorize_many(size: None) -> FunctionType:
+    from random import Random
+    from .numbertheory import factorize_many, get_sieve
+
+    random = Random(0)
+    numbers = [random.randrange(2, 1 << 20) for _ in range(1024)]
+    get_sieve().grow_spf(1 << 20)
+    return lambda: factorize_many(numbers)
+
+
+def _fill_store(size: int):
+    """Add synthetic profiles to the empty profiles directory."""
+    from .myjson import dump as dump_json
+    from .path import PROFILES_DIR, path_init
+    from .stats import get_stats
+
+    path_init()
+    data = _large_profile_data(16, 8, 8)
+    for index in range(size):
+        data['name'] = f'player{index:05}'
+        with (PROFILES_DIR / f'{data['name']}.json').open('w') as file:
+            dump_json(data, file)
+    get_stats().rebuild()
+
+
+@benchmark('profile.save', 'macro')
+def bench_save(size: int) -> FunctionType:
+    from .profile import Profile
+
+    _fill_store(size)
+    profile = Profile.load(_large_profile_data(16, 8, 8))
+    return profile.save
+
+
+@benchmark('game.list_profiles', 'macro')
+def bench_list_profiles(size: int) -> FunctionType:
+    from .game import Game, list_profiles
+
+    _fill_store(size)
+    game = Game()
+    return lambda: list_profiles(game)
+
+
+def _run_loops(function: FunctionType, loops: int) -> float:
+    """Call a function in a loop and return the seconds taken."""
+    start = perf_counter()
+    for _ in range(loops):
+        function()
+    return perf_counter() - start
+
+
+def time_benchmark(function: FunctionType, repeat: int = 5,
+                   min_time: float = 0.2) -> dict:
+    """
+    Time a function, calling it in loops long enough to measure.
+    Return the best and median seconds per call.
+    """
+    target = min_time / repeat
+    loops = 1
+    while (elapsed := _run_loops(function, loops)) < target:
+        # Aim a little past the target, growing at most tenfold at once.
+        wanted = int(loops * target / max(elapsed, 1e-9) * 1.2) + 1
+        loops = min(loops * 10, max(loops * 2, wanted))
+    times = [elapsed / loops]
+    for _ in range(repeat - 1):
+        times.append(_run_loops(function, loops) / loops)
+    return {'best': min(times), 'median': median(times),
+            'loops': loops, 'repeat': repeat}
+
+
+def run_benchmark(name: str, size: int | None, repeat: int, min_time: float) -> dict:
+    """
+    Set up and time one benchmark.
+    Called in a worker process with MATHEMAGICIAN_HOME set.
+    """
+    from .loadtest import NullFile
+    from .terminal import TerminalWriter
+    from .util import flush_output, set_writer
+
+    # Output of the benchmarked commands is thrown away.
+    set_writer(TerminalWriter(NullFile(), use_ansi=False))
+    kind, setup = BENCHMARKS[name]
+    function = setup(size)
+
+    def call():
+        # Flushed once per call, like once per prompt, so buffered output
+        # does not pile up across the loops.
+        function()
+        flush_output()
+
+    return time_benchmark(call, repeat, min_time)
+
+
+def _run_isolated(name: str, size: int | None, repeat: int, min_time: float) -> dict:
+    """Run one benchmark in a fresh process with a scratch main directory."""
+    with TemporaryDirectory(prefix='mathemagician-bench-') as scratch:
+        previous = environ.get('MATHEMAGICIAN_HOME')
+        environ['MATHEMAGICIAN_HOME'] = scratch
+        try:
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as pool:
+                return pool.submit(run_benchmark, name, size, repeat, min_time).result()
+        finally:
+            if previous is None:
+                del environ['MATHEMAGICIAN_HOME']
+            else:
+                environ['MATHEMAGICIAN_HOME'] = previous
+
+
+def run_benchmarks(name_filter: str = '', repeat: int = 5, min_time: float = 0.2,
+                   sizes: list[int] | None = None) -> dict:
+    """
+    Run the benchmarks whose names contain a filter, each in a fresh
+    process and scratch main directory, and return the results.
+    """
+    sizes = sorted(sizes or DEFAULT_SIZES)
+    results = {}
+    for name, (kind, _) in BENCHMARKS.items():
+        for size in sizes if kind == 'macro' else [None]:
+            full_name = name if size is None else f'{name}[{size}]'
+            if name_filter not in full_name:
+                continue
+            results[full_name] = {
+                'kind': kind,
+                **_run_isolated(name, size, repeat, min_time),
+            }
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    return {
+        'python': python_version(),
+        'platform': platform(),
+        'numpy': numpy is not None,
+        'benchmarks': results,
+    }
+
+
+def compare_results(baseline: dict, results: dict,
+                    threshold: float = 0.1) -> list[tuple[str, float, float, bool]]:
+    """
+    Compare the best times of the benchmarks run in both results.
+    Return (name, baseline, current, regressed) for each one, regressed
+    when the current time is over the baseline by more than the threshold.
+    """
+    comparisons = []
+    for name, result in results['benchmarks'].items():
+        if (previous := baseline['benchmarks'].get(name)) is None:
+            continue
+        regressed = result['best'] > previous['best'] * (1 + threshold)
+        comparisons.append((name, previous['best'], result['best'], regressed))
+    return comparisons
+
+
+def _format_time(seconds: float) -> str:
+    """Format a duration with a fitting unit."""
+    for unit, scale in [('s', 1), ('ms', 1e-3), ('us', 1e-6)]:
+        if seconds >= scale:
+            return f'{seconds / scale:.2f}{unit}'
+    return f'{seconds / 1e-9:.0f}ns'
+
+
+def print_results(results: dict):
+    """Print benchmark results."""
+    print(f'Python {results['python']} on {results['platform']}'
+          f'{' with NumPy' if results['numpy'] else ''}')
+    width = max((len(name) for name in results['benchmarks']), default=0)
+    for name, result in results['benchmarks'].items():
+        print(f'{name:<{width}}  best {_format_time(result['best']):>9}'
+              f'  median {_format_time(result['median']):>9}'
+              f'  ({result['loops']} loops x {result['repeat']})')
+
+
+def main():
+    parser = ArgumentParser(prog='python -m mathemagician.bench',
+                            description='Run the benchmark suite.')
+    parser.add_argument('--output', default=None,
+                        help='file to write the results to as JSON')
+    parser.add_argument('--compare', default=None,
+                        help='results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown over the baseline counted as a regression')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks whose names contain this')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum seconds to spend timing each benchmark')
+    parser.add_argument('--sizes', default=None,
+                        help='comma-separated store sizes for macro benchmarks')
+    args = parser.parse_args()
+
+    sizes = None
+    if args.sizes is not None:
+        sizes = [int(size) for size in args.sizes.split(',')]
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = load(file)
+
+    results = run_benchmarks(args.filter, args.repeat, args.min_time, sizes)
+    print_results(results)
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            dump(results, file, indent=2)
+
+    if baseline is None:
+        return
+    regressions = 0
+    print(f'\nCompared to {args.compare} (threshold {args.threshold:.0%}):')
+    for name, previous, current, regressed in compare_results(
+            baseline, results, args.threshold):
+        regressions += regressed
+        print(f'{'REGRESSION' if regressed else 'ok':<10}  {name}:'
+              f' {_format_time(previous)} -> {_format_time(current)}'
+              f' ({current / previous - 1:+.1%})')
+    if regressions:
+        print(f'{regressions} benchmarks regressed.')
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -41,12 +41,17 @@ Usage:
 """
 
 from re import fullmatch
+from time import perf_counter
 from types import FunctionType
 
+from . import instrument
 from .util import print_warning
 
 __all__ = ['parse_value', 'CliEngine']
 
+# A resolved command: its format, its handler and its parsed arguments.
+Call = tuple[str, FunctionType, dict[str, any]]
+
 
 def parse_value(value: str, arg_type: str) -> any:
     """
@@ -60,6 +65,8 @@ def parse_value(value: str, arg_type: str) -> any:
     - int
     - float
     - number (int or float)
+    - expression (exact int or Fraction, see evaluator)
+    - text (str, taking the rest of the line when last)
 
     >>> parse_value('hello', 'str')
     'hello'
@@ -79,10 +86,13 @@ def parse_value(value: str, arg_type: str) -> any:
     ValueError: Invalid argument type: invalid
     >>> parse_value('1.0', 'int')
     >>> parse_value('1', 'float')
+    >>> parse_value('1/2 + 1/4', 'expression')
+    Fraction(3, 4)
+    >>> parse_value('1 +', 'expression')
     """
     try:
         match arg_type:
-            case 'str':
+            case 'str' | 'text':
                 return value
             case 'bool':
                 return {'true': True, 'false': False}.get(value.lower(), None)
@@ -92,11 +102,19 @@ def parse_value(value: str, arg_type: str) -> any:
                 return float(value)
             case 'number':
                 return float(value) if '.' in value else int(value)
+            case 'expression':
+                from .evaluator import evaluate_expression
+                return evaluate_expression(value)
     except ValueError:
         return
     raise ValueError(f'Invalid argument type: {arg_type}')
 
 
+def _takes_rest(command: str) -> bool:
+    """Check if a command format ends with a text argument."""
+    return bool(fullmatch(r'.*(<\w+:text>|\[\w+:text\])', command))
+
+
 class CliEngine:
     """
     A command engine for a command line interface.
@@ -115,22 +133,99 @@ class CliEngine:
             return func
         return decorator
 
+    def resolve(self, string: str,
+                shortcuts: any = None) -> tuple[str, list[Call]] | None:
+        """
+        Resolve a single command to the calls that run it.
+        Return the matched format, or the macro name, and the calls,
+        or None if no command matches.
+        """
+        if shortcuts is not None and (resolved := shortcuts.resolve(string)) is not None:
+            return resolved
+        for command, func in self.commands.items():
+            kwargs = self._parse(command, string)
+            if kwargs is not None:
+                return command, [(command, func, kwargs)]
+
+    def _resolve_next(self, string: str,
+                      shortcuts: any) -> tuple[tuple[str, list[Call]] | None, str]:
+        """Resolve the first of chained commands and return the rest."""
+        head, separator, rest = string.partition(';')
+        resolved = self.resolve(head, shortcuts)
+        if separator and resolved is not None and _takes_rest(resolved[0]):
+            # A trailing text argument takes the semicolons too
+            return self.resolve(string, shortcuts), ''
+        return resolved, rest
+
+    def compile(self, string: str, shortcuts: any = None) -> list[Call]:
+        """
+        Resolve chained commands to the calls that run them.
+        Raise a ValueError if a command is unknown.
+        """
+        calls = []
+        while string:
+            head, _, rest = string.partition(';')
+            if not head.strip():
+                string = rest
+                continue
+            resolved, string = self._resolve_next(string, shortcuts)
+            if resolved is None:
+                raise ValueError(f'Unknown command: {head.strip()}')
+            calls.extend(resolved[1])
+        return calls
+
     def parse(self, instance: any, string: str) -> None:
-        """Parse a string and execute the corresponding command."""
+        """
+        Parse a string and execute the corresponding commands.
+        Commands are chained with semicolons, and the aliases and macros of
+        the instance, if it has shortcuts, are resolved first.
+        """
         # Check if the string is empty
         if string == '':
             return
         # Check if the string is a comment
         if string.strip().startswith('#'):
             return
-        # Check if the string is a command
-        for command in self.commands:
-            kwargs = self._parse(command, string)
-            if kwargs is not None:
-                self.commands[command](instance, **kwargs)
-                break
-        else:
+        shortcuts = getattr(instance, 'shortcuts', None)
+        while string:
+            head, _, rest = string.partition(';')
+            if not head.strip():
+                string = rest
+            elif (recorder := instrument.recorder) is not None:
+                string = self._parse_timed(recorder, instance, string, shortcuts)
+            else:
+                resolved, string = self._resolve_next(string, shortcuts)
+                if resolved is None:
+                    print_warning('Unknown command. Use "help" for a list of commands.')
+                    continue
+                for _, func, kwargs in resolved[1]:
+                    func(instance, **kwargs)
+
+    def _parse_timed(self, recorder: instrument.Recorder, instance: any,
+                     string: str, shortcuts: any) -> str:
+        """
+        Parse the first of chained commands and execute it, timing each
+        section. Return the rest of the string.
+        """
+        start = perf_counter()
+        recorder.begin()
+        resolved, rest = self._resolve_next(string, shortcuts)
+        matched = perf_counter()
+        recorder.add('dispatch', matched - start - recorder.spent('args'))
+        if resolved is None:
+            recorder.end(instrument.UNKNOWN, matched - start)
             print_warning('Unknown command. Use "help" for a list of commands.')
+            return rest
+        waited = recorder.spent('encode', 'decode', 'io')
+        try:
+            for _, func, kwargs in resolved[1]:
+                func(instance, **kwargs)
+        finally:
+            end = perf_counter()
+            waited = recorder.spent('encode', 'decode', 'io') - waited
+            recorder.add('handler', end - matched - waited)
+            recorder.end(resolved[0], end - start)
+        return rest
 
     @staticmethod
     def _parse(format_: str, string: str) -> None | tuple[any]:
@@ -139,14 +234,15 @@ class CliEngine:
         format_words = format_.split()
         string_words = string.split()
 
-        # Check that the number of words match
-        if len(format_words) > len(string_words):
+        # Check that the number of words match, optional arguments aside
+        required_count = sum(not word.startswith('[') for word in format_words)
+        if required_count > len(string_words):
             return
 
         # Check that each word matches the format
         args = {}
         string_words.extend([None] * (len(format_words) - len(string_words)))
-        for format_word, string_word in zip(format_words, string_words):
+        for index, (format_word, string_word) in enumerate(zip(format_words, string_words)):
             # Check for argument
             if fullmatch(r'<\w+(:\w+)?>|\[\w+(:\w+)?\]', format_word):
                 if format_word.startswith('[') and string_word is None:
@@ -163,7 +259,12 @@ class CliEngine:
                     print_warning(f'Duplicate argument: {arg_name}'
                                   f' in command {format_}')
                     return
-                args[arg_name] = parse_value(string_word, arg_type)
+                # A trailing expression or text takes the rest of the line
+                if arg_type in {'expression', 'text'} and index == len(format_words) - 1:
+                    string_word = ' '.join(word for word in string_words[index:]
+                                           if word is not None)
+                with instrument.timed('args'):
+                    args[arg_name] = parse_value(string_word, arg_type)
 
             # Check for plain text
             elif format_word != string_word:
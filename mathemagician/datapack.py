@@ -0,0 +1,83 @@
+"""
+Data pack builder, used to pack the data directory into a single file.
+
+A pack starts with a fixed header (magic bytes, format version and the
+length of the table of contents), followed by the table of contents as
+JSON and then the encoded assets. The table of contents maps the relative
+path of each asset to its offset, length and encoding, with offsets
+relative to the start of the asset section.
+
+Build the pack with:
+    python -m mathemagician.datapack [output]
+"""
+
+from json import dumps, loads
+from pathlib import Path
+from struct import Struct
+
+__all__ = [
+    'PACK_MAGIC', 'PACK_VERSION', 'PACK_HEADER', 'PACK_NAME',
+    'build_pack', 'read_pack_header',
+]
+
+PACK_MAGIC = b'MMPK'
+PACK_VERSION = 1
+PACK_HEADER = Struct('<4sHI')
+PACK_NAME = 'data.pack'
+
+
+def _encode_asset(path: Path) -> tuple[bytes, str]:
+    """Encode an asset, compacting JSON files."""
+    content = path.read_bytes()
+    if path.suffix == '.json':
+        data = loads(content)
+        return dumps(data, separators=(',', ':')).encode(), 'json'
+    return content, 'raw'
+
+
+def build_pack(data_dir: Path, output: Path) -> dict:
+    """Pack every file under the data directory into the output file."""
+    toc = {}
+    assets = []
+    offset = 0
+    for path in sorted(data_dir.rglob('*')):
+        if not path.is_file():
+            continue
+        content, encoding = _encode_asset(path)
+        toc[path.relative_to(data_dir).as_posix()] = [offset, len(content), encoding]
+        assets.append(content)
+        offset += len(content)
+    toc_bytes = dumps(toc, separators=(',', ':')).encode()
+    with output.open('wb') as file:
+        file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(toc_bytes)))
+        file.write(toc_bytes)
+        for content in assets:
+            file.write(content)
+    return toc
+
+
+def read_pack_header(buffer) -> tuple[dict, int]:
+    """
+    Read the table of contents from a pack buffer.
+    Return the table of contents and the offset of the asset section.
+    Raise a ValueError if the buffer is not a valid pack.
+    """
+    if len(buffer) < PACK_HEADER.size:
+        raise ValueError('Invalid data pack: truncated header')
+    magic, version, toc_length = PACK_HEADER.unpack_from(buffer)
+    if magic != PACK_MAGIC:
+        raise ValueError('Invalid data pack: bad magic')
+    if version != PACK_VERSION:
+        raise ValueError(f'Unsupported data pack version: {version}')
+    toc_end = PACK_HEADER.size + toc_length
+    toc = loads(str(buffer[PACK_HEADER.size:toc_end], 'utf-8'))
+    return toc, toc_end
+
+
+if __name__ == '__main__':
+    from sys import argv
+
+    package_dir = Path(__file__).parent
+    output = Path(argv[1]) if len(argv) > 1 else package_dir / PACK_NAME
+    toc = build_pack(package_dir / 'data', output)
+    print(f'Packed {len(toc)} assets into {output}')
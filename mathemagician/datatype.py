@@ -135,8 +135,10 @@ class DataType:
                               f' {cls.__name__}: {variable.name}')
                 missing_variables = True
         if not missing_variables:
+            # Missing variables take their default values
             return cls(**{variable.name: variable.load(data[variable.name])
-                          for variable in cls.variables})
+                          for variable in cls.variables
+                          if variable.name in data})
 
     @classmethod
     def load(cls, data):
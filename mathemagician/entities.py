@@ -1 +1,413 @@
-__all__ = []
+"""
+Entity-component system, used to simulate encounters with many entities.
+
+Entities are dense integer ids, reused through a free list. Components are
+stored as structs of arrays: each field of a component is one column
+indexed by entity id (NumPy arrays when installed, the array module
+otherwise), with a presence mask per component. Systems select the
+entities with the components they need in one query and update them in one
+batched pass.
+
+Example:
+>>> world = World()
+>>> goblin = world.create(Health=dict(hp=10, max_hp=10), Poison=dict(damage=2, turns=2))
+>>> player = world.create(Attack=dict(power=3))
+>>> attack_with_answer(world, player, [goblin], correct=True, difficulty=1)
+>>> tick(world)
+[]
+>>> world.get(goblin, Health)['hp']
+5.0
+"""
+
+from array import array
+from types import FunctionType
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .datatype import DataType, Variable
+from .util import is_type
+
+__all__ = [
+    'Field', 'Component', 'Health', 'Attack', 'Damage', 'Poison',
+    'Regeneration', 'COMPONENTS', 'WorldState', 'World',
+    'deal_damage', 'attack_with_answer',
+    'damage_system', 'status_system', 'death_system', 'tick',
+]
+
+_NUMPY_TYPES = {'b': 'int8', 'q': 'int64', 'd': 'float64'}
+
+
+class Field:
+    """
+    Field class, used to describe a column of a component.
+    Used in the Component class.
+    """
+    name: str
+    typecode: str
+    default: int | float
+
+    def __init__(self, name: str, typecode: str = 'd', default: int | float = 0):
+        if typecode not in _NUMPY_TYPES:
+            raise ValueError(f'Invalid typecode: {typecode}')
+        self.name = name
+        self.typecode = typecode
+        self.default = float(default) if typecode == 'd' else int(default)
+
+
+class Component:
+    """
+    Component class, used to declare the fields of a component.
+    """
+    fields: list[Field] = []
+
+
+class Health(Component):
+    """Hit points of an entity."""
+    fields = [Field('hp'), Field('max_hp')]
+
+
+class Attack(Component):
+    """Attack power of an entity."""
+    fields = [Field('power')]
+
+
+class Damage(Component):
+    """Damage dealt to an entity, applied on the next tick."""
+    fields = [Field('amount')]
+
+
+class Poison(Component):
+    """Damage over time, for a number of ticks."""
+    fields = [Field('damage'), Field('turns', 'q')]
+
+
+class Regeneration(Component):
+    """Healing over time, for a number of ticks."""
+    fields = [Field('heal'), Field('turns', 'q')]
+
+
+COMPONENTS: dict[str, type[Component]] = {
+    component.__name__: component
+    for component in [Health, Attack, Damage, Poison, Regeneration]
+}
+
+
+class WorldState(DataType):
+    """
+    World state data type, used to save and load a world.
+
+    Variables:
+        next_id: int
+            The next entity id never used.
+        free: list[int]
+            The ids of destroyed entities, to be reused.
+        components: dict
+            For each component name, the entity ids that have it and a list
+            of values per field.
+    """
+    variables = [
+        Variable('next_id', int, lambda: 0),
+        Variable('free', list, lambda: [], False, None, None,
+                 lambda value: is_type(value, list[int])),
+        Variable('components', dict, lambda: {}),
+    ]
+
+
+def _new_column(typecode: str, size: int):
+    """Create a column of zeros."""
+    if numpy is not None:
+        return numpy.zeros(size, _NUMPY_TYPES[typecode])
+    return array(typecode, bytes(array(typecode).itemsize * size))
+
+
+def _grow_column(column, size: int):
+    """Return a column extended with zeros to a size."""
+    if numpy is not None:
+        grown = numpy.zeros(size, column.dtype)
+        grown[:len(column)] = column
+        return grown
+    column.extend(array(column.typecode, bytes(column.itemsize * (size - len(column)))))
+    return column
+
+
+class World:
+    """
+    World class, used to store entities and their components.
+
+    Variables:
+        capacity: int
+            The number of entity ids the columns have room for.
+        next_id: int
+            The next entity id never used.
+        free: list[int]
+            The ids of destroyed entities, reused first.
+        masks: dict[str, array]
+            For each component name, whether each entity has it.
+        columns: dict[str, dict[str, array]]
+            For each component name, the column of each field.
+    """
+    def __init__(self, components: list[type[Component]] | None = None,
+                 capacity: int = 64):
+        self.components = {component.__name__: component
+                           for component in components or COMPONENTS.values()}
+        self.capacity = capacity
+        self.next_id = 0
+        self.free = []
+        self.alive = _new_column('b', capacity)
+        self.masks = {name: _new_column('b', capacity) for name in self.components}
+        self.columns = {
+            name: {field.name: _new_column(field.typecode, capacity)
+                   for field in component.fields}
+            for name, component in self.components.items()
+        }
+
+    def _grow(self, size: int):
+        """Grow every column to fit at least a number of entities."""
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        self.alive = _grow_column(self.alive, capacity)
+        for name in self.masks:
+            self.masks[name] = _grow_column(self.masks[name], capacity)
+            for field_name, column in self.columns[name].items():
+                self.columns[name][field_name] = _grow_column(column, capacity)
+        self.capacity = capacity
+
+    def create(self, **components: dict) -> int:
+        """Create an entity with components, given as keyword dicts of values."""
+        if self.free:
+            entity = self.free.pop()
+        else:
+            entity = self.next_id
+            self.next_id += 1
+            self._grow(self.next_id)
+        self.alive[entity] = 1
+        for name, values in components.items():
+            self.add(entity, self.components[name], **values)
+        return entity
+
+    def destroy(self, entity: int):
+        """Destroy an entity, freeing its id."""
+        if not self.alive[entity]:
+            raise ValueError(f'Entity does not exist: {entity}')
+        self.alive[entity] = 0
+        for mask in self.masks.values():
+            mask[entity] = 0
+        self.free.append(entity)
+
+    def add(self, entity: int, component: type[Component], **values):
+        """Add a component to an entity, with default values for missing fields."""
+        name = component.__name__
+        self.masks[name][entity] = 1
+        for field in component.fields:
+            self.columns[name][field.name][entity] = values.pop(field.name, field.default)
+        if values:
+            raise TypeError(f'Invalid fields for {name}: {", ".join(values)}')
+
+    def remove(self, entity: int, component: type[Component]):
+        """Remove a component from an entity."""
+        self.masks[component.__name__][entity] = 0
+
+    def has(self, entity: int, component: type[Component]) -> bool:
+        """Check if an entity has a component."""
+        return bool(self.masks[component.__name__][entity])
+
+    def get(self, entity: int, component: type[Component]) -> dict | None:
+        """Get the values of a component of an entity, or None."""
+        if not self.has(entity, component):
+            return
+        columns = self.columns[component.__name__]
+        return {name: column[entity].item() if numpy is not None else column[entity]
+                for name, column in columns.items()}
+
+    def column(self, component: type[Component], field: str):
+        """Get the column of a field, indexed by entity id."""
+        return self.columns[component.__name__][field]
+
+    def query(self, *components: type[Component]):
+        """Return the ids of the entities having all the components."""
+        masks = [self.masks[component.__name__] for component in components]
+        if numpy is not None:
+            selected = self.alive[:self.next_id].astype(bool)
+            for mask in masks:
+                selected &= mask[:self.next_id].astype(bool)
+            return numpy.flatnonzero(selected)
+        return [entity for entity in range(self.next_id)
+                if self.alive[entity] and all(mask[entity] for mask in masks)]
+
+    def __len__(self) -> int:
+        return self.next_id - len(self.free)
+
+    def dump(self) -> dict:
+        """Dump the world to a state that myjson can encode."""
+        components = {}
+        for name, component in self.components.items():
+            selected = self.query(component)
+            entities = selected.tolist() if numpy is not None else selected
+            if not entities:
+                continue
+            data = {'entities': entities}
+            for field in component.fields:
+                column = self.columns[name][field.name]
+                if numpy is not None:
+                    data[field.name] = column[selected].tolist()
+                else:
+                    data[field.name] = [column[entity] for entity in entities]
+            components[name] = data
+        return WorldState(self.next_id, [*self.free], components).dump()
+
+    @classmethod
+    def load(cls, data: dict, components: list[type[Component]] | None = None):
+        """
+        Load a world from a dumped state, or return None if it is not one.
+        Raise a ValueError if its entities or components are malformed.
+        """
+        if not WorldState.is_valid(data):
+            return
+        state = WorldState.load(data)
+        world = cls(components)
+        _check_state(state, world.components)
+        world.next_id = state.next_id
+        world._grow(state.next_id)
+        world.free = [*state.free]
+        free = {*state.free}
+        for entity in range(state.next_id):
+            world.alive[entity] = entity not in free
+        for name, values in state.components.items():
+            component = world.components[name]
+            for index, entity in enumerate(values['entities']):
+                world.add(entity, component, **{
+                    field.name: values[field.name][index]
+                    for field in component.fields
+                })
+        return world
+
+
+def _check_state(state: WorldState, components: dict[str, type[Component]]):
+    """Raise a ValueError if a world state does not fit its components."""
+    if state.next_id < 0:
+        raise ValueError(f'Invalid next entity id: {state.next_id}')
+    if any(not 0 <= entity < state.next_id for entity in state.free) \
+            or len({*state.free}) != len(state.free):
+        raise ValueError('Invalid free entity ids')
+    free = {*state.free}
+    for name, values in state.components.items():
+        if (component := components.get(name)) is None:
+            raise ValueError(f'Unknown component: {name}')
+        field_types = {field.name: int if field.typecode != 'd' else int | float
+                       for field in component.fields}
+        if not isinstance(values, dict) or {*values} != {'entities', *field_types}:
+            raise ValueError(f'Invalid fields for {name}')
+        entities = values['entities']
+        if not is_type(entities, list[int]) or any(
+                not 0 <= entity < state.next_id or entity in free
+                for entity in entities):
+            raise ValueError(f'Invalid entity ids for {name}')
+        for field_name, field_type in field_types.items():
+            column = values[field_name]
+            if not isinstance(column, list) or len(column) != len(entities) or any(
+                    isinstance(value, bool) or not isinstance(value, field_type)
+                    for value in column):
+                raise ValueError(f'Invalid values for {name}.{field_name}')
+
+
+def deal_damage(world: World, targets, amount: float):
+    """Queue damage to targets, applied by the damage system."""
+    mask = world.masks['Damage']
+    column = world.column(Damage, 'amount')
+    if numpy is not None:
+        targets = numpy.asarray(targets, int)
+        # Targets without pending damage start from zero, and repeated
+        # targets take the damage once per time they are listed.
+        column[targets] = numpy.where(mask[targets] != 0, column[targets], 0)
+        numpy.add.at(column, targets, amount)
+        mask[targets] = 1
+        return
+    for target in targets:
+        column[target] = (column[target] if mask[target] else 0) + amount
+        mask[target] = 1
+
+
+def attack_with_answer(world: World, attacker: int, targets,
+                       correct: bool, difficulty: int = 1):
+    """
+    Attack targets with the power of an attacker, scaled by the difficulty
+    of the problem answered. A wrong answer deals no damage.
+    """
+    if not correct or not world.has(attacker, Attack):
+        return
+    power = world.column(Attack, 'power')[attacker]
+    deal_damage(world, targets, float(power) * (1 + (difficulty - 1) / 2))
+
+
+def damage_system(world: World):
+    """Apply the pending damage to every entity with health."""
+    entities = world.query(Health, Damage)
+    hp = world.column(Health, 'hp')
+    amount = world.column(Damage, 'amount')
+    if numpy is not None:
+        hp[entities] = numpy.maximum(hp[entities] - amount[entities], 0)
+        world.masks['Damage'][entities] = 0
+        return
+    for entity in entities:
+        hp[entity] = max(hp[entity] - amount[entity], 0)
+        world.masks['Damage'][entity] = 0
+
+
+def _over_time(world: World, component: type[Component], field: str,
+               apply: FunctionType):
+    """Apply an effect over time and remove it once it runs out."""
+    entities = world.query(Health, component)
+    hp = world.column(Health, 'hp')
+    max_hp = world.column(Health, 'max_hp')
+    values = world.column(component, field)
+    turns = world.column(component, 'turns')
+    mask = world.masks[component.__name__]
+    if numpy is not None:
+        hp[entities] = apply(hp[entities], values[entities], max_hp[entities])
+        turns[entities] -= 1
+        mask[entities] = turns[entities] > 0
+        return
+    for entity in entities:
+        hp[entity] = apply(hp[entity], values[entity], max_hp[entity])
+        turns[entity] -= 1
+        mask[entity] = turns[entity] > 0
+
+
+def status_system(world: World):
+    """Apply poison and regeneration to every affected entity."""
+    if numpy is not None:
+        _over_time(world, Poison, 'damage',
+                   lambda hp, damage, max_hp: numpy.maximum(hp - damage, 0))
+        _over_time(world, Regeneration, 'heal',
+                   lambda hp, heal, max_hp: numpy.minimum(hp + heal, max_hp))
+        return
+    _over_time(world, Poison, 'damage',
+               lambda hp, damage, max_hp: max(hp - damage, 0))
+    _over_time(world, Regeneration, 'heal',
+               lambda hp, heal, max_hp: min(hp + heal, max_hp))
+
+
+def death_system(world: World) -> list[int]:
+    """Destroy every entity out of hit points and return their ids."""
+    entities = world.query(Health)
+    hp = world.column(Health, 'hp')
+    if numpy is not None:
+        dead = entities[hp[entities] <= 0].tolist()
+    else:
+        dead = [entity for entity in entities if hp[entity] <= 0]
+    for entity in dead:
+        world.destroy(entity)
+    return dead
+
+
+def tick(world: World) -> list[int]:
+    """Run one tick of every system, returning the entities that died."""
+    status_system(world)
+    damage_system(world)
+    return death_system(world)
@@ -0,0 +1,398 @@
+"""
+Expression evaluator, used to check answers and coding puzzle submissions.
+
+Expressions are parsed into an AST, checked against a whitelist of nodes,
+rewritten to use exact Fraction arithmetic and compiled once, with the
+compiled forms cached by source. Coding puzzle submissions run in a pool of
+worker processes with CPU time and memory limits, and a worker that runs
+over its limits is killed and replaced, so a runaway submission cannot hang
+the session. Submissions are checked for imports and for attributes that
+reach frames, code or string formatting, and the workers refuse file,
+process, network and frame access with an audit hook, so a submission
+that gets past the check still cannot leave its process.
+
+>>> evaluate_expression('1/2 + 1/3')
+Fraction(5, 6)
+>>> evaluate_expression('0.25 * 8')
+2
+>>> evaluate_expression('2 * x + 1', {'x': 3})
+7
+>>> evaluate_expression('__import__("os")')
+Traceback (most recent call last):
+    ...
+mathemagician.evaluator.ExpressionError: Function not allowed: __import__
+"""
+
+import ast
+import builtins
+from fractions import Fraction
+from functools import lru_cache
+from math import gcd, lcm
+from multiprocessing import get_context
+from queue import Queue
+from sys import addaudithook
+from types import CodeType
+
+__all__ = [
+    'ExpressionError', 'SandboxError',
+    'compile_expression', 'evaluate_expression',
+    'SandboxPool', 'get_sandbox',
+]
+
+MAX_EXPRESSION_LENGTH = 256
+MAX_EXPONENT = 1024
+MAX_BITS = 4096
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression is invalid or cannot be evaluated."""
+
+
+class SandboxError(RuntimeError):
+    """Raised when a submission fails or runs over its limits."""
+
+
+def _fraction(value: str) -> Fraction:
+    return Fraction(value)
+
+
+def _div(first, second) -> Fraction:
+    if second == 0:
+        raise ExpressionError('Division by zero')
+    return Fraction(first) / second
+
+
+def _pow(base, exponent):
+    if not isinstance(exponent, int) and exponent.denominator != 1:
+        raise ExpressionError('Exponent must be an integer')
+    exponent = int(exponent)
+    if abs(exponent) > MAX_EXPONENT:
+        raise ExpressionError('Exponent too large')
+    if base == 0 and exponent < 0:
+        raise ExpressionError('Division by zero')
+    if isinstance(base, int) and abs(exponent) * base.bit_length() > MAX_BITS:
+        raise ExpressionError('Result too large')
+    if isinstance(base, Fraction) and abs(exponent) * max(
+            base.numerator.bit_length(), base.denominator.bit_length()) > MAX_BITS:
+        raise ExpressionError('Result too large')
+    if exponent < 0:
+        return Fraction(1) / base ** -exponent
+    return base ** exponent
+
+
+FUNCTIONS = {
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'gcd': gcd,
+    'lcm': lcm,
+}
+
+_BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv,
+                     ast.Mod, ast.Pow)
+_UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+
+class _ExpressionCompiler(ast.NodeTransformer):
+    """Check an expression against the whitelist and make it exact."""
+
+    def __init__(self, names: frozenset[str]):
+        self.names = names
+
+    def generic_visit(self, node):
+        raise ExpressionError(f'Syntax not allowed: {node.__class__.__name__}')
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _BINARY_OPERATORS):
+            raise ExpressionError(f'Operator not allowed: {node.op.__class__.__name__}')
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if isinstance(node.op, ast.Div | ast.Pow):
+            helper = '_div' if isinstance(node.op, ast.Div) else '_pow'
+            return ast.Call(ast.Name(helper, ast.Load()), [left, right], [])
+        node.left, node.right = left, right
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _UNARY_OPERATORS):
+            raise ExpressionError(f'Operator not allowed: {node.op.__class__.__name__}')
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, int | float):
+            raise ExpressionError(f'Constant not allowed: {node.value!r}')
+        if isinstance(node.value, float):
+            # Decimal literals are exact, so 0.1 is 1/10.
+            return ast.Call(ast.Name('_fraction', ast.Load()),
+                            [ast.Constant(repr(node.value))], [])
+        return node
+
+    def visit_Name(self, node):
+        if node.id not in self.names:
+            raise ExpressionError(f'Unknown name: {node.id}')
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            name = node.func.id if isinstance(node.func, ast.Name) else '?'
+            raise ExpressionError(f'Function not allowed: {name}')
+        if node.keywords:
+            raise ExpressionError('Keyword arguments not allowed')
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str, names: frozenset[str] = frozenset()) -> CodeType:
+    """
+    Compile an expression, caching the compiled form.
+    Raise an ExpressionError if the expression is not allowed.
+    """
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError('Expression too long')
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError:
+        raise ExpressionError(f'Invalid expression: {source}') from None
+    tree = ast.fix_missing_locations(_ExpressionCompiler(names).visit(tree))
+    return compile(tree, '<expression>', 'eval')
+
+
+_GLOBALS = {
+    '__builtins__': {},
+    '_fraction': _fraction,
+    '_div': _div,
+    '_pow': _pow,
+    **FUNCTIONS,
+}
+
+
+def evaluate_expression(source: str,
+                        variables: dict[str, int | Fraction] | None = None
+                        ) -> int | Fraction:
+    """
+    Evaluate an expression exactly, returning an int when it is whole.
+    Raise an ExpressionError if the expression is invalid.
+    """
+    variables = variables or {}
+    code = compile_expression(source, frozenset(variables))
+    try:
+        result = eval(code, _GLOBALS, variables)
+    except ExpressionError:
+        raise
+    except (ArithmeticError, TypeError, ValueError) as error:
+        raise ExpressionError(f'{error}') from None
+    if isinstance(result, Fraction) and result.denominator == 1:
+        return result.numerator
+    return result
+
+
+# Submissions may only return plain values, so nothing unpickled in the
+# game process can run code.
+_RESULT_TYPES = (bool, int, float, str, Fraction, type(None))
+
+SAFE_BUILTINS = {
+    name: getattr(builtins, name) for name in [
+        'abs', 'all', 'any', 'bool', 'dict', 'divmod', 'enumerate',
+        'filter', 'float', 'int', 'isinstance', 'len', 'list', 'map', 'max',
+        'min', 'pow', 'range', 'reversed', 'round', 'set', 'sorted', 'str',
+        'sum', 'tuple', 'zip', 'ValueError', 'Exception',
+    ]
+}
+
+
+def _check_result(value) -> bool:
+    """Check that a value is built of plain types only."""
+    if type(value) in _RESULT_TYPES:
+        return True
+    if type(value) in {list, tuple}:
+        return all(_check_result(item) for item in value)
+    if type(value) is dict:
+        return all(_check_result(key) and _check_result(item)
+                   for key, item in value.items())
+    return False
+
+
+# Attributes that lead from a generator, coroutine, traceback or frame to
+# the frames of the worker, or format values by attribute name.
+FORBIDDEN_ATTRIBUTES = frozenset({
+    'gi_frame', 'gi_code', 'gi_yieldfrom', 'cr_frame', 'cr_code', 'cr_await',
+    'cr_origin', 'ag_frame', 'ag_code', 'ag_await', 'tb_frame', 'tb_next',
+    'f_back', 'f_globals', 'f_locals', 'f_builtins', 'f_code', 'f_trace',
+    'format', 'format_map',
+})
+# Audit events refused in workers, by name or by prefix ending in a dot.
+# Reading the audited attributes above is reported as object.__getattr__.
+_FORBIDDEN_EVENTS = ('open', 'import', 'object.__getattr__',
+                     'sys._getframe', 'sys.addaudithook', 'sys.settrace',
+                     'sys.setprofile', 'os.', 'subprocess.', 'socket.',
+                     'shutil.', 'ctypes.', 'gc.', 'marshal.', 'code.',
+                     'builtins.input', 'webbrowser.')
+
+
+def _check_submission(source: str):
+    """Reject imports, dunder names and forbidden attributes in a submission."""
+    tree = ast.parse(source)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import | ast.ImportFrom | ast.Global | ast.Nonlocal):
+            raise SandboxError('Imports and global statements are not allowed')
+        name = (node.attr if isinstance(node, ast.Attribute)
+                else node.id if isinstance(node, ast.Name) else '')
+        if name.startswith('__') or name in FORBIDDEN_ATTRIBUTES:
+            raise SandboxError(f'Name not allowed: {name}')
+
+
+def _audit(event: str, args: tuple):
+    """Refuse the forbidden audit events of a worker."""
+    if event.startswith(_FORBIDDEN_EVENTS):
+        raise SandboxError(f'Operation not allowed: {event}')
+
+
+def _limit_resources(cpu_time: float | None, memory: int | None):
+    """Limit the CPU time of the next task and the memory of the worker."""
+    try:
+        import resource
+    except ImportError:
+        # Without resource limits, the wall-clock timeout still applies.
+        return
+    if memory is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    if cpu_time is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = usage.ru_utime + usage.ru_stime
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        soft = int(used + cpu_time) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker(connection, cpu_time: float | None, memory: int | None):
+    """Run submissions sent over a connection until it is closed."""
+    _limit_resources(None, memory)
+    # Hooks cannot be removed, so nothing run after this can open files,
+    # start processes or inspect frames.
+    addaudithook(_audit)
+    while True:
+        try:
+            source, function_name, args = connection.recv()
+        except EOFError:
+            return
+        _limit_resources(cpu_time, None)
+        try:
+            namespace = {'__builtins__': SAFE_BUILTINS, 'Fraction': Fraction,
+                         'gcd': gcd, 'lcm': lcm}
+            exec(compile(source, '<submission>', 'exec'), namespace)
+            result = namespace[function_name](*args)
+            if not _check_result(result):
+                raise SandboxError('Result must be built of plain values')
+            connection.send(('ok', result))
+        except MemoryError:
+            connection.send(('error', 'Memory limit exceeded'))
+        except KeyError:
+            connection.send(('error', f'Function not defined: {function_name}'))
+        except Exception as error:
+            connection.send(('error', f'{error.__class__.__name__}: {error}'))
+
+
+class SandboxPool:
+    """
+    Sandbox pool, used to run untrusted submissions in worker processes.
+
+    Variables:
+        workers: int
+            The number of worker processes.
+        cpu_time: float
+            The CPU time limit per submission in seconds.
+        memory: int
+            The address space limit per worker in bytes.
+        timeout: float
+            The wall-clock limit per submission in seconds.
+    """
+    workers: int
+    cpu_time: float
+    memory: int
+    timeout: float
+
+    def __init__(self, workers: int = 2, cpu_time: float = 2,
+                 memory: int = 256 * 1024 * 1024, timeout: float = 5):
+        self.workers = workers
+        self.cpu_time = cpu_time
+        self.memory = memory
+        self.timeout = timeout
+        self.context = get_context('spawn')
+        self.idle = Queue()
+        self.processes = []
+        for _ in range(workers):
+            self.idle.put(self._start_worker())
+
+    def _start_worker(self):
+        """Start a worker process and return its connection and process."""
+        connection, worker_connection = self.context.Pipe()
+        process = self.context.Process(
+            target=_worker, args=(worker_connection, self.cpu_time, self.memory),
+            daemon=True,
+        )
+        process.start()
+        worker_connection.close()
+        self.processes.append(process)
+        return connection, process
+
+    def _replace_worker(self, connection, process):
+        """Kill a worker and start a new one in its place."""
+        connection.close()
+        process.kill()
+        process.join()
+        self.processes.remove(process)
+        self.idle.put(self._start_worker())
+
+    def run(self, source: str, function_name: str, args: tuple = ()):
+        """
+        Run a function from a submission and return its result.
+        Raise a SandboxError if it fails or runs over its limits.
+        """
+        try:
+            _check_submission(source)
+        except SyntaxError as error:
+            raise SandboxError(f'Invalid submission: {error}') from None
+        connection, process = self.idle.get()
+        try:
+            connection.send((source, function_name, tuple(args)))
+            if not connection.poll(self.timeout):
+                self._replace_worker(connection, process)
+                raise SandboxError('Time limit exceeded')
+            status, value = connection.recv()
+        except (EOFError, OSError):
+            self._replace_worker(connection, process)
+            raise SandboxError('Submission killed: limits exceeded') from None
+        self.idle.put((connection, process))
+        if status == 'error':
+            raise SandboxError(value)
+        return value
+
+    def close(self):
+        """Stop all worker processes."""
+        while not self.idle.empty():
+            connection, process = self.idle.get()
+            connection.close()
+        for process in self.processes:
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+        self.processes.clear()
+
+
+_sandbox = None
+
+
+def get_sandbox() -> SandboxPool:
+    """Get the shared sandbox pool, starting it on first use."""
+    global _sandbox
+    if _sandbox is None:
+        _sandbox = SandboxPool()
+    return _sandbox
@@ -0,0 +1,80 @@
+"""
+Event bus, used to notify subscribers of commands and state changes.
+
+Events have a type from EVENT_TYPES, an amount and keyword data. Handlers
+subscribe to one event type, so emitting an event only calls the handlers
+of its type.
+"""
+
+from types import FunctionType
+
+__all__ = ['EVENT_TYPES', 'Event', 'EventBus']
+
+EVENT_TYPES = {
+    # A command was entered, with data: command.
+    'command',
+    # A problem was answered, with data: topic, difficulty.
+    'problem_solved',
+    'problem_failed',
+    # The profile was saved.
+    'profile_saved',
+    # Items were moved in the inventory.
+    'item_moved',
+}
+
+
+class Event:
+    """
+    Event class, used to describe something that happened.
+
+    Variables:
+        type: str
+            The type of the event, one of EVENT_TYPES.
+        amount: int
+            How many times it happened, for counting.
+        data: dict
+            Details of the event.
+    """
+    __slots__ = ('type', 'amount', 'data')
+    type: str
+    amount: int
+    data: dict
+
+    def __init__(self, type_: str, amount: int = 1, **data):
+        if type_ not in EVENT_TYPES:
+            raise ValueError(f'Invalid event type: {type_}')
+        self.type = type_
+        self.amount = amount
+        self.data = data
+
+    def __repr__(self) -> str:
+        return f'Event({self.type!r}, {self.amount}, {self.data!r})'
+
+
+class EventBus:
+    """
+    Event bus, used to dispatch events to the handlers of their type.
+    """
+    def __init__(self):
+        self.handlers: dict[str, list[FunctionType]] = {}
+
+    def subscribe(self, type_: str, handler: FunctionType):
+        """Subscribe a handler to an event type."""
+        if type_ not in EVENT_TYPES:
+            raise ValueError(f'Invalid event type: {type_}')
+        self.handlers.setdefault(type_, []).append(handler)
+
+    def unsubscribe(self, type_: str, handler: FunctionType):
+        """Unsubscribe a handler from an event type."""
+        self.handlers.get(type_, []).remove(handler)
+
+    def emit(self, type_: str, amount: int = 1, **data):
+        """Emit an event to the handlers of its type."""
+        handlers = self.handlers.get(type_)
+        if handlers is None:
+            if type_ not in EVENT_TYPES:
+                raise ValueError(f'Invalid event type: {type_}')
+            return
+        event = Event(type_, amount, **data)
+        for handler in handlers:
+            handler(event)
@@ -2,14 +2,21 @@
 Mathemagician game core system.
 """
 
+from datetime import datetime
+
 from .cliengine import CliEngine
-from .path import PROFILES_DIR, has_file, load_file
+from .instrument import configure
+from .locks import LockError, ProfileLock, lock_holder
+from .memstats import configure as configure_memstats
+from .path import PROFILES_DIR, path_init, has_file, load_file
 from .profile import Profile, ProfileInstance
+from .shortcuts import Shortcuts, add_shortcut_commands
+from .stats import METRICS, get_stats
 from .util import (
-    interrupt_safe,
+    interrupt_safe, get_settings, save_settings,
     print_text, print_prompt, print_command, print_title,
     print_success, print_error, print_warning, print_info,
-    clear, clear_color,
+    clear, clear_color, flush_output, read_line, in_session,
 )
 
 __all__ = ['Game']
@@ -27,16 +34,35 @@ class Game:
 
     def __init__(self):
         self.num = 1
+        settings = get_settings()
+        # Main menu shortcuts are kept in settings.json, except on a server,
+        # where they only last for the session that defined them.
+        self.shortcuts = Shortcuts(
+            self.engine, {**settings['aliases']}, {**settings['macros']},
+            None if in_session() else self.save_shortcuts,
+        )
+
+    def save_shortcuts(self):
+        """Write the aliases and macros to settings.json."""
+        try:
+            save_settings({'aliases': {**self.shortcuts.aliases},
+                           'macros': {**self.shortcuts.macros}})
+        except OSError as error:
+            print_error(f'Failed to save settings: {error}')
 
     @interrupt_safe
     def run(self):
         """Run the game."""
+        path_init()
+        configure()
+        configure_memstats()
         print_info('Welcome to Mathemagician! Use "help" to get started.')
         self.running = True
         while self.running:
             print_prompt('> ', end='')
             print_command('', end='')
-            command = input('')
+            flush_output()
+            command = read_line()
             clear_color()
             self.parse(self, command)
 
@@ -60,6 +86,8 @@ def clear_screen(self):
     """Clear the screen."""
     clear()
 
+add_shortcut_commands(Game)
+
 @Game.add_command('list')
 def list_profiles(self):
     """List all profiles."""
@@ -76,11 +104,43 @@ def list_profiles(self):
                 print_warning(f'Invalid profile: {profile.stem}')
     if valid_profiles:
         print_info('Available profiles:')
+        timeout = get_settings()['lock_timeout']
         for name, filename in valid_profiles:
-            print_info(f'- {name} ({filename})')
+            open_mark = ' [open]' if lock_holder(filename, timeout) else ''
+            print_info(f'- {name} ({filename}){open_mark}')
     else:
         print_info('No profiles found.')
 
+@Game.add_command('leaderboard [metric] [count:int]', 'top [metric] [count:int]')
+def show_leaderboard(self, metric: str = 'solved', count: int = 10):
+    """Show the top profiles by solved, accuracy, achievements or recent."""
+    if metric not in METRICS:
+        print_error(f'Invalid metric. Metrics: {', '.join(METRICS)}')
+        return
+    if count < 1:
+        print_error('Invalid count.')
+        return
+    entries = get_stats().top(metric, count)
+    if not entries:
+        print_info('No profiles ranked yet.')
+        return
+    print_title(f'Leaderboard: {metric}')
+    for rank, entry in enumerate(entries, 1):
+        if entry.last_update:
+            last_update = datetime.fromtimestamp(entry.last_update)
+            last_update = last_update.strftime('%Y-%m-%d %H:%M')
+        else:
+            last_update = 'never'
+        print_text(f'{rank}. {entry.name}', end='')
+        print_info(f': {entry.solved} solved, {entry.accuracy:.0%} accuracy,'
+                   f' {entry.achievements} achievements, saved {last_update}')
+
+@Game.add_command('rebuildstats')
+def rebuild_stats(self):
+    """Rebuild the leaderboards from all profiles."""
+    count = get_stats().rebuild()
+    print_success(f'Stats rebuilt from {count} profiles.')
+
 @Game.add_command('new')
 def new_profile(self):
     """Create a new profile."""
@@ -89,21 +149,68 @@ def new_profile(self):
     while True:
         print_prompt('>> ', end='')
         print_command('', end='')
-        name = input()
+        flush_output()
+        name = read_line()
         if not name:
             print_error('Invalid name.')
         elif has_file('profiles', f'{name}.json'):
             print_error('Profile already exists.')
         else:
             break
-    profile = Profile(name)
-    profile.save()
+    # Locked, so two processes never create the same profile at once.
+    profile_lock = ProfileLock(name, get_settings()['lock_timeout'])
+    try:
+        profile_lock.acquire()
+    except LockError:
+        print_error('Profile already exists.')
+        return
+    try:
+        if has_file('profiles', f'{name}.json'):
+            print_error('Profile already exists.')
+            return
+        Profile(name).save()
+    finally:
+        profile_lock.release()
     print_success(f'Profile created: {name}')
 
+def _print_holder(holder: dict | None):
+    """Print who holds a profile lock."""
+    if holder is None:
+        print_error('Profile is open elsewhere.')
+        return
+    acquired = datetime.fromtimestamp(holder.get('acquired', 0))
+    acquired = acquired.strftime('%Y-%m-%d %H:%M')
+    print_error(f'Profile is open elsewhere, by process {holder.get('pid')}'
+                f' on {holder.get('host')} since {acquired}.')
+
 @Game.add_command('enter <profile_name>', 'load <profile_name>',
                   'open <profile_name>', 'run <profile_name>')
 def open_profile(self, profile_name: str):
     """Open a profile."""
+    if not has_file('profiles', f'{profile_name}.json'):
+        print_error('Profile does not exist.')
+        return
+    profile_lock = ProfileLock(profile_name, get_settings()['lock_timeout'])
+    try:
+        profile_lock.acquire()
+    except LockError as error:
+        _print_holder(error.holder)
+        print_info(f'Use "view {profile_name}" to open it read-only.')
+        return
+    try:
+        # Loaded once locked, so the latest save is played.
+        profile_obj = load_file('profiles', f'{profile_name}.json')
+        if profile_obj is None:
+            print_error('Invalid profile.')
+            return
+        profile_instance = ProfileInstance(Profile.load(profile_obj), profile_lock)
+        profile_instance.run()
+    finally:
+        profile_lock.release()
+
+@Game.add_command('view <profile_name>')
+def view_profile(self, profile_name: str):
+    """Open a profile read-only, even if it is open elsewhere."""
     if not has_file('profiles', f'{profile_name}.json'):
         print_error('Profile does not exist.')
         return
@@ -111,5 +218,4 @@ def open_profile(self, profile_name: str):
     if profile_obj is None:
         print_error('Invalid profile.')
         return
-    profile_instance = ProfileInstance(Profile.load(profile_obj))
-    profile_instance.run()
+    ProfileInstance(Profile.load(profile_obj), read_only=True).run()
@@ -0,0 +1,277 @@
+"""
+Command instrumentation, used to see where the time of a session goes.
+
+When enabled by the instrumentation setting or the MATHEMAGICIAN_INSTRUMENT
+environment variable, every command parsed by a CliEngine is timed and
+split into sections: matching the command (dispatch), parsing its arguments
+(args), running its handler (handler), and the JSON encoding (encode),
+decoding (decode) and file I/O (io) done meanwhile. Sections do not
+overlap, so the handler time excludes the encoding and I/O it waited for.
+Timings are kept in histograms per command, and work done outside commands,
+like autosaves, is kept under (background).
+
+When disabled, the recorder is None, and each instrumented call site only
+checks it.
+"""
+
+from contextlib import contextmanager, nullcontext
+from os import environ
+from threading import Lock, local
+from time import perf_counter
+from types import FunctionType
+
+from .util import get_settings, print_info, print_text
+
+__all__ = [
+    'SECTIONS', 'Histogram', 'Recorder',
+    'enable', 'disable', 'configure', 'get_recorder', 'timed', 'capture',
+    'stats_rows', 'export_stats', 'print_stats',
+]
+
+SECTIONS = ['total', 'dispatch', 'args', 'handler', 'encode', 'decode', 'io']
+BACKGROUND = '(background)'
+UNKNOWN = '(unknown)'
+# Buckets hold durations up to 2 ** index microseconds.
+BUCKET_COUNT = 32
+
+_NULL_CONTEXT = nullcontext()
+
+
+class Histogram:
+    """
+    Histogram class, used to count durations in power of two buckets.
+
+    Variables:
+        count: int
+            The number of durations.
+        total: float
+            The sum of the durations in seconds.
+        min: float
+            The shortest duration in seconds.
+        max: float
+            The longest duration in seconds.
+        buckets: list[int]
+            The number of durations up to 2 ** index microseconds.
+    """
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * BUCKET_COUNT
+
+    def add(self, seconds: float):
+        """Count a duration."""
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        index = min(int(seconds * 1e6).bit_length(), BUCKET_COUNT - 1)
+        self.buckets[index] += 1
+
+    @property
+    def mean(self) -> float:
+        """The mean duration in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """Return an upper bound of a percentile in seconds."""
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** index / 1e6, self.max)
+        return self.max
+
+    def dump(self) -> dict:
+        """Dump the histogram, with durations in milliseconds."""
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1e3,
+            'mean_ms': self.mean * 1e3,
+            'min_ms': self.min * 1e3 if self.count else 0.0,
+            'p50_ms': self.percentile(0.5) * 1e3,
+            'p90_ms': self.percentile(0.9) * 1e3,
+            'p99_ms': self.percentile(0.99) * 1e3,
+            'max_ms': self.max * 1e3,
+            'buckets': [*self.buckets],
+        }
+
+
+class Recorder:
+    """
+    Recorder class, used to time commands and keep their histograms.
+
+    Variables:
+        histograms: dict[str, dict[str, Histogram]]
+            The histogram of each section of each command.
+    """
+    def __init__(self):
+        self.histograms: dict[str, dict[str, Histogram]] = {}
+        self.lock = Lock()
+        # Commands can nest, like view commands in the inventory command.
+        self.local = local()
+
+    def _stack(self) -> list[dict[str, float]]:
+        """Return the sections of the commands running on this thread."""
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def _record(self, command: str, sections: dict[str, float]):
+        """Add the sections of a command to its histograms."""
+        with self.lock:
+            histograms = self.histograms.setdefault(command, {})
+            for section, seconds in sections.items():
+                if section not in histograms:
+                    histograms[section] = Histogram()
+                histograms[section].add(seconds)
+
+    def begin(self):
+        """Start timing a command."""
+        self._stack().append({})
+
+    def end(self, command: str, seconds: float):
+        """Finish timing a command, taking seconds in total."""
+        sections = self._stack().pop()
+        sections['total'] = seconds
+        self._record(command, sections)
+
+    def add(self, section: str, seconds: float):
+        """Add time to a section of the running command."""
+        if stack := self._stack():
+            stack[-1][section] = stack[-1].get(section, 0.0) + seconds
+        else:
+            self._record(BACKGROUND, {section: seconds})
+
+    def spent(self, *sections: str) -> float:
+        """Return the time spent so far in sections of the running command."""
+        if not (stack := self._stack()):
+            return 0.0
+        return sum(stack[-1].get(section, 0.0) for section in sections)
+
+    @contextmanager
+    def timed(self, section: str):
+        """Time a block as a section."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(section, perf_counter() - start)
+
+    def reset(self):
+        """Forget all timings."""
+        with self.lock:
+            self.histograms.clear()
+
+
+recorder: Recorder | None = None
+
+
+def enable():
+    """Enable instrumentation, keeping the timings if already enabled."""
+    global recorder
+    if recorder is None:
+        recorder = Recorder()
+
+
+def disable():
+    """Disable instrumentation and forget the timings."""
+    global recorder
+    recorder = None
+
+
+def configure():
+    """Enable instrumentation if the setting or the environment asks for it."""
+    if environ.get('MATHEMAGICIAN_INSTRUMENT', '') not in {'', '0'}:
+        enable()
+    elif get_settings().get('instrumentation', False):
+        enable()
+
+
+def get_recorder() -> Recorder | None:
+    """Get the recorder, or None if instrumentation is disabled."""
+    return recorder
+
+
+def timed(section: str):
+    """Time a block as a section, if instrumentation is enabled."""
+    if recorder is None:
+        return _NULL_CONTEXT
+    return recorder.timed(section)
+
+
+def capture(function: FunctionType, *args, limit: int = 20) -> str:
+    """Run a function under cProfile and return the report."""
+    from cProfile import Profile
+    from io import StringIO
+    from pstats import Stats
+
+    profiler = Profile()
+    profiler.runcall(function, *args)
+    stream = StringIO()
+    Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+def stats_rows() -> list[dict]:
+    """Return one row per command and section, for export."""
+    if recorder is None:
+        return []
+    rows = []
+    with recorder.lock:
+        for command, histograms in recorder.histograms.items():
+            for section in SECTIONS:
+                if (histogram := histograms.get(section)) is not None:
+                    rows.append({'command': command, 'section': section,
+                                 **histogram.dump()})
+    return rows
+
+
+def export_stats(path) -> int:
+    """
+    Export the timings to a JSON or CSV file, by its suffix.
+    Return the number of rows. Raise a ValueError for other suffixes.
+    """
+    rows = stats_rows()
+    match path.suffix:
+        case '.json':
+            from .myjson import dump
+            with path.open('w') as file:
+                dump(rows, file)
+        case '.csv':
+            from csv import DictWriter
+            fields = ['command', 'section', 'count', 'total_ms', 'mean_ms',
+                      'min_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms']
+            with path.open('w', newline='') as file:
+                writer = DictWriter(file, fields, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+        case _:
+            raise ValueError(f'Invalid export format: {path.suffix}')
+    return len(rows)
+
+
+def print_stats():
+    """Print the timings of each command, slowest in total first."""
+    if recorder is None:
+        return
+    with recorder.lock:
+        commands = sorted(recorder.histograms.items(),
+                          key=lambda item: -item[1].get('total', Histogram()).total)
+        for command, histograms in commands:
+            total = histograms.get('total')
+            if total is not None:
+                print_text(command, end='')
+                print_info(f': {total.count} calls, mean {total.mean * 1e3:.2f}ms,'
+                           f' p90 {total.percentile(0.9) * 1e3:.2f}ms,'
+                           f' max {total.max * 1e3:.2f}ms')
+            else:
+                print_text(command)
+            sections = [f'{section} {histograms[section].mean * 1e3:.3f}ms'
+                        for section in SECTIONS[1:] if section in histograms]
+            print_info(f'    mean {', '.join(sections)}')
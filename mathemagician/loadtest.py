@@ -0,0 +1,222 @@
+"""
+Headless load-testing harness, used to simulate many players at once.
+
+Each simulated player is a profile instance driven by a scripted or
+randomized command stream through CliEngine.parse, in a pool of worker
+processes against a scratch main directory. The harness reports the
+throughput, the latency percentiles per command and the save/load I/O.
+
+Usage:
+    python -m mathemagician.loadtest [--players N] [--sessions N]
+        [--commands N] [--workers N] [--seed N] [--script FILE]
+        [--main-dir DIR] [--json FILE]
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from json import dump
+from multiprocessing import get_context
+from os import environ
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+__all__ = [
+    'DEFAULT_COMMANDS', 'percentile', 'run_player', 'run_load_test',
+    'print_report',
+]
+
+# Weighted commands for randomized streams. Commands waiting for input,
+# such as the full-screen views, are left out.
+DEFAULT_COMMANDS = {
+    'help': 4,
+    'save': 2,
+    'clear': 2,
+    'problem': 3,
+    'answer 0': 2,
+    '# comment': 1,
+    'unknown command': 1,
+}
+
+
+class NullFile:
+    """File that discards everything written to it."""
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Return a percentile of sorted values by the nearest rank."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def run_player(player: int, sessions: int, commands: int, seed: int,
+               script: list[str] | None = None) -> dict:
+    """
+    Run one simulated player and return its measurements.
+    Called in a worker process with MATHEMAGICIAN_HOME set.
+    """
+    from .path import PROFILES_DIR, read_file
+    from .myjson import loads
+    from .profile import Profile, ProfileInstance
+    from .terminal import TerminalWriter
+    from .util import flush_output, set_writer
+
+    set_writer(TerminalWriter(NullFile(), use_ansi=False))
+    random = Random(seed + player)
+    names = [*DEFAULT_COMMANDS]
+    weights = [*DEFAULT_COMMANDS.values()]
+    name = f'player{player}'
+    path = PROFILES_DIR / f'{name}.json'
+    Profile(name).save()
+
+    latencies = {}
+    bytes_read = bytes_written = 0
+    loads_count = saves_count = 0
+    for session in range(sessions):
+        start = perf_counter()
+        content = read_file('profiles', f'{name}.json')
+        instance = ProfileInstance(Profile.load(loads(content)))
+        latencies.setdefault('<load>', []).append(perf_counter() - start)
+        bytes_read += len(content.encode())
+        loads_count += 1
+
+        if script is not None:
+            stream = script
+        else:
+            stream = random.choices(names, weights, k=commands)
+        for command in [*stream, 'exit']:
+            modified = path.stat().st_mtime_ns
+            start = perf_counter()
+            with instance.lock:
+                instance.parse(instance, command)
+            # Flushed as the prompt loop does, so output does not pile up
+            # and its cost is measured.
+            flush_output()
+            elapsed = perf_counter() - start
+            key = command.split()[0] if command.split() else '<empty>'
+            latencies.setdefault(key, []).append(elapsed)
+            if path.stat().st_mtime_ns != modified:
+                bytes_written += path.stat().st_size
+                saves_count += 1
+            if not getattr(instance, 'running', True):
+                break
+        instance.problems.close()
+
+    return {
+        'latencies': latencies,
+        'bytes_read': bytes_read,
+        'bytes_written': bytes_written,
+        'loads': loads_count,
+        'saves': saves_count,
+    }
+
+
+def run_load_test(players: int = 8, sessions: int = 4, commands: int = 50,
+                  workers: int | None = None, seed: int = 0,
+                  script: list[str] | None = None,
+                  main_dir: str | None = None) -> dict:
+    """Run the load test and return a report."""
+    with TemporaryDirectory(prefix='mathemagician-load-') as scratch:
+        previous = environ.get('MATHEMAGICIAN_HOME')
+        environ['MATHEMAGICIAN_HOME'] = main_dir or scratch
+        try:
+            start = perf_counter()
+            with ProcessPoolExecutor(workers, mp_context=get_context('spawn')) as pool:
+                futures = [pool.submit(run_player, player, sessions,
+                                       commands, seed, script)
+                           for player in range(players)]
+                results = [future.result() for future in futures]
+            wall_time = perf_counter() - start
+        finally:
+            if previous is None:
+                del environ['MATHEMAGICIAN_HOME']
+            else:
+                environ['MATHEMAGICIAN_HOME'] = previous
+
+    latencies = {}
+    for result in results:
+        for key, values in result['latencies'].items():
+            latencies.setdefault(key, []).extend(values)
+    total = sum(len(values) for key, values in latencies.items()
+                if key != '<load>')
+    report = {
+        'players': players,
+        'sessions': sessions,
+        'wall_time': wall_time,
+        'commands': total,
+        'throughput': total / wall_time if wall_time else 0.0,
+        'bytes_read': sum(result['bytes_read'] for result in results),
+        'bytes_written': sum(result['bytes_written'] for result in results),
+        'loads': sum(result['loads'] for result in results),
+        'saves': sum(result['saves'] for result in results),
+        'latency': {},
+    }
+    for key, values in sorted(latencies.items()):
+        values.sort()
+        report['latency'][key] = {
+            'count': len(values),
+            'p50': percentile(values, 0.5),
+            'p90': percentile(values, 0.9),
+            'p99': percentile(values, 0.99),
+            'max': values[-1],
+        }
+    return report
+
+
+def print_report(report: dict):
+    """Print a load test report."""
+    print(f"{report['players']} players x {report['sessions']} sessions:"
+          f" {report['commands']} commands in {report['wall_time']:.2f}s"
+          f" ({report['throughput']:.0f} commands/s)")
+    print(f"I/O: {report['loads']} loads, {report['bytes_read']} bytes read;"
+          f" {report['saves']} saves, {report['bytes_written']} bytes written")
+    print(f"{'command':<16} {'count':>8} {'p50 ms':>9} {'p90 ms':>9}"
+          f" {'p99 ms':>9} {'max ms':>9}")
+    for key, stats in report['latency'].items():
+        print(f"{key:<16} {stats['count']:>8}"
+              f" {stats['p50'] * 1000:>9.3f} {stats['p90'] * 1000:>9.3f}"
+              f" {stats['p99'] * 1000:>9.3f} {stats['max'] * 1000:>9.3f}")
+
+
+def main():
+    parser = ArgumentParser(prog='python -m mathemagician.loadtest',
+                            description='Simulate many players at once.')
+    parser.add_argument('--players', type=int, default=8)
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--commands', type=int, default=50,
+                        help='commands per session for randomized streams')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--script', default=None,
+                        help='file with one command per line')
+    parser.add_argument('--main-dir', default=None,
+                        help='main directory to use instead of a scratch one')
+    parser.add_argument('--json', default=None,
+                        help='file to write the report to as JSON')
+    args = parser.parse_args()
+
+    script = None
+    if args.script is not None:
+        with open(args.script) as file:
+            script = [line.rstrip('\n') for line in file if line.strip()]
+    report = run_load_test(args.players, args.sessions, args.commands,
+                           args.workers, args.seed, script, args.main_dir)
+    print_report(report)
+    if args.json is not None:
+        with open(args.json, 'w') as file:
+            dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Profile locks, used to keep one writer per profile across processes.
+
+A writer holds a profile through a lock record next to its save file,
+created only if none exists, so exactly one process wins. The record names
+its holder and is kept fresh by touching it from a heartbeat thread, so a
+lock whose holder crashed goes stale and can be taken over: at once if the
+holder was a dead process on the same host (on POSIX, where processes can
+be probed), or else once the record has not been touched for the lock
+timeout. A writer checks that it still holds
+its lock before each save, so a writer that lost its lock never overwrites
+the new holder's progress.
+
+Readers take no lock. Saves replace the save file atomically, so a reader
+always loads a whole save, and looking up the holder only reads the record.
+"""
+
+import os
+from os import (
+    O_CREAT, O_EXCL, O_WRONLY,
+    close, getpid, kill, link, open as open_fd, rename, unlink, utime, write,
+)
+from secrets import token_hex
+from socket import gethostname
+from threading import Event, Thread
+from time import time
+
+from .myjson import dumps, loads, JSONDecodeError
+from .path import PROFILES_DIR, path_init
+
+__all__ = ['LockError', 'ProfileLock', 'lock_holder']
+
+
+class LockError(OSError):
+    """Raised when a profile lock is held by another writer or was lost."""
+
+    def __init__(self, message: str, holder: dict | None = None):
+        super().__init__(message)
+        self.holder = holder
+
+
+def _lock_path(name: str):
+    return PROFILES_DIR / f'{name}.lock'
+
+
+def _read_record(path) -> dict | None:
+    """Read a lock record, or return None if there is none."""
+    try:
+        with open(path) as file:
+            record = loads(file.read())
+    except (FileNotFoundError, JSONDecodeError):
+        return
+    return record if isinstance(record, dict) else None
+
+
+def _process_alive(pid: int) -> bool:
+    """
+    Check if a process on this host is running. On Windows, where kill
+    terminates the process, it is assumed running, so only the heartbeat
+    shows it is gone.
+    """
+    if os.name == 'nt':
+        return True
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Running, but owned by another user.
+        return True
+    return True
+
+
+def _is_stale(path, record: dict, timeout: float) -> bool:
+    """Check if a lock record was left by a holder that is gone."""
+    if record.get('host') == gethostname() and isinstance(record.get('pid'), int):
+        if record['pid'] != getpid() and not _process_alive(record['pid']):
+            return True
+    try:
+        touched = path.stat().st_mtime
+    except FileNotFoundError:
+        return True
+    return time() - touched > timeout
+
+
+def lock_holder(name: str, timeout: float = 30) -> dict | None:
+    """
+    Return the lock record of a profile if it is held and not stale,
+    with its pid, host and acquired time, or None.
+    """
+    path = _lock_path(name)
+    record = _read_record(path)
+    if record is None or _is_stale(path, record, timeout):
+        return
+    return record
+
+
+class ProfileLock:
+    """
+    Profile lock class, used to hold the exclusive right to save a profile.
+
+    Variables:
+        name: str
+            The name of the profile.
+        timeout: float
+            The seconds without a heartbeat after which the lock is stale.
+        token: str
+            The identifier of this holder, stored in the record.
+        held: bool
+            Whether the lock was acquired and not released or lost.
+    """
+    name: str
+    timeout: float
+    token: str
+    held: bool
+
+    def __init__(self, name: str, timeout: float = 30):
+        self.name = name
+        self.timeout = timeout
+        self.path = _lock_path(name)
+        self.token = token_hex(8)
+        self.held = False
+        self.stopped = Event()
+        self.thread = None
+
+    def _create(self) -> bool:
+        """Create the lock record, returning False if one exists."""
+        record = {'token': self.token, 'pid': getpid(), 'host': gethostname(),
+                  'acquired': int(time())}
+        try:
+            fd = open_fd(self.path, O_CREAT | O_EXCL | O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        try:
+            write(fd, dumps(record).encode())
+        finally:
+            close(fd)
+        return True
+
+    def _take_over(self, stale: dict):
+        """Move a stale record out of the way, unless it changed meanwhile."""
+        moved = self.path.with_name(f'{self.path.name}.{self.token}.stale')
+        try:
+            rename(self.path, moved)
+        except FileNotFoundError:
+            # Another process took it over first.
+            return
+        if _read_record(moved) != stale:
+            # A fresh record replaced the stale one before the move, so it
+            # is put back, unless yet another record was created since.
+            try:
+                link(moved, self.path)
+            except FileExistsError:
+                pass
+        unlink(moved)
+
+    def acquire(self):
+        """
+        Acquire the lock, taking over a stale one.
+        Raise a LockError if another writer holds it.
+        """
+        path_init()
+        for _ in range(3):
+            if self._create():
+                break
+            record = _read_record(self.path)
+            if record is not None and not _is_stale(self.path, record, self.timeout):
+                raise LockError(f'Profile is locked: {self.name}', record)
+            if record is None and self.path.exists():
+                # The record is being written, or was left empty by a crash.
+                if not _is_stale(self.path, {}, self.timeout):
+                    raise LockError(f'Profile is locked: {self.name}')
+            self._take_over(record)
+        else:
+            raise LockError(f'Profile is locked: {self.name}', _read_record(self.path))
+        self.held = True
+        self.stopped.clear()
+        self.thread = Thread(target=self._heartbeat, name='profile-lock', daemon=True)
+        self.thread.start()
+
+    def renew(self) -> bool:
+        """Touch the lock record if still held, returning whether it is."""
+        if not self.held:
+            return False
+        record = _read_record(self.path)
+        if record is None or record.get('token') != self.token:
+            self.held = False
+            return False
+        try:
+            utime(self.path)
+        except FileNotFoundError:
+            self.held = False
+        return self.held
+
+    def _heartbeat(self):
+        """Renew the lock until it is released or lost."""
+        while not self.stopped.wait(self.timeout / 3):
+            if not self.renew():
+                return
+
+    def release(self):
+        """Release the lock, if still held."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.held:
+            self.held = False
+            record = _read_record(self.path)
+            if record is not None and record.get('token') == self.token:
+                try:
+                    unlink(self.path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,299 @@
+"""
+Memory statistics, used to find what grows in long sessions.
+
+When enabled by the memstats setting or the MATHEMAGICIAN_MEMSTATS
+environment variable, allocations are traced with tracemalloc, and the
+instances of every DataType subclass, like Profile, Item and Empty, are
+counted once constructed. Reports show the live instances of each class,
+the memory held per subsystem (the mathemagician module that last
+allocated it, or (other)) and the lines holding the most memory.
+Snapshots taken at two points can be compared to see what grew in
+between.
+
+When disabled, nothing is traced and no class is hooked, so it costs
+nothing.
+"""
+
+from gc import collect
+from os import environ
+from pathlib import Path
+from threading import RLock
+from time import time
+from types import FunctionType
+import tracemalloc
+
+from .util import get_settings, print_info, print_text
+
+__all__ = [
+    'MemorySnapshot', 'enable', 'disable', 'configure', 'is_enabled',
+    'instance_counts', 'take_snapshot', 'subsystem_sizes', 'top_sites',
+    'compare_snapshots', 'print_report', 'print_diff',
+]
+
+# The frames kept per allocation, to find the subsystem behind it.
+TRACE_FRAMES = 16
+OTHER = '(other)'
+_PACKAGE_DIR = Path(__file__).parent
+
+# Reentrant, as a collection while counting can delete instances.
+_counter_lock = RLock()
+_created: dict[type, int] = {}
+# The ids of the live counted instances, forgotten by __del__, so counting
+# allocates nothing outside this module.
+_live: dict[type, set[int]] = {}
+# The hooked classes, with their own __init__ and __del__ if they had them.
+_hooked: dict[type, tuple[FunctionType | None, FunctionType | None]] = {}
+# Whether tracing was started here rather than by -X tracemalloc.
+_started_tracing = False
+# Snapshots taken by name, forgotten when disabled.
+snapshots: dict[str, 'MemorySnapshot'] = {}
+
+
+class MemorySnapshot:
+    """
+    Memory snapshot class, used to compare memory use between two points.
+
+    Variables:
+        snapshot: tracemalloc.Snapshot
+            The traced allocations, without those of tracing itself.
+        counts: dict[str, int]
+            The live instances of each counted class.
+        time: float
+            The timestamp of the snapshot.
+    """
+    snapshot: tracemalloc.Snapshot
+    counts: dict[str, int]
+    time: float
+
+    def __init__(self, snapshot: tracemalloc.Snapshot, counts: dict[str, int]):
+        self.snapshot = snapshot
+        self.counts = counts
+        self.time = time()
+
+
+def _count(instance: object):
+    """Count a new instance of a hooked class."""
+    cls = type(instance)
+    with _counter_lock:
+        _created[cls] = _created.get(cls, 0) + 1
+        if (live := _live.get(cls)) is None:
+            live = _live[cls] = set()
+        live.add(id(instance))
+
+
+def _forget(instance: object):
+    """Forget a deleted instance of a hooked class."""
+    with _counter_lock:
+        if (live := _live.get(type(instance))) is not None:
+            live.discard(id(instance))
+
+
+def _counting_init(init: FunctionType) -> FunctionType:
+    """Wrap the __init__ of a hooked class to count its constructed instances."""
+    def __init__(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        _count(self)
+    return __init__
+
+
+def _forgetting_del(delete: FunctionType | None) -> FunctionType:
+    """Wrap the __del__ of a hooked class to forget its deleted instances."""
+    def __del__(self):
+        _forget(self)
+        if delete is not None:
+            delete(self)
+    return __del__
+
+
+def enable():
+    """Start tracing allocations and counting instances, if not already."""
+    from .datatype import DataType
+
+    global _started_tracing
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+        _started_tracing = True
+    if DataType not in _hooked:
+        # Subclasses inherit the hooks, or reach them through super().
+        _hooked[DataType] = (DataType.__dict__.get('__init__'),
+                             DataType.__dict__.get('__del__'))
+        DataType.__init__ = _counting_init(DataType.__init__)
+        DataType.__del__ = _forgetting_del(getattr(DataType, '__del__', None))
+
+
+def disable():
+    """
+    Stop tracing if it was started here, unhook the counted classes and
+    forget the snapshots.
+    """
+    global _started_tracing
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+    for cls, methods in _hooked.items():
+        for name, method in zip(['__init__', '__del__'], methods):
+            if method is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, method)
+    _hooked.clear()
+    with _counter_lock:
+        _created.clear()
+        _live.clear()
+    snapshots.clear()
+
+
+def configure():
+    """Enable memory statistics if the setting or the environment asks for it."""
+    if environ.get('MATHEMAGICIAN_MEMSTATS', '') not in {'', '0'}:
+        enable()
+    elif get_settings().get('memstats', False):
+        enable()
+
+
+def is_enabled() -> bool:
+    """Check if memory statistics are enabled."""
+    return bool(_hooked)
+
+
+def _class_name(cls: type) -> str:
+    return f'{cls.__module__.removeprefix('mathemagician.')}.{cls.__qualname__}'
+
+
+def instance_counts() -> dict[str, tuple[int, int]]:
+    """
+    Return the live and created instances of each counted class,
+    most live first. Classes are counted from when memstats is enabled.
+    """
+    collect()
+    with _counter_lock:
+        counts = {_class_name(cls): (len(_live.get(cls, ())), created)
+                  for cls, created in _created.items()}
+    return dict(sorted(counts.items(), key=lambda item: -item[1][0]))
+
+
+def take_snapshot() -> MemorySnapshot:
+    """
+    Take a snapshot of the traced allocations and live instances.
+    Raise a RuntimeError if memstats is disabled.
+    """
+    if not is_enabled():
+        raise RuntimeError('Memory statistics are disabled')
+    collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__, all_frames=True),
+        # Only the allocations made here, like the counts, not those of
+        # the constructors they wrap.
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ])
+    counts = {name: live for name, (live, _) in instance_counts().items()}
+    return MemorySnapshot(snapshot, counts)
+
+
+def _subsystem(traceback: tracemalloc.Traceback) -> str:
+    """Return the mathemagician module that made an allocation, most recent first."""
+    for frame in reversed(traceback):
+        path = Path(frame.filename)
+        if path.is_relative_to(_PACKAGE_DIR):
+            return path.relative_to(_PACKAGE_DIR).parts[0].removesuffix('.py')
+    return OTHER
+
+
+def subsystem_sizes(snapshot: MemorySnapshot) -> dict[str, tuple[int, int]]:
+    """Return the bytes and blocks held by each subsystem, largest first."""
+    sizes = {}
+    # Tracebacks are shared by allocations made at the same place.
+    subsystems = {}
+    for trace in snapshot.snapshot.traces:
+        traceback = trace.traceback
+        if (subsystem := subsystems.get(traceback)) is None:
+            subsystem = subsystems[traceback] = _subsystem(traceback)
+        size, blocks = sizes.get(subsystem, (0, 0))
+        sizes[subsystem] = (size + trace.size, blocks + 1)
+    return dict(sorted(sizes.items(), key=lambda item: -item[1][0]))
+
+
+def _location(traceback: tracemalloc.Traceback) -> str:
+    frame = traceback[0]
+    path = Path(frame.filename)
+    if path.is_relative_to(_PACKAGE_DIR):
+        path = path.relative_to(_PACKAGE_DIR)
+    return f'{path}:{frame.lineno}'
+
+
+def top_sites(snapshot: MemorySnapshot, count: int = 10) -> list[tuple[str, int, int]]:
+    """Return the lines holding the most memory, with their bytes and blocks."""
+    return [(_location(statistic.traceback), statistic.size, statistic.count)
+            for statistic in snapshot.snapshot.statistics('lineno')[:count]]
+
+
+def compare_snapshots(old: MemorySnapshot, new: MemorySnapshot,
+                      count: int = 10) -> dict:
+    """
+    Compare two snapshots. Return the lines that grew the most, with their
+    bytes and blocks gained, and the change in live instances and in
+    bytes held by each subsystem.
+    """
+    sites = [(_location(statistic.traceback), statistic.size_diff, statistic.count_diff)
+             for statistic in new.snapshot.compare_to(old.snapshot, 'lineno')[:count]]
+    old_sizes = subsystem_sizes(old)
+    new_sizes = subsystem_sizes(new)
+    subsystems = {name: new_sizes.get(name, (0, 0))[0] - old_sizes.get(name, (0, 0))[0]
+                  for name in {*old_sizes, *new_sizes}}
+    counts = {name: new.counts.get(name, 0) - old.counts.get(name, 0)
+              for name in {*old.counts, *new.counts}}
+    return {
+        'sites': sites,
+        'subsystems': dict(sorted(subsystems.items(), key=lambda item: -abs(item[1]))),
+        'counts': {name: change for name, change
+                   in sorted(counts.items(), key=lambda item: -abs(item[1]))
+                   if change},
+    }
+
+
+def _format_size(size: int) -> str:
+    """Format a number of bytes with a fitting unit."""
+    if abs(size) < 1024:
+        return f'{size} B'
+    if abs(size) < 1024 ** 2:
+        return f'{size / 1024:.1f} KiB'
+    return f'{size / 1024 ** 2:.1f} MiB'
+
+
+def print_report(count: int = 10):
+    """Print the live instances, the memory per subsystem and the top lines."""
+    snapshot = take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    print_info(f'Traced memory: {_format_size(current)}, peak {_format_size(peak)}')
+    print_text('Live instances:')
+    counts = instance_counts()
+    for name, (live, created) in counts.items():
+        print_info(f'    {name}: {live} live, {created} created')
+    if not counts:
+        print_info('    none created since enabled')
+    print_text('Memory by subsystem:')
+    for name, (size, blocks) in subsystem_sizes(snapshot).items():
+        print_info(f'    {name}: {_format_size(size)} in {blocks} blocks')
+    print_text('Top allocation sites:')
+    for location, size, blocks in top_sites(snapshot, count):
+        print_info(f'    {location}: {_format_size(size)} in {blocks} blocks')
+
+
+def print_diff(old: MemorySnapshot, new: MemorySnapshot, count: int = 10):
+    """Print what changed between two snapshots."""
+    diff = compare_snapshots(old, new, count)
+    print_info(f'Changes over {new.time - old.time:.1f}s:')
+    print_text('Live instances:')
+    for name, change in diff['counts'].items():
+        print_info(f'    {name}: {change:+}')
+    if not diff['counts']:
+        print_info('    no change')
+    print_text('Memory by subsystem:')
+    for name, change in diff['subsystems'].items():
+        print_info(f'    {name}: {'+' if change >= 0 else ''}{_format_size(change)}')
+    print_text('Top growing sites:')
+    for location, size, blocks in diff['sites']:
+        print_info(f'    {location}: {'+' if size >= 0 else ''}{_format_size(size)}'
+                   f' ({blocks:+} blocks)')
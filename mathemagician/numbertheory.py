@@ -0,0 +1,430 @@
+"""
+Number theory kernel, used by puzzles to generate and check answers.
+
+Primes are found with a segmented sieve, one segment of a bytearray at a
+time, and kept in a compact array that grows on demand. Small numbers are
+answered from a table of smallest prime factors, built from the primes by
+slice assignment and grown by doubling up to SPF_LIMIT, so factoring them
+takes one lookup per prime factor. Larger numbers are tested with
+Miller-Rabin, exact below 3.3e24, and factored with Pollard's rho, after
+taking out perfect powers that rho would take too long on, with their
+factorizations kept in a bounded LRU cache. The batch functions grow
+the table once for a whole list of numbers.
+
+>>> factorize(360)
+{2: 3, 3: 2, 5: 1}
+>>> totient(36), divisor_sum(28)
+(12, 56)
+>>> is_prime_many([1, 2, 91, 97, 2 ** 61 - 1])
+[False, True, False, True, True]
+>>> factorize((2 ** 31 - 1) * (2 ** 61 - 1))
+{2147483647: 1, 2305843009213693951: 1}
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from functools import lru_cache
+from itertools import compress, count
+from math import gcd, isqrt, lcm, log
+from threading import Lock
+
+__all__ = [
+    'SPF_LIMIT', 'Sieve', 'get_sieve',
+    'primes_up_to', 'primes_between', 'nth_prime',
+    'is_prime', 'smallest_prime_factor', 'factorize', 'divisors',
+    'totient', 'divisor_sum', 'gcd', 'lcm',
+    'is_prime_many', 'factorize_many', 'totient_many', 'divisor_sum_many',
+    'gcd_many', 'lcm_many',
+]
+
+# The largest smallest prime factor table, at 4 bytes per number.
+SPF_LIMIT = 1 << 20
+# The numbers sieved at a time.
+SEGMENT_SIZE = 1 << 16
+# The factorizations of numbers past the table kept in the cache.
+FACTOR_CACHE_SIZE = 4096
+# Large numbers are divided by the primes below this before Pollard's rho.
+TRIAL_LIMIT = 1024
+# Miller-Rabin with these bases is exact below 3.3e24.
+_WITNESSES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+
+def _sieve_segment(start: int, stop: int, base_primes: Iterable[int]) -> bytearray:
+    """
+    Sieve the numbers from start to stop, with a one for each prime.
+    The base primes must include every prime up to the root of stop.
+    """
+    segment = bytearray(b'\x01') * (stop - start)
+    for prime in base_primes:
+        square = prime * prime
+        if square >= stop:
+            break
+        first = max(square, -(-start // prime) * prime) - start
+        segment[first::prime] = bytes(len(range(first, stop - start, prime)))
+    for number in range(start, min(2, stop)):
+        segment[number - start] = 0
+    return segment
+
+
+class Sieve:
+    """
+    Sieve class, used to keep the primes and smallest prime factors.
+
+    Variables:
+        limit: int
+            The numbers below it are sieved.
+        primes: array
+            The primes below the limit, in order.
+        spf: array
+            The smallest prime factor of each number below its length,
+            with 0 and 1 mapping to themselves.
+        max_spf: int
+            The largest length of the smallest prime factor table.
+    """
+    limit: int
+    primes: array
+    spf: array
+    max_spf: int
+
+    def __init__(self, max_spf: int = SPF_LIMIT):
+        self.limit = 2
+        self.primes = array('Q')
+        self.spf = array('I', [0, 1])
+        self.max_spf = max_spf
+        self.lock = Lock()
+
+    def extend(self, limit: int):
+        """Sieve the numbers below a limit, growing at least twofold."""
+        if limit <= self.limit:
+            return
+        with self.lock:
+            limit = max(limit, 2 * self.limit)
+            while self.limit < limit:
+                start = self.limit
+                # Below the square of the start, the known primes are enough.
+                stop = min(limit, start + SEGMENT_SIZE, start * start)
+                segment = _sieve_segment(start, stop, self.primes)
+                self.primes.extend(compress(range(start, stop), segment))
+                self.limit = stop
+
+    def grow_spf(self, limit: int):
+        """
+        Grow the smallest prime factor table to cover the numbers below
+        a limit, at least twofold and at most to max_spf.
+        """
+        limit = min(limit, self.max_spf)
+        if limit <= len(self.spf):
+            return
+        size = min(max(limit, 2 * len(self.spf)), self.max_spf)
+        root = isqrt(size - 1)
+        self.extend(root + 1)
+        with self.lock:
+            if size <= len(self.spf):
+                return
+            spf = array('I', range(size))
+            # Smaller primes are written last, so they win.
+            for index in reversed(range(bisect_right(self.primes, root))):
+                prime = self.primes[index]
+                spf[prime * prime::prime] = array('I', [prime]) * len(
+                    range(prime * prime, size, prime))
+            self.spf = spf
+
+
+_sieve = None
+
+
+def get_sieve() -> Sieve:
+    """Get the sieve shared by the number theory functions."""
+    global _sieve
+    if _sieve is None:
+        _sieve = Sieve()
+    return _sieve
+
+
+def primes_up_to(number: int) -> array:
+    """Return the primes up to a number."""
+    sieve = get_sieve()
+    sieve.extend(number + 1)
+    return sieve.primes[:bisect_right(sieve.primes, number)]
+
+
+def primes_between(start: int, stop: int) -> array:
+    """
+    Return the primes from start to stop, excluded. Ranges past the sieve
+    are sieved a segment at a time without growing it.
+    """
+    sieve = get_sieve()
+    start = max(start, 0)
+    if stop <= max(sieve.limit, sieve.max_spf):
+        sieve.extend(stop)
+        primes = sieve.primes
+        return primes[bisect_left(primes, start):bisect_left(primes, stop)]
+    sieve.extend(isqrt(stop - 1) + 1)
+    primes = array('Q')
+    for segment_start in range(start, stop, SEGMENT_SIZE):
+        segment_stop = min(segment_start + SEGMENT_SIZE, stop)
+        segment = _sieve_segment(segment_start, segment_stop, sieve.primes)
+        primes.extend(compress(range(segment_start, segment_stop), segment))
+    return primes
+
+
+def nth_prime(index: int) -> int:
+    """
+    Return the prime at an index from 1.
+    Raise a ValueError if the index is not positive.
+    """
+    if index < 1:
+        raise ValueError('Prime index must be positive')
+    sieve = get_sieve()
+    if index >= 6:
+        # The nth prime is below n (log n + log log n) from the sixth.
+        sieve.extend(int(index * (log(index) + log(log(index)))) + 1)
+    while len(sieve.primes) < index:
+        sieve.extend(2 * sieve.limit)
+    return sieve.primes[index - 1]
+
+
+def _miller_rabin(number: int) -> bool:
+    """Test an odd number past the small primes for primality."""
+    for prime in _WITNESSES:
+        if number % prime == 0:
+            return number == prime
+    exponent = number - 1
+    shift = (exponent & -exponent).bit_length() - 1
+    exponent >>= shift
+    for witness in _WITNESSES:
+        value = pow(witness, exponent, number)
+        if value == 1 or value == number - 1:
+            continue
+        for _ in range(shift - 1):
+            value = value * value % number
+            if value == number - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _pollard_rho(number: int) -> int:
+    """Find a factor of an odd composite number, with Brent's cycle finding."""
+    for constant in count(1):
+        y, product, factor, power = 2, 1, 1, 1
+        while factor == 1:
+            x = y
+            for _ in range(power):
+                y = (y * y + constant) % number
+            done = 0
+            while done < power and factor == 1:
+                saved = y
+                # Differences are multiplied together, so gcd runs rarely.
+                for _ in range(min(128, power - done)):
+                    y = (y * y + constant) % number
+                    product = product * abs(x - y) % number
+                factor = gcd(product, number)
+                done += 128
+            power *= 2
+        if factor == number:
+            # The batch overshot, so step through it one at a time.
+            factor = 1
+            while factor == 1:
+                saved = (saved * saved + constant) % number
+                factor = gcd(abs(x - saved), number)
+        if factor != number:
+            return factor
+
+
+def _integer_root(number: int, degree: int) -> int:
+    """Return the integer part of a root of a positive number."""
+    # Newton's method from above, which decreases until it reaches the root.
+    root = 1 << -(-number.bit_length() // degree)
+    while True:
+        estimate = ((degree - 1) * root + number // root ** (degree - 1)) // degree
+        if estimate >= root:
+            return root
+        root = estimate
+
+
+def _perfect_power(number: int) -> tuple[int, int] | None:
+    """
+    Find a root and prime degree of a number past trial division that is
+    a perfect power, or return None.
+    """
+    sieve = get_sieve()
+    # The root is at least TRIAL_LIMIT, which bounds the degree.
+    for degree in sieve.primes:
+        if TRIAL_LIMIT ** degree > number:
+            break
+        if (root := _integer_root(number, degree)) ** degree == number:
+            return root, degree
+
+
+def _factor_small(number: int, spf: array) -> dict[int, int]:
+    """Factor a number covered by the smallest prime factor table."""
+    factors = {}
+    while number > 1:
+        prime = spf[number]
+        factors[prime] = factors.get(prime, 0) + 1
+        number //= prime
+    return factors
+
+
+@lru_cache(maxsize=FACTOR_CACHE_SIZE)
+def _factor_large(number: int) -> tuple[tuple[int, int], ...]:
+    """Factor a number past the smallest prime factor table."""
+    sieve = get_sieve()
+    sieve.extend(TRIAL_LIMIT)
+    factors = {}
+    for prime in sieve.primes:
+        if prime >= TRIAL_LIMIT or prime * prime > number:
+            break
+        while number % prime == 0:
+            factors[prime] = factors.get(prime, 0) + 1
+            number //= prime
+    # Numbers left to factor, with the times they divide the original.
+    pending = [(number, 1)] if number > 1 else []
+    while pending:
+        number, multiplicity = pending.pop()
+        if number < len(sieve.spf):
+            for prime, exponent in _factor_small(number, sieve.spf).items():
+                factors[prime] = factors.get(prime, 0) + exponent * multiplicity
+        elif number < TRIAL_LIMIT ** 2 or _miller_rabin(number):
+            # Past trial division, a number below its square is prime.
+            factors[number] = factors.get(number, 0) + multiplicity
+        elif (power := _perfect_power(number)) is not None:
+            # Rho only finds a factor of a prime power after about the
+            # root of the prime steps.
+            root, degree = power
+            pending.append((root, multiplicity * degree))
+        else:
+            factor = _pollard_rho(number)
+            pending += [(factor, multiplicity), (number // factor, multiplicity)]
+    return tuple(sorted(factors.items()))
+
+
+def _prepare(limit: int) -> array:
+    """Grow the table for numbers below a limit and return it."""
+    sieve = get_sieve()
+    sieve.grow_spf(limit)
+    return sieve.spf
+
+
+def is_prime(number: int) -> bool:
+    """Check if a number is prime."""
+    if number < 2:
+        return False
+    spf = _prepare(number + 1)
+    if number < len(spf):
+        return spf[number] == number
+    return _miller_rabin(number)
+
+
+def smallest_prime_factor(number: int) -> int:
+    """
+    Return the smallest prime factor of a number above 1.
+    Raise a ValueError otherwise.
+    """
+    if number < 2:
+        raise ValueError('Only integers above 1 have prime factors')
+    spf = _prepare(number + 1)
+    if number < len(spf):
+        return spf[number]
+    return _factor_large(number)[0][0]
+
+
+def factorize(number: int) -> dict[int, int]:
+    """
+    Return the exponent of each prime factor of a positive number.
+    Raise a ValueError otherwise.
+    """
+    if number < 1:
+        raise ValueError('Only positive integers can be factored')
+    spf = _prepare(number + 1)
+    if number < len(spf):
+        return _factor_small(number, spf)
+    return dict(_factor_large(number))
+
+
+def _totient(factors: dict[int, int], number: int) -> int:
+    for prime in factors:
+        number -= number // prime
+    return number
+
+
+def _divisor_sum(factors: dict[int, int], power: int) -> int:
+    total = 1
+    for prime, exponent in factors.items():
+        if power == 0:
+            total *= exponent + 1
+        else:
+            base = prime ** power
+            total *= (base ** (exponent + 1) - 1) // (base - 1)
+    return total
+
+
+def divisors(number: int) -> list[int]:
+    """Return the divisors of a positive number in order."""
+    result = [1]
+    for prime, exponent in factorize(number).items():
+        result = [divisor * prime ** power for divisor in result
+                  for power in range(exponent + 1)]
+    return sorted(result)
+
+
+def totient(number: int) -> int:
+    """Return the count of numbers up to a positive number coprime to it."""
+    return _totient(factorize(number), number)
+
+
+def divisor_sum(number: int, power: int = 1) -> int:
+    """
+    Return the sum of the divisors of a positive number raised to a power,
+    so power 0 counts them.
+    """
+    return _divisor_sum(factorize(number), power)
+
+
+def is_prime_many(numbers: Iterable[int]) -> list[bool]:
+    """Check if each number is prime."""
+    numbers = list(numbers)
+    spf = _prepare(max(numbers, default=0) + 1)
+    size = len(spf)
+    return [number >= 2 and (spf[number] == number if number < size
+                             else _miller_rabin(number))
+            for number in numbers]
+
+
+def factorize_many(numbers: Iterable[int]) -> list[dict[int, int]]:
+    """
+    Factor each positive number.
+    Raise a ValueError if any is not positive.
+    """
+    numbers = list(numbers)
+    if min(numbers, default=1) < 1:
+        raise ValueError('Only positive integers can be factored')
+    spf = _prepare(max(numbers, default=0) + 1)
+    size = len(spf)
+    return [_factor_small(number, spf) if number < size
+            else dict(_factor_large(number))
+            for number in numbers]
+
+
+def totient_many(numbers: Iterable[int]) -> list[int]:
+    """Return the totient of each positive number."""
+    numbers = list(numbers)
+    return [*map(_totient, factorize_many(numbers), numbers)]
+
+
+def divisor_sum_many(numbers: Iterable[int], power: int = 1) -> list[int]:
+    """Return the divisor sum of each positive number."""
+    return [_divisor_sum(factors, power) for factors in factorize_many(numbers)]
+
+
+def gcd_many(firsts: Iterable[int], seconds: Iterable[int]) -> list[int]:
+    """Return the greatest common divisor of each pair of numbers."""
+    return [*map(gcd, firsts, seconds)]
+
+
+def lcm_many(firsts: Iterable[int], seconds: Iterable[int]) -> list[int]:
+    """Return the least common multiple of each pair of numbers."""
+    return [*map(lcm, firsts, seconds)]
@@ -2,25 +2,41 @@
 Path management for mathemagician.
 """
 
+from mmap import mmap, ACCESS_READ
+from os import environ
 from pathlib import Path
 
-from .myjson import dump, load, JSONDecodeError
+from .datapack import PACK_NAME, read_pack_header
+from .instrument import timed
+from .myjson import dump, dumps, load, loads, JSONDecodeError
 
 __all__ = [
-    'MAIN_DIR', 'PROFILES_DIR', 'DATA_DIR', 'SETTINGS_JSON', 'path_init',
-    'has_data', 'read_data', 'load_data',
+    'MAIN_DIR', 'PROFILES_DIR', 'EXPORTS_DIR', 'DATA_DIR', 'DATA_PACK', 'SETTINGS_JSON',
+    'path_init',
+    'has_data', 'read_data', 'load_data', 'view_data',
     'has_file', 'read_file', 'load_file', 'write_file', 'dump_file',
 ]
 
-MAIN_DIR = Path.home() / 'mathemagician'
+# MATHEMAGICIAN_HOME overrides the main directory, e.g. for scratch stores.
+MAIN_DIR = Path(environ.get('MATHEMAGICIAN_HOME', Path.home() / 'mathemagician'))
 PROFILES_DIR = MAIN_DIR / 'profiles'
+EXPORTS_DIR = MAIN_DIR / 'exports'
 DATA_DIR = Path(__file__).parent / 'data'
+DATA_PACK = Path(__file__).parent / PACK_NAME
 SETTINGS_JSON = MAIN_DIR / 'settings.json'
 
+_initialized = False
+
 
 def path_init():
-    """Initialize the mathemagician path."""
-    if not DATA_DIR.exists():
+    """
+    Initialize the mathemagician path.
+    Called on first use of the main directory rather than on import.
+    """
+    global _initialized
+    if _initialized:
+        return
+    if not DATA_DIR.exists() and not DATA_PACK.exists():
         raise RuntimeError('data path does not exist')
     if not MAIN_DIR.exists():
         MAIN_DIR.mkdir()
@@ -28,18 +44,78 @@ def path_init():
         PROFILES_DIR.mkdir()
     if not SETTINGS_JSON.exists():
         SETTINGS_JSON.touch()
-        with (DATA_DIR / 'default_settings.json').open() as file:
-            default_settings = load(file)
+        default_settings = load_data('default_settings.json')
         with SETTINGS_JSON.open('w') as file:
             dump(default_settings, file)
+    _initialized = True
+
+
+_pack = None
+
+
+def _pack_is_stale() -> bool:
+    """
+    Check if a loose data file changed after the data pack was built, as
+    in a source checkout, so the edited files are used instead.
+    """
+    if not DATA_DIR.exists():
+        return False
+    built = DATA_PACK.stat().st_mtime
+    return any(path.stat().st_mtime > built
+               for path in DATA_DIR.rglob('*') if path.is_file())
+
+
+def _get_pack() -> tuple[memoryview, dict, int] | None:
+    """
+    Map the data pack into memory on first use.
+    Return None if there is no valid and up to date pack, so loose files
+    are used instead.
+    """
+    global _pack
+    if _pack is None:
+        _pack = ()
+        if DATA_PACK.exists() and not _pack_is_stale():
+            try:
+                with DATA_PACK.open('rb') as file:
+                    # Empty files cannot be mapped and raise a ValueError.
+                    buffer = memoryview(mmap(file.fileno(), 0, access=ACCESS_READ))
+                toc, base = read_pack_header(buffer)
+            except (OSError, ValueError) as error:
+                print(f'Ignoring data pack {DATA_PACK}: {error}')
+            else:
+                _pack = (buffer, toc, base)
+    return _pack or None
+
+
+def _find_data(path: tuple[str, ...]) -> tuple[memoryview, str] | None:
+    """Find an asset in the data pack as a zero-copy slice."""
+    if (pack := _get_pack()) is None:
+        return
+    buffer, toc, base = pack
+    if (entry := toc.get('/'.join(path))) is None:
+        return
+    offset, length, encoding = entry
+    return buffer[base + offset:base + offset + length], encoding
+
 
 def has_data(*path: str) -> bool:
     """Check if data exists in the data directory."""
+    if _find_data(path) is not None:
+        return True
     return DATA_DIR.joinpath(*path).exists()
 
 
+def view_data(*path: str) -> memoryview:
+    """View data from the data pack without copying, or read a loose file."""
+    if (found := _find_data(path)) is not None:
+        return found[0]
+    return memoryview(DATA_DIR.joinpath(*path).read_bytes())
+
+
 def read_data(*path: str) -> str:
     """Read data from the data directory."""
+    if (found := _find_data(path)) is not None:
+        return str(found[0], 'utf-8')
     with DATA_DIR.joinpath(*path).open() as file:
         return file.read()
 
@@ -47,6 +123,8 @@ def read_data(*path: str) -> str:
 def load_data(*path: str) -> dict:
     """Load data from the data directory."""
     try:
+        if (found := _find_data(path)) is not None:
+            return loads(str(found[0], 'utf-8'))
         with DATA_DIR.joinpath(*path).open() as file:
             return load(file)
     except JSONDecodeError:
@@ -61,15 +139,16 @@ def has_file(*path: str) -> bool:
 
 def read_file(*path: str) -> str:
     """Read data from the main directory."""
-    with MAIN_DIR.joinpath(*path).open() as file:
+    with timed('io'), MAIN_DIR.joinpath(*path).open() as file:
         return file.read()
 
 
 def load_file(*path: str) -> dict:
     """Load data from the main directory."""
+    content = read_file(*path)
     try:
-        with MAIN_DIR.joinpath(*path).open() as file:
-            return load(file)
+        with timed('decode'):
+            return loads(content)
     except JSONDecodeError:
         print(f'Error loading data from {MAIN_DIR.joinpath(*path)}')
         return
@@ -77,11 +156,13 @@ def load_file(*path: str) -> dict:
 
 def write_file(content: str, *path: str):
     """Write data to the main directory."""
-    with MAIN_DIR.joinpath(*path).open('w') as file:
+    path_init()
+    with timed('io'), MAIN_DIR.joinpath(*path).open('w') as file:
         file.write(content)
 
 
 def dump_file(data: dict, *path: str):
     """Dump data to the main directory."""
-    with MAIN_DIR.joinpath(*path).open('w') as file:
-        dump(data, file)
+    with timed('encode'):
+        content = dumps(data)
+    write_file(content, *path)
@@ -0,0 +1,313 @@
+"""
+Math problem generator, used to create questions in batches.
+
+Problems are generated a batch at a time, drawing all the random numbers of
+a batch at once (with NumPy when it is installed, pure Python otherwise).
+Each batch of a topic and difficulty is seeded from the profile seed and
+its batch index, so every profile gets a reproducible stream of problems
+for a given backend. The batch counters are saved with the profile, so a
+new session carries on with the stream instead of repeating it. The
+problem bank keeps a queue per topic and
+difficulty, drawing in O(1) and refilling in the background before a queue
+runs out.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from fractions import Fraction
+from random import Random
+from threading import Lock
+from types import FunctionType
+from zlib import crc32
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .datatype import DataType, Variable
+from .numbertheory import (
+    divisor_sum_many, factorize_many, gcd_many, lcm_many, totient_many,
+)
+
+__all__ = [
+    'TOPICS', 'DIFFICULTIES', 'Problem', 'ProblemBank',
+    'problem_seed', 'generate_problems',
+]
+
+DIFFICULTIES = range(1, 6)
+
+
+class Problem(DataType):
+    """
+    Problem data type, used to store a question and its answer.
+
+    Variables:
+        topic: str
+            The topic of the problem.
+        difficulty: int
+            The difficulty of the problem, from 1 to 5.
+        question: str
+            The question shown to the player.
+        answer: str
+            The exact answer, as an integer or a fraction.
+    """
+    variables = [
+        Variable('topic', str),
+        Variable('difficulty', int),
+        Variable('question', str),
+        Variable('answer', str),
+    ]
+
+    def check(self, answer: str | int | Fraction) -> bool:
+        """Check an answer, comparing numbers exactly."""
+        try:
+            if isinstance(answer, str):
+                answer = Fraction(answer.strip())
+            return answer == Fraction(self.answer)
+        except (ValueError, ZeroDivisionError):
+            return False
+
+
+class _NumpyRandom:
+    """Batch random source backed by NumPy."""
+
+    def __init__(self, seed: list[int]):
+        self.generator = numpy.random.default_rng(seed)
+
+    def integers(self, low: int, high: int, size: int) -> list[int]:
+        return self.generator.integers(low, high, size).tolist()
+
+
+class _PythonRandom:
+    """Batch random source in pure Python."""
+
+    def __init__(self, seed: list[int]):
+        self.generator = Random(':'.join(f'{part}' for part in seed))
+
+    def integers(self, low: int, high: int, size: int) -> list[int]:
+        randrange = self.generator.randrange
+        return [randrange(low, high) for _ in range(size)]
+
+
+BatchRandom = _PythonRandom if numpy is None else _NumpyRandom
+
+
+def _term(coefficient: int, name: str) -> str:
+    """Format a coefficient times a variable name."""
+    if coefficient == 1:
+        return name
+    if coefficient == -1:
+        return f'-{name}'
+    return f'{coefficient}{name}'
+
+
+def _signed(value: int) -> str:
+    """Format a value added to an expression."""
+    return f'+ {value}' if value >= 0 else f'- {-value}'
+
+
+def _generate_arithmetic(random: BatchRandom, difficulty: int,
+                         size: int) -> list[tuple[str, str]]:
+    high = 10 ** difficulty
+    small_high = 2 + 5 * difficulty
+    operators = random.integers(0, 4, size)
+    firsts = random.integers(1, high, size)
+    seconds = random.integers(1, high, size)
+    factors = random.integers(1, small_high, size)
+    divisors = random.integers(2, small_high, size)
+    problems = []
+    for operator, first, second, factor, divisor in zip(
+            operators, firsts, seconds, factors, divisors):
+        match operator:
+            case 0:
+                problems.append((f'{first} + {second}', f'{first + second}'))
+            case 1:
+                problems.append((f'{first} - {second}', f'{first - second}'))
+            case 2:
+                problems.append((f'{factor} * {divisor}', f'{factor * divisor}'))
+            case 3:
+                problems.append((f'{factor * divisor} / {divisor}', f'{factor}'))
+    return problems
+
+
+def _generate_algebra(random: BatchRandom, difficulty: int,
+                      size: int) -> list[tuple[str, str]]:
+    high = 10 ** ((difficulty + 1) // 2) + 1
+    small_high = 2 + 3 * difficulty
+    coefficients = random.integers(1, small_high, size)
+    signs = random.integers(0, 2, size)
+    offsets = random.integers(-high, high, size)
+    values = random.integers(-high, high, size)
+    problems = []
+    for coefficient, sign, offset, value in zip(coefficients, signs,
+                                                offsets, values):
+        if sign and difficulty > 1:
+            coefficient = -coefficient
+        if difficulty >= 4:
+            # Pick the right-hand side freely, so the solution is a fraction.
+            result = value
+            solution = Fraction(result - offset, coefficient)
+        else:
+            result = coefficient * value + offset
+            solution = Fraction(value)
+        equation = f'{_term(coefficient, 'x')} {_signed(offset)} = {result}'
+        problems.append((f'Solve for x: {equation}', f'{solution}'))
+    return problems
+
+
+def _generate_number_theory(random: BatchRandom, difficulty: int,
+                            size: int) -> list[tuple[str, str]]:
+    high = 4 * 10 ** ((difficulty + 1) // 2)
+    small_high = 2 + 5 * difficulty
+    # Totients, divisor sums and prime factors start at difficulty 2.
+    kinds = random.integers(0, 3 if difficulty == 1 else 6, size)
+    factors = random.integers(1, small_high, size)
+    firsts = random.integers(1, high, size)
+    seconds = random.integers(1, high, size)
+    moduli = random.integers(2, small_high, size)
+    firsts = [factor * first for factor, first in zip(factors, firsts)]
+    seconds = [factor * second for factor, second in zip(factors, seconds)]
+    divisors = gcd_many(firsts, seconds)
+    multiples = lcm_many(firsts, seconds)
+    if difficulty > 1:
+        numbers = random.integers(2, 10 ** difficulty, size)
+        totients = totient_many(numbers)
+        sums = divisor_sum_many(numbers)
+        largest = [max(prime_factors) for prime_factors in factorize_many(numbers)]
+    else:
+        numbers = totients = sums = largest = [None] * size
+    problems = []
+    for (kind, first, second, divisor, multiple, modulus,
+         number, totient, total, prime) in zip(
+            kinds, firsts, seconds, divisors, multiples, moduli,
+            numbers, totients, sums, largest):
+        match kind:
+            case 0:
+                problems.append((f'gcd({first}, {second})', f'{divisor}'))
+            case 1:
+                problems.append((f'lcm({first}, {second})', f'{multiple}'))
+            case 2:
+                problems.append((f'{first} mod {modulus}', f'{first % modulus}'))
+            case 3:
+                problems.append((f'How many numbers from 1 to {number}'
+                                 f' are coprime to {number}?', f'{totient}'))
+            case 4:
+                problems.append((f'Sum of the divisors of {number}', f'{total}'))
+            case 5:
+                problems.append((f'Largest prime factor of {number}', f'{prime}'))
+    return problems
+
+
+TOPICS: dict[str, FunctionType] = {
+    'arithmetic': _generate_arithmetic,
+    'algebra': _generate_algebra,
+    'number_theory': _generate_number_theory,
+}
+
+
+def problem_seed(name: str) -> int:
+    """Return the problem seed of a profile name."""
+    return crc32(name.encode())
+
+
+def generate_problems(topic: str, difficulty: int, size: int,
+                      seed: int, batch: int = 0) -> list[Problem]:
+    """
+    Generate a batch of problems of a topic and difficulty.
+    Raise a ValueError if the topic or difficulty is invalid.
+    """
+    if topic not in TOPICS:
+        raise ValueError(f'Invalid topic: {topic}')
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f'Invalid difficulty: {difficulty}')
+    topic_index = [*TOPICS].index(topic)
+    random = BatchRandom([seed, topic_index, difficulty, batch])
+    return [Problem(topic, difficulty, question, answer)
+            for question, answer in TOPICS[topic](random, difficulty, size)]
+
+
+class ProblemBank:
+    """
+    Problem bank, used to serve problems indexed by topic and difficulty.
+
+    Variables:
+        seed: int
+            The seed of the problem streams.
+        batch_size: int
+            The number of problems generated per batch.
+        low_water: int
+            The queue length under which a refill is scheduled.
+        batches: dict[str, int]
+            The batches generated of each topic and difficulty, keyed
+            by "topic:difficulty".
+    """
+    seed: int
+    batch_size: int
+    low_water: int
+    batches: dict[str, int]
+
+    def __init__(self, seed: int, batch_size: int = 256, low_water: int = 64,
+                 batches: dict[str, int] | None = None):
+        self.seed = seed
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.batches = {} if batches is None else batches
+        self.queues: dict[tuple[str, int], deque[Problem]] = {}
+        self.scheduled: set[tuple[str, int]] = set()
+        self.lock = Lock()
+        self.generate_lock = Lock()
+        self.executor = None
+
+    def _refill(self, key: tuple[str, int]):
+        """Generate the next batch of a queue."""
+        # Batches are generated one at a time so they queue up in order,
+        # while draws and scheduling only wait for the bookkeeping lock.
+        name = f'{key[0]}:{key[1]}'
+        with self.generate_lock:
+            with self.lock:
+                batch = self.batches.get(name, 0)
+            problems = generate_problems(*key, self.batch_size, self.seed, batch)
+            with self.lock:
+                self.batches[name] = batch + 1
+                self.queues.setdefault(key, deque()).extend(problems)
+                self.scheduled.discard(key)
+
+    def _schedule(self, key: tuple[str, int]):
+        """Refill a queue in the background, unless already scheduled."""
+        with self.lock:
+            if key in self.scheduled:
+                return
+            self.scheduled.add(key)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(1, 'problem-bank')
+        self.executor.submit(self._refill, key)
+
+    def prefill(self, topics: list[str] | None = None,
+                difficulties: list[int] | None = None):
+        """Fill queues in the background ahead of the first draws."""
+        for topic in topics or TOPICS:
+            for difficulty in difficulties or DIFFICULTIES:
+                self._schedule((topic, difficulty))
+
+    def draw(self, topic: str, difficulty: int) -> Problem:
+        """
+        Draw the next problem of a topic and difficulty.
+        Raise a ValueError if the topic or difficulty is invalid.
+        """
+        key = (topic, difficulty)
+        queue = self.queues.get(key)
+        if not queue:
+            # Only reached before the first background refill is done.
+            self._refill(key)
+            queue = self.queues[key]
+        problem = queue.popleft()
+        if len(queue) < self.low_water:
+            self._schedule(key)
+        return problem
+
+    def close(self):
+        """Stop the background refills."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
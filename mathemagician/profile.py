@@ -6,19 +6,39 @@ The Profile class is a data type that stores information about a profile.
 The ProfileInstance class is a class that represents a profile instance.
 """
 
+from contextlib import contextmanager
+from fractions import Fraction
 from numbers import Number
+from os import replace
+from re import fullmatch
+from threading import RLock
+from time import time
 
+from .achievements import (
+    Acheivement, AchievementDefinition, AchievementTracker, load_achievements,
+)
+from .autosave import AutosaveScheduler
 from .cliengine import CliEngine
 from .datatype import DataType, Variable
+from .events import EventBus
+from .instrument import (
+    capture, disable, enable, export_stats, get_recorder, print_stats, timed,
+)
 from .items import Item, Empty
-from .myjson import dump
-from .path import PROFILES_DIR
+from .locks import LockError, ProfileLock
+from .myjson import dumps
+from .path import EXPORTS_DIR, PROFILES_DIR, path_init
+from .problems import TOPICS, DIFFICULTIES, ProblemBank, problem_seed
+from .shortcuts import Shortcuts, add_shortcut_commands
+from .stats import ProfileStats, get_stats
 from .util import (
     interrupt_safe,
     print_text, print_prompt, print_command, print_title,
     print_success, print_error, print_warning, print_info,
-    clear, clear_color,
+    clear, clear_color, flush_output, read_line, get_settings, is_type,
+    in_session,
 )
+from .views import InventoryView, StatusView
 
 __all__ = ['Profile', 'ProfileInstance']
 
@@ -37,17 +57,76 @@ class Profile(DataType):
             lambda value: [item.dump() for item in value],
             lambda value: all(Item.is_valid(item) for item in value),
         ),
+        Variable(
+            'achievements', list, lambda: [], False,
+            lambda value: [Acheivement.load(item) for item in value],
+            lambda value: [item.dump() for item in value],
+            lambda value: all(Acheivement.is_valid(item) for item in value),
+        ),
+        Variable(
+            'progress', dict, lambda: {}, False,
+            None, lambda value: {**value},
+            lambda value: is_type(value, dict[str, int]),
+        ),
+        Variable(
+            'totals', dict, lambda: {}, False,
+            None, lambda value: {**value},
+            lambda value: is_type(value, dict[str, int]),
+        ),
+        Variable(
+            'aliases', dict, lambda: {}, False,
+            None, lambda value: {**value},
+            lambda value: is_type(value, dict[str, str]),
+        ),
+        Variable(
+            'macros', dict, lambda: {}, False,
+            None, lambda value: {**value},
+            lambda value: is_type(value, dict[str, str]),
+        ),
+        Variable(
+            'problem_batches', dict, lambda: {}, False,
+            None, lambda value: {**value},
+            lambda value: is_type(value, dict[str, int]),
+        ),
     ]
 
     def save(self):
         """Save the profile."""
-        with open(PROFILES_DIR / f'{self.name}.json', 'w') as file:
-            dump(self.dump(), file)
+        self.write(self.dump())
+
+    def write(self, data: dict):
+        """
+        Write dumped profile data, replacing the save file atomically,
+        and record the profile stats.
+        """
+        path_init()
+        self.last_update = data['last_update'] = int(time())
+        with timed('encode'):
+            content = dumps(data)
+        path = PROFILES_DIR / f'{self.name}.json'
+        temp_path = path.with_suffix('.json.tmp')
+        with timed('io'):
+            with open(temp_path, 'w') as file:
+                file.write(content)
+            replace(temp_path, path)
+        try:
+            with timed('io'):
+                get_stats().record(ProfileStats.from_profile(data))
+        except OSError as error:
+            print_warning(f'Failed to record stats: {error}')
 
 
 class ProfileInstance:
     """
     Profile instance class, used to run a profile.
+
+    Variables:
+        profile: Profile
+            The profile being played.
+        profile_lock: ProfileLock | None
+            The lock held to save the profile, None if read-only.
+        read_only: bool
+            Whether the profile is only viewed, so it is never saved.
     """
     engine = CliEngine()
     add_command = engine.add_command
@@ -55,32 +134,127 @@ class ProfileInstance:
     commands = engine.commands
     documentation = engine.documentation
 
-    def __init__(self, profile: str):
+    def __init__(self, profile: Profile, profile_lock: ProfileLock | None = None,
+                 read_only: bool = False):
         self.profile = profile
         self.name = profile.name
+        self.profile_lock = profile_lock
+        self.read_only = read_only
+        # Held while a command runs, so autosave snapshots are consistent.
+        self.lock = RLock()
+        settings = get_settings()
+        self.autosave = AutosaveScheduler(
+            self.lock, profile.dump, self.write,
+            0 if read_only else settings['autosave_interval'],
+            settings['autosave_idle'], settings['autosave_changes'],
+        )
+        # Batch counters are saved with the profile, so problems do not
+        # repeat across sessions.
+        self.problems = ProblemBank(problem_seed(profile.name),
+                                    batches=profile.problem_batches)
+        self.problem = None
+        self.events = EventBus()
+        self.achievements = AchievementTracker(
+            load_achievements(), profile.progress, profile.achievements,
+            self.on_achievement,
+        )
+        self.achievements.attach(self.events)
+        # Profile shortcuts are saved with the profile.
+        self.shortcuts = Shortcuts(
+            self.engine, profile.aliases, profile.macros, self.mark_changed,
+        )
 
-    def save(self):
-        """Save the profile."""
-        self.profile.save()
+    def write(self, data: dict):
+        """
+        Write dumped profile data if the profile lock is still held.
+        Raise a LockError if it was lost to another writer.
+        """
+        if self.read_only:
+            raise LockError(f'Profile is read-only: {self.name}')
+        if self.profile_lock is not None and not self.profile_lock.renew():
+            raise LockError(f'Profile lock lost: {self.name}')
+        self.profile.write(data)
+
+    def save(self) -> bool:
+        """Save the profile, returning whether it was saved."""
+        if self.read_only:
+            print_warning('Profile is read-only, changes are not saved.')
+            return False
+        self.events.emit('profile_saved')
+        try:
+            self.autosave.save(force=True)
+        except OSError as error:
+            print_error(f'Failed to save profile: {error}')
+            return False
+        return True
+
+    def mark_changed(self):
+        """Mark the profile as changed for autosave."""
+        self.autosave.mark_changed()
+
+    @contextmanager
+    def idle(self):
+        """Release the command lock while a command waits for input."""
+        self.lock.release()
+        try:
+            yield
+        finally:
+            self.lock.acquire()
+
+    def on_achievement(self, definition: AchievementDefinition):
+        """Announce a newly earned achievement."""
+        print_success(f'Achievement unlocked: {definition.name}')
+        print_info(f'    {definition.description}')
+        self.mark_changed()
+
+    def on_interrupt(self):
+        """Save unsaved changes after a keyboard interrupt."""
+        if self.read_only:
+            return
+        try:
+            saved = self.autosave.save()
+        except OSError as error:
+            print_error(f'Failed to save profile: {error}')
+            return
+        if saved:
+            print_success('Profile saved.')
 
     @interrupt_safe
     def run(self):
         """Run the profile."""
-        print_info(f'Playing on profile: {self.name}')
+        if self.read_only:
+            print_info(f'Viewing profile: {self.name} (read-only)')
+        else:
+            print_info(f'Playing on profile: {self.name}')
         self.running = True
-        while self.running:
-            print_prompt('>> ', end='')
-            print_command('', end='')
-            command = input()
-            clear_color()
-            self.parse(self, command)
+        self.autosave.start()
+        self.problems.prefill(difficulties=[1])
+        try:
+            while self.running:
+                print_prompt('>> ', end='')
+                print_command('', end='')
+                flush_output()
+                command = read_line()
+                clear_color()
+                with self.lock:
+                    # Counted before running, so exit saves the count.
+                    if (words := command.split()) and not words[0].startswith('#'):
+                        self.events.emit('command', command=words[0])
+                    self.parse(self, command)
+                self.autosave.touch()
+        finally:
+            self.autosave.stop()
+            self.problems.close()
 
 
 @ProfileInstance.add_command('exit', 'quit')
 def quit_profile(self):
     """Save and exit the profile to the main menu."""
-    self.save()
-    print_success('Profile saved.')
+    if not self.read_only:
+        if not self.save():
+            print_info('Use "forcequit" to exit without saving.')
+            return
+        print_success('Profile saved.')
     self.running = False
 
 @ProfileInstance.add_command('forceexit', 'forcequit')
@@ -102,8 +276,203 @@ def clear_screen(self):
     """Clear the screen."""
     clear()
 
+add_shortcut_commands(ProfileInstance)
+
 @ProfileInstance.add_command('save')
 def save_profile(self):
     """Save the profile."""
-    self.save()
-    print_success('Profile saved.')
+    if self.save():
+        print_success('Profile saved.')
+
+@ProfileInstance.add_command('inventory', 'inv')
+def show_inventory(self):
+    """Show the inventory in a full-screen view."""
+    InventoryView(self).run()
+
+@ProfileInstance.add_command('status')
+def show_status(self):
+    """Show the profile status in a full-screen view."""
+    StatusView(self).run()
+
+@ProfileInstance.add_command('problem [topic] [difficulty:int]')
+def new_problem(self, topic: str = 'arithmetic', difficulty: int = 1):
+    """Get a new problem, by default arithmetic of difficulty 1."""
+    if topic not in TOPICS:
+        print_error(f'Invalid topic. Topics: {', '.join(TOPICS)}')
+        return
+    if difficulty not in DIFFICULTIES:
+        print_error(f'Invalid difficulty. Difficulties: '
+                    f'{DIFFICULTIES.start} to {DIFFICULTIES.stop - 1}')
+        return
+    self.problem = self.problems.draw(topic, difficulty)
+    print_title(self.problem.question)
+
+@ProfileInstance.add_command('answer <answer:expression>')
+def answer_problem(self, answer: int | Fraction | None):
+    """Answer the current problem with a number or an expression."""
+    if self.problem is None:
+        print_error('No problem to answer. Use "problem" to get one.')
+        return
+    if answer is None:
+        print_error('Invalid answer. Use a number or an expression like 3/4.')
+        return
+    topic, difficulty = self.problem.topic, self.problem.difficulty
+    totals = self.profile.totals
+    if self.problem.check(answer):
+        print_success('Correct!')
+        totals['solved'] = totals.get('solved', 0) + 1
+        self.events.emit('problem_solved', topic=topic, difficulty=difficulty)
+    else:
+        print_error(f'Wrong, the answer is {self.problem.answer}.')
+        totals['failed'] = totals.get('failed', 0) + 1
+        self.events.emit('problem_failed', topic=topic, difficulty=difficulty)
+    self.problem = None
+    self.mark_changed()
+
+@ProfileInstance.add_command('achievements')
+def list_achievements(self):
+    """List the earned achievements and the progress towards the others."""
+    definitions = self.achievements.definitions
+    earned_ids = {achievement.name for achievement in self.profile.achievements}
+    print_info(f'Achievements: {len(earned_ids)}/{len(definitions)}')
+    for achievement in self.profile.achievements:
+        if (definition := definitions.get(achievement.name)) is not None:
+            print_success(f'- {definition.name}', end='')
+            print_info(f': {definition.description}')
+    for definition in definitions.values():
+        if definition.id not in earned_ids:
+            progress = self.profile.progress.get(definition.counter, 0)
+            print_text(f'- {definition.name}', end='')
+            print_info(f': {definition.description}'
+                       f' ({min(progress, definition.threshold)}/{definition.threshold})')
+
+def _refuse_in_session() -> bool:
+    """
+    Refuse a command on a server, where timings and memory statistics are
+    shared by every session. Return whether it was refused.
+    """
+    if in_session():
+        print_error('Not available on a server, as it affects every session.')
+        return True
+    return False
+
+@ProfileInstance.add_command('stats on')
+def enable_stats(self):
+    """Start timing commands."""
+    if _refuse_in_session():
+        return
+    enable()
+    print_success('Command timing enabled.')
+
+@ProfileInstance.add_command('stats off')
+def disable_stats(self):
+    """Stop timing commands and forget the timings."""
+    if _refuse_in_session():
+        return
+    disable()
+    print_success('Command timing disabled.')
+
+@ProfileInstance.add_command('stats reset')
+def reset_stats(self):
+    """Forget the command timings."""
+    if _refuse_in_session():
+        return
+    if (recorder := get_recorder()) is not None:
+        recorder.reset()
+    print_success('Command timings reset.')
+
+@ProfileInstance.add_command('stats export <name>')
+def export_command_stats(self, name: str):
+    """Export the command timings to a .json or .csv file in the exports folder."""
+    if _refuse_in_session():
+        return
+    if not fullmatch(r'\w[\w.-]*', name) or '..' in name:
+        print_error(f'Invalid export name: {name}')
+        return
+    target = EXPORTS_DIR / name
+    try:
+        path_init()
+        EXPORTS_DIR.mkdir(exist_ok=True)
+        count = export_stats(target)
+    except (OSError, ValueError) as error:
+        print_error(f'Failed to export: {error}')
+        return
+    print_success(f'Exported {count} rows to {target}')
+
+@ProfileInstance.add_command('stats capture <command:text>')
+def capture_command(self, command: str):
+    """Run a command under cProfile and show where its time went."""
+    if _refuse_in_session():
+        return
+    report = capture(self.parse, self, command)
+    for line in report.strip().splitlines():
+        print_info(line)
+
+@ProfileInstance.add_command('memstats on')
+def enable_memstats(self):
+    """Start tracing memory and counting instances."""
+    if _refuse_in_session():
+        return
+    from .memstats import enable as enable_memstats
+    enable_memstats()
+    print_success('Memory statistics enabled.')
+
+@ProfileInstance.add_command('memstats off')
+def disable_memstats(self):
+    """Stop tracing memory and forget the snapshots."""
+    if _refuse_in_session():
+        return
+    from .memstats import disable as disable_memstats
+    disable_memstats()
+    print_success('Memory statistics disabled.')
+
+@ProfileInstance.add_command('memstats snapshot [name]')
+def take_memory_snapshot(self, name: str = 'last'):
+    """Take a memory snapshot to compare later, named last by default."""
+    if _refuse_in_session():
+        return
+    from .memstats import is_enabled, snapshots, take_snapshot
+    if not is_enabled():
+        print_info('Memory statistics are off. Use "memstats on" first.')
+        return
+    snapshots[name] = take_snapshot()
+    print_success(f'Memory snapshot taken: {name}')
+
+@ProfileInstance.add_command('memstats diff [first] [second]')
+def diff_memory_snapshots(self, first: str = 'last', second: str | None = None):
+    """Compare a memory snapshot to another one or to now."""
+    if _refuse_in_session():
+        return
+    from .memstats import is_enabled, print_diff, snapshots, take_snapshot
+    if not is_enabled():
+        print_info('Memory statistics are off. Use "memstats on" first.')
+        return
+    for name in [first, second]:
+        if name is not None and name not in snapshots:
+            print_error(f'No memory snapshot named {name}.')
+            return
+    new = take_snapshot() if second is None else snapshots[second]
+    print_diff(snapshots[first], new)
+
+@ProfileInstance.add_command('memstats [count:int]')
+def show_memstats(self, count: int = 10):
+    """Show live instances, memory by subsystem and the top allocation sites."""
+    if _refuse_in_session():
+        return
+    from .memstats import is_enabled, print_report
+    if not is_enabled():
+        print_info('Memory statistics are off. Use "memstats on", set "memstats"'
+                   ' in settings.json or MATHEMAGICIAN_MEMSTATS=1.')
+        return
+    print_report(count)
+
+@ProfileInstance.add_command('stats')
+def show_stats(self):
+    """Show the time taken by each command, if timing is enabled."""
+    if _refuse_in_session():
+        return
+    if get_recorder() is None:
+        print_info('Command timing is off. Use "stats on", set "instrumentation"'
+                   ' in settings.json or MATHEMAGICIAN_INSTRUMENT=1.')
+        return
+    print_stats()
@@ -0,0 +1,159 @@
+"""
+Full-screen renderer, used to draw views that refresh in place.
+
+The screen keeps a cell buffer for the frame being drawn and a copy of the
+last rendered frame. Rendering only emits cursor moves and writes for the
+cells that changed, so refreshing a view costs a few bytes instead of a
+full redraw of the terminal.
+"""
+
+from shutil import get_terminal_size
+
+from .terminal import TerminalWriter
+
+__all__ = ['Screen']
+
+ENTER_ALT_SCREEN = '\x1b[?1049h\x1b[H'
+LEAVE_ALT_SCREEN = '\x1b[?1049l'
+CLEAR_SCREEN = '\x1b[2J'
+CLEAR_LINE = '\x1b[2K'
+
+
+def _terminal_size(writer: TerminalWriter) -> tuple[int, int]:
+    """Return the columns and lines of the terminal of a writer."""
+    if writer.size is not None:
+        return writer.size
+    return tuple(get_terminal_size())
+
+
+def move_cursor(row: int, col: int) -> str:
+    """Return the escape to move the cursor to a zero-based cell."""
+    return f'\x1b[{row + 1};{col + 1}H'
+
+
+class Screen:
+    """
+    Screen model, used to render frames by diffing against the last one.
+    The last line of the terminal is left for the prompt.
+
+    Variables:
+        writer: TerminalWriter
+            The writer to render to.
+        width: int
+            The width of the screen in cells.
+        height: int
+            The height of the screen in cells, excluding the prompt line.
+        chars: list[str]
+            The characters of the frame being drawn, row by row.
+        colors: list[str]
+            The color escapes of the frame being drawn, row by row.
+        previous: tuple[list[str], list[str]] | None
+            The last rendered frame, or None if it must be fully redrawn.
+    """
+    writer: TerminalWriter
+    width: int
+    height: int
+    chars: list[str]
+    colors: list[str]
+    previous: tuple[list[str], list[str]] | None
+
+    def __init__(self, writer: TerminalWriter,
+                 width: int | None = None, height: int | None = None):
+        self.writer = writer
+        columns, lines = _terminal_size(writer)
+        self.width = columns if width is None else width
+        self.height = lines - 1 if height is None else height
+        self.chars = [' '] * (self.width * self.height)
+        self.colors = [''] * (self.width * self.height)
+        self.previous = None
+
+    def enter(self):
+        """Switch to the alternate screen."""
+        self.writer.write_escape(ENTER_ALT_SCREEN)
+        self.previous = None
+
+    def leave(self):
+        """Switch back to the main screen."""
+        self.writer.reset_color()
+        self.writer.write_escape(LEAVE_ALT_SCREEN)
+
+    def invalidate(self):
+        """Force the next render to redraw the whole screen."""
+        self.previous = None
+
+    def resize(self):
+        """Resize the screen to the terminal, invalidating it if changed."""
+        columns, lines = _terminal_size(self.writer)
+        if (columns, lines - 1) != (self.width, self.height):
+            self.width = columns
+            self.height = lines - 1
+            self.chars = [' '] * (self.width * self.height)
+            self.colors = [''] * (self.width * self.height)
+            self.previous = None
+
+    def clear(self):
+        """Clear the frame being drawn."""
+        self.chars[:] = [' '] * len(self.chars)
+        self.colors[:] = [''] * len(self.colors)
+
+    def draw_text(self, row: int, col: int, text: str, color: str = ''):
+        """Draw text on a row, clipped to the screen."""
+        if not 0 <= row < self.height or col >= self.width:
+            return
+        if col < 0:
+            text = text[-col:]
+            col = 0
+        text = text[:self.width - col]
+        start = row * self.width + col
+        self.chars[start:start + len(text)] = text
+        self.colors[start:start + len(text)] = [color] * len(text)
+
+    def draw_box(self, row: int, col: int, height: int, width: int,
+                 color: str = ''):
+        """Draw the border of a box."""
+        if height < 2 or width < 2:
+            return
+        self.draw_text(row, col, '+' + '-' * (width - 2) + '+', color)
+        for index in range(row + 1, row + height - 1):
+            self.draw_text(index, col, '|', color)
+            self.draw_text(index, col + width - 1, '|', color)
+        self.draw_text(row + height - 1, col, '+' + '-' * (width - 2) + '+', color)
+
+    def render(self):
+        """Render the frame, writing only the cells that changed."""
+        writer = self.writer
+        if not writer.use_ansi:
+            self._render_plain()
+            return
+        if self.previous is None:
+            writer.reset_color()
+            writer.write_escape(CLEAR_SCREEN)
+            previous_chars = [' '] * len(self.chars)
+            previous_colors = [''] * len(self.colors)
+        else:
+            previous_chars, previous_colors = self.previous
+        width = self.width
+        cursor = -1
+        for index, (char, color, previous_char, previous_color) in enumerate(
+                zip(self.chars, self.colors, previous_chars, previous_colors)):
+            if char == previous_char and color == previous_color:
+                continue
+            # Cursor moves are skipped for runs of changed cells on a row.
+            if index != cursor or index % width == 0:
+                writer.write_escape(move_cursor(*divmod(index, width)))
+            if color:
+                writer.write_color(color, char)
+            else:
+                writer.reset_color()
+                writer.write(char)
+            cursor = index + 1
+        self.previous = (self.chars[:], self.colors[:])
+        writer.write_escape(move_cursor(self.height, 0) + CLEAR_LINE)
+
+    def _render_plain(self):
+        """Render the whole frame as plain lines when ANSI is unavailable."""
+        lines = [''.join(self.chars[row * self.width:(row + 1) * self.width]).rstrip()
+                 for row in range(self.height)]
+        while lines and not lines[-1]:
+            lines.pop()
+        self.writer.write(''.join(f'{line}\n' for line in lines))
@@ -0,0 +1,243 @@
+"""
+Network server, used to host many players in one process.
+
+The server accepts line-based TCP sessions, such as telnet or netcat, on an
+asyncio event loop. Each session plays its own Game on a thread from a
+bounded pool, with its output sent to its connection and its input read
+from it, so the game code keeps its blocking command loops. The session
+thread waits on the event loop for each input line and for its output to be
+sent, so a slow client only stalls its own session. Sessions over the limit
+are turned away, and a profile can only be open in one session at a time.
+Command timing and memory statistics are shared by the whole process, so
+their commands are refused in sessions.
+
+Usage:
+    python -m mathemagician serve [--host HOST] [--port PORT]
+        [--max-sessions N] [--idle-timeout SECONDS] [--no-color]
+"""
+
+from argparse import ArgumentParser
+from asyncio import (
+    AbstractEventLoop, CancelledError, StreamReader, StreamWriter,
+    current_task, get_running_loop, run, run_coroutine_threadsafe,
+    start_server, wait_for,
+)
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from re import DOTALL, compile as compile_regex
+from signal import SIGTERM
+from traceback import print_exc
+
+from .game import Game
+from .terminal import TerminalWriter
+from .util import flush_output, set_session
+
+__all__ = ['DEFAULT_PORT', 'Session', 'Server', 'serve']
+
+DEFAULT_PORT = 4040
+# The longest input line in bytes, longer lines end the session.
+LINE_LIMIT = 4096
+# The seconds to wait for a client to take its output before closing.
+SEND_TIMEOUT = 30
+# The screen size of sessions, as telnet does not report it by default.
+SESSION_SIZE = (80, 24)
+# Telnet option negotiation and commands, dropped from the input.
+_TELNET_COMMAND = compile_regex(rb'\xff[\xfb-\xfe].|\xff[\xf0-\xfa]', DOTALL)
+
+
+class Session:
+    """
+    Session class, used to play a game over a connection.
+
+    Variables:
+        server: Server
+            The server hosting the session.
+        reader: StreamReader
+            The stream of the input of the connection.
+        writer: StreamWriter
+            The stream of the output of the connection.
+        closed: bool
+            Whether the connection is closed, making output a no-op.
+    """
+    server: 'Server'
+    reader: StreamReader
+    writer: StreamWriter
+    closed: bool
+
+    def __init__(self, server: 'Server', reader: StreamReader, writer: StreamWriter):
+        self.server = server
+        self.loop = server.loop
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    # File interface of the session writer, called on the session thread.
+
+    def write(self, text: str):
+        """Send text to the connection."""
+        if not self.closed:
+            data = text.replace('\n', '\r\n').encode()
+            self.loop.call_soon_threadsafe(self._write, data)
+
+    def flush(self):
+        """Wait for the sent output to be taken by the client."""
+        if self.closed:
+            return
+        future = run_coroutine_threadsafe(self._drain(), self.loop)
+        try:
+            future.result(SEND_TIMEOUT)
+        except (TimeoutError, CancelledError, ConnectionError):
+            self.close()
+
+    def isatty(self) -> bool:
+        return False
+
+    def read_line(self) -> str:
+        """Read an input line, raising EOFError once the connection is closed."""
+        if self.closed:
+            raise EOFError
+        future = run_coroutine_threadsafe(self._read_line(), self.loop)
+        try:
+            line = future.result()
+        except CancelledError:
+            line = None
+        if line is None:
+            self.close()
+            raise EOFError
+        return line
+
+    def close(self):
+        """Close the connection from the session thread."""
+        if not self.closed:
+            self.closed = True
+            self.loop.call_soon_threadsafe(self.writer.close)
+
+    # Coroutines run on the event loop.
+
+    def _write(self, data: bytes):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    async def _drain(self):
+        await self.writer.drain()
+
+    async def _read_line(self) -> str | None:
+        """Read an input line, or return None if the session should end."""
+        try:
+            line = await wait_for(self.reader.readline(), self.server.idle_timeout)
+        except (TimeoutError, ConnectionError, ValueError):
+            # Idle for too long, disconnected, or over the line limit.
+            return None
+        if not line:
+            return None
+        line = _TELNET_COMMAND.sub(b'', line)
+        return line.decode('utf-8', 'replace').rstrip('\r\n')
+
+    def run(self):
+        """Play a game until it is exited or the connection is closed."""
+        copy_context().run(self._play)
+
+    def _play(self):
+        writer = TerminalWriter(self, self.server.use_ansi, SESSION_SIZE)
+        set_session(writer, self.read_line)
+        try:
+            Game().run()
+            flush_output()
+        except EOFError:
+            pass
+        except Exception:
+            print_exc()
+        finally:
+            self.close()
+
+
+class Server:
+    """
+    Server class, used to accept sessions and run them on a thread pool.
+
+    Variables:
+        max_sessions: int
+            The maximum number of sessions at once.
+        idle_timeout: float
+            The seconds to wait for input before closing a session.
+        use_ansi: bool
+            Whether to send colors and screen escapes.
+        sessions: set[Session]
+            The sessions running.
+    """
+    max_sessions: int
+    idle_timeout: float
+    use_ansi: bool
+    sessions: set[Session]
+
+    def __init__(self, loop: AbstractEventLoop, max_sessions: int = 256,
+                 idle_timeout: float = 900, use_ansi: bool = True):
+        self.loop = loop
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.use_ansi = use_ansi
+        self.sessions = set()
+        self.executor = ThreadPoolExecutor(max_sessions, 'session')
+
+    async def handle(self, reader: StreamReader, writer: StreamWriter):
+        """Run a session for a new connection."""
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(b'Server full, try again later.\r\n')
+            writer.close()
+            return
+        session = Session(self, reader, writer)
+        self.sessions.add(session)
+        try:
+            await self.loop.run_in_executor(self.executor, session.run)
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    def close(self):
+        """Close every connection, so the sessions save and end."""
+        for session in self.sessions:
+            session.writer.transport.abort()
+
+
+async def serve(host: str = 'localhost', port: int = DEFAULT_PORT,
+                max_sessions: int = 256, idle_timeout: float = 900,
+                use_ansi: bool = True):
+    """Serve sessions until cancelled or terminated."""
+    loop = get_running_loop()
+    try:
+        loop.add_signal_handler(SIGTERM, current_task().cancel)
+    except NotImplementedError:
+        # Signal handlers are not supported on Windows event loops.
+        pass
+    server = Server(loop, max_sessions, idle_timeout, use_ansi)
+    tcp_server = await start_server(server.handle, host, port, limit=LINE_LIMIT,
+                                    backlog=max(100, max_sessions))
+    address = ', '.join(f'{socket.getsockname()[0]}:{socket.getsockname()[1]}'
+                        for socket in tcp_server.sockets)
+    print(f'Serving mathemagician on {address}')
+    try:
+        await tcp_server.serve_forever()
+    finally:
+        tcp_server.close()
+        server.close()
+        # Wait for the sessions to save their profiles.
+        await loop.run_in_executor(None, server.executor.shutdown)
+        await tcp_server.wait_closed()
+
+
+def main(args: list[str] | None = None):
+    parser = ArgumentParser(prog='python -m mathemagician serve',
+                            description='Host many players over TCP.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--max-sessions', type=int, default=256)
+    parser.add_argument('--idle-timeout', type=float, default=900,
+                        help='seconds of inactivity before a session is closed')
+    parser.add_argument('--no-color', action='store_true',
+                        help='send plain text without ANSI escapes')
+    args = parser.parse_args(args)
+    try:
+        run(serve(args.host, args.port, args.max_sessions,
+                  args.idle_timeout, not args.no_color))
+    except (KeyboardInterrupt, CancelledError):
+        print('Server stopped.')
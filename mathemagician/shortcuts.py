@@ -0,0 +1,276 @@
+"""
+Command shortcuts, used to define aliases and macros of commands.
+
+An alias is a new name for a command, optionally with some of its
+arguments given, like "p" for "problem" or "easy" for "problem arithmetic
+1". A macro runs a fixed sequence of commands chained with semicolons.
+Both are compiled when defined: an alias into the command formats it
+stands for, and a macro into the handler calls it makes, with their
+arguments already parsed. Running a macro is then a single lookup, with
+nothing left to split, match or parse, and an alias is only matched
+against its own formats.
+
+Macros can use aliases, and the macros defined before them.
+"""
+
+from functools import partial
+from re import fullmatch
+from types import FunctionType
+
+from .cliengine import Call, CliEngine, parse_value
+from .util import print_command, print_error, print_info, print_success, print_warning
+
+__all__ = ['Shortcuts', 'add_shortcut_commands']
+
+
+def _bind(format_: str, words: list[str]) -> tuple[list[str], dict] | None:
+    """
+    Match words to the start of a command format, parsing the arguments.
+    Return the rest of the format and the given arguments, or None.
+    """
+    format_words = format_.split()
+    if len(words) > len(format_words):
+        return
+    kwargs = {}
+    for format_word, word in zip(format_words, words):
+        if fullmatch(r'<\w+(:\w+)?>|\[\w+(:\w+)?\]', format_word):
+            arg_name, _, arg_type = format_word[1:-1].partition(':')
+            if (value := parse_value(word, arg_type or 'str')) is None:
+                return
+            kwargs[arg_name] = value
+        elif format_word != word:
+            return
+    return format_words[len(words):], kwargs
+
+
+class Shortcuts:
+    """
+    Shortcuts class, used to keep the aliases and macros of a command engine.
+
+    Variables:
+        engine: CliEngine
+            The engine of the commands the shortcuts stand for.
+        aliases: dict[str, str]
+            The command of each alias.
+        macros: dict[str, str]
+            The chained commands of each macro, in definition order.
+        on_change: FunctionType | None
+            Function called after a change, to store the definitions.
+    """
+    engine: CliEngine
+    aliases: dict[str, str]
+    macros: dict[str, str]
+    on_change: FunctionType | None
+
+    def __init__(self, engine: CliEngine, aliases: dict[str, str] | None = None,
+                 macros: dict[str, str] | None = None,
+                 on_change: FunctionType | None = None):
+        self.engine = engine
+        self.aliases = {} if aliases is None else aliases
+        self.macros = {} if macros is None else macros
+        self.on_change = on_change
+        # The formats of each alias, in an engine of their own.
+        self.alias_engines: dict[str, CliEngine] = {}
+        # The calls of each macro.
+        self.compiled: dict[str, list[Call]] = {}
+        for name, error in self.compile_all().items():
+            print_warning(f'Invalid shortcut {name}: {error}')
+
+    def resolve(self, string: str) -> tuple[str, list[Call]] | None:
+        """
+        Resolve a macro, or a command starting with an alias, to its calls.
+        Return None if the string is neither.
+        """
+        name = string.strip()
+        if (calls := self.compiled.get(name)) is not None:
+            return name, calls
+        name = name.partition(' ')[0]
+        if (engine := self.alias_engines.get(name)) is not None:
+            return engine.resolve(string)
+
+    def _compile_alias(self, name: str, command: str) -> CliEngine:
+        """
+        Compile an alias into the formats it stands for.
+        Raise a ValueError if no command matches.
+        """
+        words = command.split()
+        engine = CliEngine()
+        for format_, func in self.engine.commands.items():
+            if (bound := _bind(format_, words)) is None:
+                continue
+            rest, kwargs = bound
+            alias_format = ' '.join([name, *rest])
+            if alias_format not in engine.commands:
+                if kwargs:
+                    func = partial(func, **kwargs)
+                engine.commands[alias_format] = func
+                engine.documentation[alias_format] = self.engine.documentation[format_]
+        if not engine.commands:
+            raise ValueError(f'Unknown command: {command}')
+        return engine
+
+    def compile_all(self) -> dict[str, str]:
+        """Compile every alias and macro, returning the errors of invalid ones."""
+        errors = {}
+        self.alias_engines = {}
+        self.compiled = {}
+        for name, command in self.aliases.items():
+            try:
+                self.alias_engines[name] = self._compile_alias(name, command)
+            except ValueError as error:
+                errors[name] = str(error)
+        for name, commands in self.macros.items():
+            try:
+                self.compiled[name] = self.engine.compile(commands, self)
+            except ValueError as error:
+                errors[name] = str(error)
+        return errors
+
+    def invalid(self) -> set[str]:
+        """Return the names of the shortcuts that failed to compile."""
+        return ({*self.aliases} - {*self.alias_engines}) | ({*self.macros} - {*self.compiled})
+
+    def _check_name(self, name: str, taken: dict[str, str]):
+        """Raise a ValueError if a name cannot be used for a shortcut."""
+        if not fullmatch(r'\w[\w-]*', name):
+            raise ValueError(f'Invalid name: {name}')
+        if any(command.split()[0] == name for command in self.engine.commands):
+            raise ValueError(f'Name is taken by a command: {name}')
+        if name in taken:
+            raise ValueError(f'Name is taken: {name}')
+
+    def _define(self, definitions: dict[str, str], name: str,
+                value: str) -> dict[str, str]:
+        """
+        Define a shortcut and compile all of them again.
+        Restore the previous definition and raise a ValueError if invalid.
+        Return the errors of other shortcuts made invalid.
+        """
+        previous = definitions.get(name)
+        invalid = self.invalid()
+        # A redefined shortcut keeps its place, so its dependencies hold.
+        definitions[name] = value
+        errors = self.compile_all()
+        if name in errors:
+            if previous is None:
+                del definitions[name]
+            else:
+                definitions[name] = previous
+            self.compile_all()
+            raise ValueError(errors[name])
+        if self.on_change is not None:
+            self.on_change()
+        return {key: error for key, error in errors.items() if key not in invalid}
+
+    def define_alias(self, name: str, command: str) -> dict[str, str]:
+        """
+        Define an alias for a command.
+        Raise a ValueError if the name or the command is invalid.
+        Return the errors of macros made invalid.
+        """
+        self._check_name(name, self.macros)
+        return self._define(self.aliases, name, command)
+
+    def define_macro(self, name: str, commands: str) -> dict[str, str]:
+        """
+        Define a macro running chained commands.
+        Raise a ValueError if the name or a command is invalid.
+        Return the errors of macros made invalid.
+        """
+        self._check_name(name, self.aliases)
+        return self._define(self.macros, name, commands)
+
+    def remove(self, definitions: dict[str, str], name: str) -> dict[str, str]:
+        """
+        Remove an alias or macro from its definitions.
+        Raise a KeyError if it does not exist.
+        Return the errors of macros made invalid.
+        """
+        del definitions[name]
+        invalid = self.invalid()
+        errors = self.compile_all()
+        if self.on_change is not None:
+            self.on_change()
+        return {key: error for key, error in errors.items() if key not in invalid}
+
+
+def _print_errors(errors: dict[str, str]):
+    """Print the shortcuts made invalid by a change."""
+    for name, error in errors.items():
+        print_warning(f'Shortcut no longer valid: {name}: {error}')
+
+
+def _print_definitions(definitions: dict[str, str], invalid: set[str]):
+    """Print shortcuts and what they stand for."""
+    for name, value in definitions.items():
+        print_info('- ', end='')
+        print_command(name, end='')
+        print_info(f' = {value}{' (invalid)' if name in invalid else ''}')
+
+
+def define_alias(self, name: str, command: str):
+    """Define an alias for a command, optionally with some arguments given."""
+    try:
+        errors = self.shortcuts.define_alias(name, command)
+    except ValueError as error:
+        print_error(f'Invalid alias: {error}')
+        return
+    print_success(f'Alias defined: {name}')
+    _print_errors(errors)
+
+def define_macro(self, name: str, commands: str):
+    """Define a macro running commands separated by semicolons."""
+    try:
+        errors = self.shortcuts.define_macro(name, commands)
+    except ValueError as error:
+        print_error(f'Invalid macro: {error}')
+        return
+    print_success(f'Macro defined: {name}')
+    _print_errors(errors)
+
+def remove_alias(self, name: str):
+    """Remove an alias."""
+    try:
+        errors = self.shortcuts.remove(self.shortcuts.aliases, name)
+    except KeyError:
+        print_error(f'No such alias: {name}')
+        return
+    print_success(f'Alias removed: {name}')
+    _print_errors(errors)
+
+def remove_macro(self, name: str):
+    """Remove a macro."""
+    try:
+        errors = self.shortcuts.remove(self.shortcuts.macros, name)
+    except KeyError:
+        print_error(f'No such macro: {name}')
+        return
+    print_success(f'Macro removed: {name}')
+    _print_errors(errors)
+
+def list_aliases(self):
+    """List the aliases."""
+    if not self.shortcuts.aliases:
+        print_info('No aliases defined.')
+        return
+    print_info('Aliases:')
+    _print_definitions(self.shortcuts.aliases, self.shortcuts.invalid())
+
+def list_macros(self):
+    """List the macros."""
+    if not self.shortcuts.macros:
+        print_info('No macros defined.')
+        return
+    print_info('Macros:')
+    _print_definitions(self.shortcuts.macros, self.shortcuts.invalid())
+
+
+def add_shortcut_commands(cls: type):
+    """Add the alias and macro commands to a class with shortcuts."""
+    # Commands with arguments come first, as extra words are ignored.
+    cls.add_command('alias <name> <command:text>')(define_alias)
+    cls.add_command('macro <name> <commands:text>')(define_macro)
+    cls.add_command('unalias <name>')(remove_alias)
+    cls.add_command('unmacro <name>')(remove_macro)
+    cls.add_command('alias', 'aliases')(list_aliases)
+    cls.add_command('macro', 'macros')(list_macros)
@@ -0,0 +1,329 @@
+"""
+Profile statistics, used to keep leaderboards across all profiles.
+
+Every profile save records an entry in a stats index in the main directory:
+a snapshot of all entries (stats.json) and a journal of the entries recorded
+since (stats.log). Entries are appended to the journal in a single write,
+so sessions in other processes can record saves at the same time, and each
+process only reads the journal lines it has not seen yet. Leaderboards are
+kept sorted as entries change, so a top-k query is a slice. The journal is
+folded into the snapshot once it outgrows the number of profiles, and a
+rebuild streams through the profiles directory one file at a time.
+Appends share a file lock (stats.lock) that compactions and rebuilds take
+exclusively, so no entry is appended to a journal being replaced.
+"""
+
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from json import dumps as dumps_line
+from numbers import Number
+from os import fstat, getpid, replace, scandir
+from threading import RLock
+from types import FunctionType
+
+try:
+    from fcntl import LOCK_EX, LOCK_SH, flock
+except ImportError:
+    # Without file locks, an entry recorded by another process during a
+    # compaction can be lost until the next rebuild.
+    flock = None
+
+from .datatype import DataType, Variable
+from .myjson import dump, load, loads, JSONDecodeError
+from .path import MAIN_DIR, PROFILES_DIR, path_init
+from .util import print_warning
+
+__all__ = [
+    'STATS_JSON', 'STATS_LOG', 'STATS_LOCK', 'METRICS',
+    'ProfileStats', 'Leaderboard', 'StatsIndex', 'get_stats',
+]
+
+STATS_JSON = MAIN_DIR / 'stats.json'
+STATS_LOG = MAIN_DIR / 'stats.log'
+STATS_LOCK = MAIN_DIR / 'stats.lock'
+# The journal is folded into the snapshot past this many lines at least.
+MIN_COMPACT_LENGTH = 256
+
+
+class ProfileStats(DataType):
+    """
+    Profile stats data type, used to store the stats of a profile.
+
+    Variables:
+        name: str
+            The name of the profile.
+        solved: int
+            The number of problems solved.
+        failed: int
+            The number of problems answered wrong.
+        achievements: int
+            The number of achievements earned.
+        last_update: Number
+            The timestamp of the last save.
+    """
+    variables = [
+        Variable('name', str),
+        Variable('solved', int, lambda: 0),
+        Variable('failed', int, lambda: 0),
+        Variable('achievements', int, lambda: 0),
+        Variable('last_update', Number, lambda: 0),
+    ]
+
+    @property
+    def accuracy(self) -> float:
+        """The fraction of the answers that were right."""
+        answered = self.solved + self.failed
+        return self.solved / answered if answered else 0.0
+
+    @classmethod
+    def from_profile(cls, data: dict):
+        """Get the stats of dumped profile data."""
+        totals = data.get('totals', {})
+        return cls(
+            data['name'], totals.get('solved', 0), totals.get('failed', 0),
+            len(data.get('achievements', [])), data.get('last_update', 0),
+        )
+
+
+METRICS: dict[str, FunctionType] = {
+    'solved': lambda entry: entry.solved,
+    'accuracy': lambda entry: (entry.accuracy, entry.solved),
+    'achievements': lambda entry: entry.achievements,
+    'recent': lambda entry: entry.last_update,
+}
+
+
+class Leaderboard:
+    """
+    Leaderboard class, used to keep profiles sorted by a metric.
+
+    Variables:
+        key: FunctionType
+            Function returning the score of an entry, higher ranks first.
+    """
+    key: FunctionType
+
+    def __init__(self, key: FunctionType):
+        self.key = key
+        self.ranks: list[tuple] = []
+        self.scores: dict[str, tuple] = {}
+
+    def update(self, entry: ProfileStats):
+        """Move a profile to its rank for its new score."""
+        score = self.key(entry)
+        if isinstance(score, tuple):
+            rank = (*(-part for part in score), entry.name)
+        else:
+            rank = (-score, entry.name)
+        old_rank = self.scores.get(entry.name)
+        if old_rank == rank:
+            return
+        if old_rank is not None:
+            del self.ranks[bisect_left(self.ranks, old_rank)]
+        insort(self.ranks, rank)
+        self.scores[entry.name] = rank
+
+    def top(self, count: int) -> list[str]:
+        """Return the names of the top profiles."""
+        return [rank[-1] for rank in self.ranks[:count]]
+
+    def rank(self, name: str) -> int | None:
+        """Return the rank of a profile from 1, or None if not ranked."""
+        if (rank := self.scores.get(name)) is None:
+            return
+        return bisect_left(self.ranks, rank) + 1
+
+    def __len__(self) -> int:
+        return len(self.ranks)
+
+
+class StatsIndex:
+    """
+    Stats index, used to keep the stats and leaderboards of all profiles.
+
+    Variables:
+        snapshot_path: Path
+            The snapshot of all entries.
+        journal_path: Path
+            The journal of the entries recorded since the snapshot.
+        lock_path: Path
+            The file locked by appends, and exclusively by compactions.
+        entries: dict[str, ProfileStats]
+            The stats of each profile by name.
+        leaderboards: dict[str, Leaderboard]
+            The leaderboard of each metric.
+    """
+    def __init__(self, snapshot_path=STATS_JSON, journal_path=STATS_LOG,
+                 lock_path=STATS_LOCK):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.lock_path = lock_path
+        self.lock = RLock()
+        self.loaded = False
+        self.journal_id = None
+        self.offset = 0
+        self.journal_length = 0
+        self._reset()
+
+    def _reset(self):
+        """Forget all entries."""
+        self.entries: dict[str, ProfileStats] = {}
+        self.leaderboards = {metric: Leaderboard(key)
+                             for metric, key in METRICS.items()}
+
+    def _apply(self, entry: ProfileStats):
+        """Add or replace the entry of a profile."""
+        self.entries[entry.name] = entry
+        for leaderboard in self.leaderboards.values():
+            leaderboard.update(entry)
+
+    def _load_snapshot(self):
+        """Load the entries of the snapshot."""
+        self._reset()
+        if not self.snapshot_path.exists():
+            return
+        try:
+            with self.snapshot_path.open() as file:
+                data = load(file)
+        except JSONDecodeError:
+            print_warning(f'Invalid stats snapshot: {self.snapshot_path}')
+            return
+        for item in data.get('profiles', []):
+            if ProfileStats.is_valid(item):
+                self._apply(ProfileStats.load(item))
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool = False):
+        """Hold the lock file, shared with other processes unless exclusive."""
+        if flock is None:
+            yield
+            return
+        # Closing the file releases the lock.
+        with self.lock_path.open('a') as file:
+            flock(file.fileno(), LOCK_EX if exclusive else LOCK_SH)
+            yield
+
+    def refresh(self):
+        """Read the journal lines recorded since the last refresh."""
+        with self.lock:
+            try:
+                file = self.journal_path.open('rb')
+            except FileNotFoundError:
+                file = None
+            # The open file is checked, so a journal replaced meanwhile
+            # is never read from a stale offset.
+            stat = None if file is None else fstat(file.fileno())
+            journal_id = None if stat is None else (stat.st_dev, stat.st_ino)
+            if (not self.loaded or journal_id != self.journal_id
+                    or stat is not None and stat.st_size < self.offset):
+                # The journal was folded into a new snapshot, so start over.
+                self._load_snapshot()
+                self.loaded = True
+                self.journal_id = journal_id
+                self.offset = 0
+                self.journal_length = 0
+            if file is None:
+                return
+            with file:
+                file.seek(self.offset)
+                content = file.read()
+            # A line still being written is read on the next refresh.
+            end = content.rfind(b'\n') + 1
+            for line in content[:end].splitlines():
+                try:
+                    data = loads(line)
+                except JSONDecodeError:
+                    continue
+                if ProfileStats.is_valid(data):
+                    self._apply(ProfileStats.load(data))
+                self.journal_length += 1
+            self.offset += end
+
+    def record(self, entry: ProfileStats):
+        """Record the stats of a profile, appending them to the journal."""
+        path_init()
+        line = f'{dumps_line(entry.dump(), separators=(',', ':'))}\n'.encode()
+        with self.lock:
+            self.refresh()
+            # Unbuffered, so the line is appended in one write. The journal
+            # is opened under the lock, so it is never one being replaced.
+            with self._file_lock():
+                with self.journal_path.open('ab', buffering=0) as file:
+                    file.write(line)
+            self.refresh()
+            if self.journal_length > max(MIN_COMPACT_LENGTH, len(self.entries)):
+                self.compact()
+
+    def _write(self, entries: list[ProfileStats]):
+        """Write a snapshot and start an empty journal."""
+        # Other processes may compact at the same time.
+        temp_path = self.snapshot_path.with_suffix(f'.json.{getpid()}.tmp')
+        with temp_path.open('w') as file:
+            dump({'profiles': [entry.dump() for entry in entries]}, file)
+        replace(temp_path, self.snapshot_path)
+        temp_path = self.journal_path.with_suffix(f'.log.{getpid()}.tmp')
+        temp_path.write_bytes(b'')
+        replace(temp_path, self.journal_path)
+        stat = self.journal_path.stat()
+        self.journal_id = (stat.st_dev, stat.st_ino)
+        self.offset = 0
+        self.journal_length = 0
+
+    def compact(self):
+        """Fold the journal into the snapshot."""
+        path_init()
+        with self.lock, self._file_lock(exclusive=True):
+            self.refresh()
+            self._write([*self.entries.values()])
+
+    def rebuild(self) -> int:
+        """
+        Rebuild the index from the profiles directory, loading one profile
+        at a time. Return the number of profiles indexed.
+        """
+        from .profile import Profile
+
+        path_init()
+        with self.lock, self._file_lock(exclusive=True):
+            self._reset()
+            with scandir(PROFILES_DIR) as iterator:
+                for item in iterator:
+                    if not item.name.endswith('.json'):
+                        continue
+                    try:
+                        with open(item.path) as file:
+                            data = load(file)
+                    except (OSError, JSONDecodeError):
+                        continue
+                    if Profile.is_valid(data):
+                        self._apply(ProfileStats.from_profile(data))
+            self._write([*self.entries.values()])
+            self.loaded = True
+            return len(self.entries)
+
+    def top(self, metric: str, count: int = 10) -> list[ProfileStats]:
+        """
+        Return the stats of the top profiles of a metric.
+        Raise a KeyError if the metric is invalid.
+        """
+        with self.lock:
+            self.refresh()
+            names = self.leaderboards[metric].top(count)
+            return [self.entries[name] for name in names]
+
+    def rank(self, metric: str, name: str) -> int | None:
+        """Return the rank of a profile for a metric, or None if not ranked."""
+        with self.lock:
+            self.refresh()
+            return self.leaderboards[metric].rank(name)
+
+
+_stats = None
+
+
+def get_stats() -> StatsIndex:
+    """Get the stats index of the main directory."""
+    global _stats
+    if _stats is None:
+        _stats = StatsIndex()
+    return _stats
@@ -0,0 +1,94 @@
+"""
+Buffered terminal writer, used to render the output of a command at once.
+
+Writes are collected in a buffer and flushed in a single write, usually
+once per prompt. Color escapes are only emitted when the color changes,
+and ANSI escapes are left out entirely when the output is not a terminal.
+"""
+
+from io import TextIOBase as TextIO
+
+__all__ = ['RESET_COLOR', 'TerminalWriter']
+
+RESET_COLOR = '\x1b[0m'
+
+
+class TerminalWriter:
+    """
+    Terminal writer, used to buffer colored output for a file.
+
+    Variables:
+        file: TextIO
+            The file to flush the output to.
+        use_ansi: bool
+            Whether to emit ANSI escapes, defaults to whether file is a TTY.
+        parts: list[str]
+            The buffered output.
+        color: str | None
+            The color the terminal will be in after the buffer is flushed.
+        size: tuple[int, int] | None
+            The columns and lines of the terminal, or None to ask the OS.
+    """
+    file: TextIO
+    use_ansi: bool
+    parts: list[str]
+    color: str | None
+    size: tuple[int, int] | None
+
+    def __init__(self, file: TextIO, use_ansi: bool | None = None,
+                 size: tuple[int, int] | None = None):
+        self.file = file
+        self.size = size
+        if use_ansi is None:
+            isatty = getattr(file, 'isatty', None)
+            use_ansi = isatty is not None and isatty()
+        self.use_ansi = use_ansi
+        self.parts = []
+        self.color = None
+
+    def write(self, text: str):
+        """Write plain text."""
+        if text:
+            self.parts.append(text)
+
+    def write_color(self, color: str, text: str = ''):
+        """Write text in a color, switching color only if it changed."""
+        if self.use_ansi and color and color != self.color:
+            self.parts.append(color)
+            self.color = color
+        if text:
+            self.parts.append(text)
+
+    def write_escape(self, escape: str):
+        """Write an ANSI escape that does not change the color."""
+        if self.use_ansi:
+            self.parts.append(escape)
+
+    def reset_color(self):
+        """Reset the color if it is not already reset."""
+        if self.use_ansi and self.color not in {None, RESET_COLOR}:
+            self.parts.append(RESET_COLOR)
+            self.color = RESET_COLOR
+
+    def mark(self) -> int:
+        """Return a mark of the buffer position for take_text."""
+        return len(self.parts)
+
+    def take_text(self, mark: int) -> str:
+        """Remove the output written since a mark and return its plain text."""
+        parts = self.parts[mark:]
+        del self.parts[mark:]
+        # The color may have been switched by a removed escape.
+        self.color = None
+        return ''.join(part for part in parts if not part.startswith('\x1b'))
+
+    def getvalue(self) -> str:
+        """Return the buffered output without flushing."""
+        return ''.join(self.parts)
+
+    def flush(self):
+        """Write the buffered output to the file in a single write."""
+        if self.parts:
+            self.file.write(''.join(self.parts))
+            self.parts.clear()
+        self.file.flush()
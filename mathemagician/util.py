@@ -2,18 +2,21 @@
 Utility functions.
 """
 
+from atexit import register
+from contextvars import ContextVar
 from sys import stdout
 from types import FunctionType, GenericAlias, UnionType
 
-from .path import DATA_DIR, load_file, load_data
+from .terminal import TerminalWriter
 
 __all__ = [
     'is_type', 'interrupt_safe',
     'print_text', 'print_prompt', 'print_command', 'print_title',
     'print_success', 'print_error', 'print_warning', 'print_info',
-    'load_color', 'load_color_scheme',
+    'load_color', 'load_color_scheme', 'get_settings', 'save_settings',
     'COLOR_SCHEME',
-    'clear', 'clear_color',
+    'clear', 'clear_color', 'get_color', 'get_writer', 'set_writer',
+    'flush_output', 'set_session', 'in_session', 'read_line',
 ]
 
 
@@ -71,12 +74,21 @@ def is_type(obj: object, checktype: type) -> bool:
 
 
 def interrupt_safe(func: FunctionType) -> FunctionType:
-    """Decorator to catch keyboard interrupts."""
+    """
+    Decorator to catch keyboard interrupts and the end of input.
+    Call the on_interrupt method of the instance, if any, after catching one.
+    """
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
         except KeyboardInterrupt:
+            flush_output()
             print('Keyboard interrupt.')
+        except EOFError:
+            # The input is gone, e.g. a closed connection, so nothing is printed.
+            pass
+        if args and (on_interrupt := getattr(args[0], 'on_interrupt', None)):
+            on_interrupt()
     return wrapper
 
 
@@ -91,77 +103,172 @@ def load_color(color: str) -> tuple[int, int, int]:
     return tuple(int(color[i:i + 2], 16) for i in range(0, 6, 2))
 
 
-COLOR_SCHEME = {}
-print_text = print
-print_prompt = print
-print_command = print
-print_title = print
-print_success = print
-print_error = print
-print_warning = print
-print_info = print
+COLOR_NAMES = [
+    'text', 'prompt', 'command', 'title',
+    'success', 'error', 'warning', 'info',
+]
+
+_settings = None
+_color_scheme = None
+_color_formats = {}
+_writer = None
+# Set per session by the server, so each connection has its own I/O.
+_session_writer: ContextVar[TerminalWriter | None] = ContextVar('writer', default=None)
+_session_reader: ContextVar[FunctionType | None] = ContextVar('reader', default=None)
+
+
+def get_settings() -> dict:
+    """
+    Load the settings on first use.
+    Settings missing from settings.json take their default values,
+    and a settings.json that is not an object is ignored.
+    """
+    global _settings
+    if _settings is None:
+        from .path import SETTINGS_JSON, path_init, load_data, load_file
+        path_init()
+        _settings = load_data('default_settings.json')
+        stored = load_file('settings.json')
+        if isinstance(stored, dict):
+            _settings.update(stored)
+        elif stored is not None:
+            print(f'Ignoring {SETTINGS_JSON}: settings must be an object')
+    return _settings
+
+
+def save_settings(changes: dict):
+    """Change settings and write them to settings.json."""
+    from .path import dump_file, load_file
+    settings = get_settings()
+    stored = load_file('settings.json')
+    if not isinstance(stored, dict):
+        stored = {}
+    stored.update(changes)
+    dump_file(stored, 'settings.json')
+    settings.update(changes)
+
+
+def _get_color_formats() -> dict[str, str]:
+    """Load the color scheme from the settings on first use."""
+    global _color_scheme
+    if _color_scheme is None:
+        from .path import has_data
+        _color_scheme = {}
+        color_scheme = get_settings().get('color_scheme', 'vanilla')
+        if not has_data('color_schemes', f'{color_scheme}.json'):
+            color_scheme = 'vanilla'
+        load_color_scheme(color_scheme)
+    return _color_formats
+
+
+def get_color(color_name: str) -> str:
+    """Get the ANSI escape of a color in the color scheme."""
+    return _get_color_formats().get(color_name, '')
+
+
+def get_writer() -> TerminalWriter:
+    """
+    Get the buffered writer of the session, or the one for stdout,
+    creating it on first use.
+    """
+    global _writer
+    if (writer := _session_writer.get()) is not None:
+        return writer
+    if _writer is None:
+        _writer = TerminalWriter(stdout)
+        register(_writer.flush)
+    return _writer
+
+
+def set_writer(writer: TerminalWriter) -> TerminalWriter:
+    """Replace the writer for stdout, returning the previous one."""
+    global _writer
+    previous = get_writer()
+    _writer = writer
+    return previous
 
 
-def generate_printer(name: str, color: str):
+def flush_output():
+    """Flush the buffered output, called once per prompt."""
+    get_writer().flush()
+
+
+def set_session(writer: TerminalWriter, reader: FunctionType):
+    """
+    Send the output of the current context to a writer, and read its
+    input lines from a reader function raising EOFError at the end.
+    """
+    _session_writer.set(writer)
+    _session_reader.set(reader)
+
+
+def in_session() -> bool:
+    """Check if the current context is a server session."""
+    return _session_reader.get() is not None
+
+
+def read_line() -> str:
+    """Read a line of input from the session, or from stdin."""
+    if (reader := _session_reader.get()) is not None:
+        return reader()
+    return input()
+
+
+def generate_printer(name: str, color_name: str):
     def printer(*args, sep=' ', end='\n', file=None, flush=False) -> None:
         """Print text."""
-        if file is None:
-            file = stdout
-        file.write(color + sep.join(f'{arg}' for arg in args) + end)
+        color = _get_color_formats().get(color_name, '')
+        text = sep.join(f'{arg}' for arg in args) + end
+        if file is not None:
+            file.write(color + text)
+            if flush:
+                file.flush()
+            return
+        writer = get_writer()
+        writer.write_color(color, text)
         if flush:
-            file.flush()
+            writer.flush()
     printer.__name__ = name
     return printer
 
 
+print_text = generate_printer('print_text', 'text')
+print_prompt = generate_printer('print_prompt', 'prompt')
+print_command = generate_printer('print_command', 'command')
+print_title = generate_printer('print_title', 'title')
+print_success = generate_printer('print_success', 'success')
+print_error = generate_printer('print_error', 'error')
+print_warning = generate_printer('print_warning', 'warning')
+print_info = generate_printer('print_info', 'info')
+
+
 def load_color_scheme(color_scheme: str):
     """Load a color scheme."""
-    global COLOR_SCHEME, \
-        print_text, print_prompt, print_command, print_title, \
-        print_success, print_error, print_warning, print_info
-    if not (DATA_DIR / 'color_schemes' / f'{color_scheme}.json').exists():
+    global _color_scheme
+    from .path import has_data, load_data
+    if not has_data('color_schemes', f'{color_scheme}.json'):
         print_warning(f'Color scheme {color_scheme} does not exist.')
         return
-    COLOR_SCHEME = load_data('color_schemes', f'{color_scheme}.json')
-    text_color = load_color(COLOR_SCHEME['text'])
-    text_format = f'\x1b[38;2;{text_color[0]};{text_color[1]};{text_color[2]}m'
-    print_text = generate_printer('print_text', text_format)
-    prompt_color = load_color(COLOR_SCHEME['prompt'])
-    prompt_format = f'\x1b[38;2;{prompt_color[0]};{prompt_color[1]};{prompt_color[2]}m'
-    print_prompt = generate_printer('print_prompt', prompt_format)
-    command_color = load_color(COLOR_SCHEME['command'])
-    command_format = f'\x1b[38;2;{command_color[0]};{command_color[1]};{command_color[2]}m'
-    print_command = generate_printer('print_command', command_format)
-    title_color = load_color(COLOR_SCHEME['title'])
-    title_format = f'\x1b[38;2;{title_color[0]};{title_color[1]};{title_color[2]}m'
-    print_title = generate_printer('print_title', title_format)
-    success_color = load_color(COLOR_SCHEME['success'])
-    success_format = f'\x1b[38;2;{success_color[0]};{success_color[1]};{success_color[2]}m'
-    print_success = generate_printer('print_success', success_format)
-    error_color = load_color(COLOR_SCHEME['error'])
-    error_format = f'\x1b[38;2;{error_color[0]};{error_color[1]};{error_color[2]}m'
-    print_error = generate_printer('print_error', error_format)
-    warning_color = load_color(COLOR_SCHEME['warning'])
-    warning_format = f'\x1b[38;2;{warning_color[0]};{warning_color[1]};{warning_color[2]}m'
-    print_warning = generate_printer('print_warning', warning_format)
-    info_color = load_color(COLOR_SCHEME['info'])
-    info_format = f'\x1b[38;2;{info_color[0]};{info_color[1]};{info_color[2]}m'
-    print_info = generate_printer('print_info', info_format)
+    _color_scheme = load_data('color_schemes', f'{color_scheme}.json')
+    for color_name in COLOR_NAMES:
+        color = load_color(_color_scheme[color_name])
+        _color_formats[color_name] = f'\x1b[38;2;{color[0]};{color[1]};{color[2]}m'
+
+
+def __getattr__(name: str):
+    """Load the color scheme lazily when COLOR_SCHEME is accessed."""
+    if name == 'COLOR_SCHEME':
+        _get_color_formats()
+        return _color_scheme
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def clear():
     """Clear the screen."""
-    print('\x1b[2J\x1b[H', end='')
+    get_writer().write_escape('\x1b[2J\x1b[H')
 
 
 def clear_color():
     """Clear the color."""
-    print('\x1b[0m', end='')
-
-
-settings = load_file('settings.json')
-color_scheme = settings['color_scheme']
-if not (DATA_DIR / 'color_schemes' / f'{color_scheme}.json').exists():
-    color_scheme = 'vanilla'
-load_color_scheme(color_scheme)
+    get_writer().reset_color()
 
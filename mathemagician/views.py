@@ -0,0 +1,199 @@
+"""
+Full-screen views, used to show and manage profile data in place.
+
+Views run their own command loop on the alternate screen and redraw
+through the diff-based screen renderer, so each action only rewrites the
+cells that changed.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from .cliengine import CliEngine
+from .items import Empty
+from .screen import Screen
+from .util import (
+    print_prompt, print_command, clear_color,
+    get_color, get_writer, flush_output, read_line,
+)
+
+__all__ = ['View', 'InventoryView', 'StatusView']
+
+SLOT_WIDTH = 16
+SLOT_HEIGHT = 4
+PANEL_WIDTH = 30
+
+
+class View(ABC):
+    """
+    Full-screen view base class, used to run a view of a profile instance.
+    Subclasses define their own engine and draw the frame in draw.
+    """
+    engine: CliEngine
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.profile = instance.profile
+        self.screen = Screen(get_writer())
+        self.message = ''
+
+    @abstractmethod
+    def draw(self):
+        """Draw the frame on the screen."""
+
+    def draw_panel(self, row: int, col: int, width: int,
+                   title: str, lines: list[str]):
+        """Draw a titled panel with a line of text per row."""
+        screen = self.screen
+        screen.draw_box(row, col, len(lines) + 2, width, get_color('title'))
+        screen.draw_text(row, col + 2, f' {title} ', get_color('title'))
+        for index, line in enumerate(lines):
+            screen.draw_text(row + 1 + index, col + 2, line[:width - 4],
+                             get_color('text'))
+
+    def run(self):
+        """
+        Run the view until it is exited.
+        Must be called from a command of the profile instance.
+        """
+        writer = get_writer()
+        self.screen.enter()
+        self.running = True
+        try:
+            while self.running:
+                self.screen.resize()
+                self.screen.clear()
+                self.draw()
+                self.screen.draw_text(self.screen.height - 1, 0, self.message,
+                                      get_color('info'))
+                self.screen.render()
+                print_prompt('> ', end='')
+                print_command('', end='')
+                flush_output()
+                with self.instance.idle():
+                    command = read_line()
+                clear_color()
+                # Output printed by commands is shown on the message line.
+                mark = writer.mark()
+                self.message = ''
+                self.parse(self, command)
+                self.instance.autosave.touch()
+                if text := writer.take_text(mark).strip():
+                    self.message = ' '.join(line.strip() for line in text.splitlines())
+        finally:
+            self.screen.leave()
+            flush_output()
+
+
+class InventoryView(View):
+    """
+    Inventory view, used to show the inventory of a profile as a grid.
+    """
+    engine = CliEngine()
+    add_command = engine.add_command
+    parse = engine.parse
+    commands = engine.commands
+    documentation = engine.documentation
+
+    def __init__(self, instance):
+        super().__init__(instance)
+        self.selected = 0
+
+    def draw(self):
+        """Draw the inventory grid and the status panel."""
+        screen = self.screen
+        inventory = self.profile.inventory
+        grid_width = max(SLOT_WIDTH, screen.width - PANEL_WIDTH - 1)
+        columns = max(1, grid_width // SLOT_WIDTH)
+        visible_rows = max(1, (screen.height - 2) // SLOT_HEIGHT)
+        first_row = self.selected // columns // visible_rows * visible_rows
+
+        screen.draw_text(0, 0, f'Inventory of {self.profile.name}',
+                         get_color('title'))
+        for offset in range(visible_rows * columns):
+            index = first_row * columns + offset
+            if index >= len(inventory):
+                break
+            row = 1 + offset // columns * SLOT_HEIGHT
+            col = offset % columns * SLOT_WIDTH
+            color = get_color('command' if index == self.selected else 'text')
+            screen.draw_box(row, col, SLOT_HEIGHT, SLOT_WIDTH, color)
+            screen.draw_text(row, col + 2, f' {index + 1} ', color)
+            item = inventory[index]
+            name = '' if isinstance(item, Empty) else item.name
+            screen.draw_text(row + 1, col + 2, name[:SLOT_WIDTH - 4],
+                             get_color('text'))
+
+        used = sum(not isinstance(item, Empty) for item in inventory)
+        selected_item = inventory[self.selected] if inventory else Empty()
+        self.draw_panel(1, columns * SLOT_WIDTH + 1, PANEL_WIDTH, 'Status', [
+            f'Profile: {self.profile.name}',
+            f'Slots: {used}/{len(inventory)}',
+            f'Selected: {self.selected + 1}',
+            f'Item: {'-' if isinstance(selected_item, Empty) else selected_item.name}',
+        ])
+
+    def check_slot(self, slot: int | None) -> bool:
+        """Check if a slot number is valid, setting the message if not."""
+        if slot is None or not 1 <= slot <= len(self.profile.inventory):
+            self.message = 'Invalid slot.'
+            return False
+        return True
+
+
+@InventoryView.add_command('exit', 'quit', 'back')
+def exit_inventory(self):
+    """Exit the inventory view."""
+    self.running = False
+
+@InventoryView.add_command('select <slot:int>')
+def select_slot(self, slot: int):
+    """Select an inventory slot."""
+    if self.check_slot(slot):
+        self.selected = slot - 1
+
+@InventoryView.add_command('swap <first:int> <second:int>')
+def swap_slots(self, first: int, second: int):
+    """Swap the items in two inventory slots."""
+    if self.check_slot(first) and self.check_slot(second):
+        inventory = self.profile.inventory
+        inventory[first - 1], inventory[second - 1] = \
+            inventory[second - 1], inventory[first - 1]
+        self.selected = second - 1
+        self.instance.mark_changed()
+        self.instance.events.emit('item_moved')
+        self.message = f'Swapped slots {first} and {second}.'
+
+
+class StatusView(View):
+    """
+    Status view, used to show a summary of a profile.
+    """
+    engine = CliEngine()
+    add_command = engine.add_command
+    parse = engine.parse
+    commands = engine.commands
+    documentation = engine.documentation
+
+    def draw(self):
+        """Draw the status panel."""
+        profile = self.profile
+        if profile.last_update:
+            last_update = datetime.fromtimestamp(profile.last_update)
+            last_update = last_update.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            last_update = 'never'
+        used = sum(not isinstance(item, Empty) for item in profile.inventory)
+        self.screen.draw_text(0, 0, f'Status of {profile.name}',
+                              get_color('title'))
+        self.draw_panel(1, 0, min(self.screen.width, 48), 'Profile', [
+            f'Name: {profile.name}',
+            f'Last update: {last_update}',
+            f'Inventory: {used}/{profile.inventory_size} slots used',
+        ])
+
+
+@StatusView.add_command('exit', 'quit', 'back')
+def exit_status(self):
+    """Exit the status view."""
+    self.running = False
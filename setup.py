@@ -2,7 +2,28 @@
 Setup file for mathemagician to allow installation and access via pip.
 """
 
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+
 from setuptools import setup
+from setuptools.command.build_py import build_py
+
+
+class BuildPyWithDataPack(build_py):
+    """Build command that also packs the game data into a single file."""
+
+    def run(self):
+        super().run()
+        # Load the builder by path to avoid importing the whole package.
+        spec = spec_from_file_location(
+            'mathemagician_datapack', Path('mathemagician') / 'datapack.py',
+        )
+        datapack = module_from_spec(spec)
+        spec.loader.exec_module(datapack)
+        output = Path(self.build_lib) / 'mathemagician' / datapack.PACK_NAME
+        output.parent.mkdir(parents=True, exist_ok=True)
+        datapack.build_pack(Path('mathemagician') / 'data', output)
+
 
 with open('README.md') as file:
     long_description = file.read()
@@ -34,4 +55,5 @@ setup(
         'Topic :: Terminals',
     ],
     install_requires=install_requires,
+    cmdclass={'build_py': BuildPyWithDataPack},
 )
@@ -0,0 +1,103 @@
+"""
+Tests for the expression evaluator and the submission sandbox.
+"""
+
+from fractions import Fraction
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from mathemagician import evaluator
+from mathemagician.evaluator import (
+    ExpressionError, SandboxError, SandboxPool, evaluate_expression,
+)
+
+FRAME_ESCAPE = '''
+def solve():
+    def gen():
+        yield
+    g = gen()
+    g.send(None)
+    builtins = g.gi_frame.f_back.f_back.f_globals['builtins']
+    return builtins.open('/etc/hostname').read()
+'''
+
+FORMAT_ESCAPE = '''
+def solve():
+    def gen():
+        yield
+    g = gen()
+    return '{0.gi_frame.f_back}'.format(g)
+'''
+
+TRACEBACK_ESCAPE = '''
+def solve():
+    try:
+        1 / 0
+    except ZeroDivisionError as error:
+        return error.with_traceback(None).tb_frame
+'''
+
+COROUTINE_ESCAPE = '''
+def solve():
+    async def coroutine():
+        pass
+    running = coroutine()
+    try:
+        return running.cr_frame.f_globals
+    finally:
+        running.close()
+'''
+
+
+class ExpressionTest(TestCase):
+    def test_exact(self):
+        self.assertEqual(evaluate_expression('1/2 + 1/3'), Fraction(5, 6))
+        self.assertEqual(evaluate_expression('0.1 * 10'), 1)
+
+    def test_rejected(self):
+        for source in ['__import__("os")', 'x.y', '"a"', '2 ** 100000', '1 / 0']:
+            with self.subTest(source=source):
+                with self.assertRaises(ExpressionError):
+                    evaluate_expression(source)
+
+
+class SandboxTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = SandboxPool(workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_run(self):
+        source = 'def solve(n):\n    return sum(range(n)), Fraction(1, n)\n'
+        self.assertEqual(self.pool.run(source, 'solve', (4,)), (6, Fraction(1, 4)))
+
+    def test_errors(self):
+        with self.assertRaises(SandboxError):
+            self.pool.run('def solve():\n    return 1 / 0\n', 'solve')
+        with self.assertRaises(SandboxError):
+            self.pool.run('def other():\n    pass\n', 'solve')
+
+    def test_rejected_submissions(self):
+        for source in [FRAME_ESCAPE, FORMAT_ESCAPE, TRACEBACK_ESCAPE, COROUTINE_ESCAPE,
+                       'import os\n', 'def solve():\n    return ().__class__\n',
+                       'def solve():\n    return str.format_map\n']:
+            with self.subTest(source=source):
+                with self.assertRaisesRegex(SandboxError, 'not allowed'):
+                    self.pool.run(source, 'solve')
+
+    def test_worker_refuses_escapes(self):
+        # Submissions that get past the check are stopped in the worker.
+        with patch.object(evaluator, '_check_submission', lambda source: None):
+            for source in [FRAME_ESCAPE, FORMAT_ESCAPE, COROUTINE_ESCAPE]:
+                with self.subTest(source=source):
+                    with self.assertRaisesRegex(SandboxError, 'Operation not allowed'):
+                        self.pool.run(source, 'solve')
+        # The worker still runs submissions after refusing one.
+        self.assertEqual(self.pool.run('def solve():\n    return 1\n', 'solve'), 1)
+
+
+if __name__ == '__main__':
+    main()
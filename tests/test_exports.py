@@ -0,0 +1,24 @@
+"""
+Tests for the lazy exports of the package.
+"""
+
+from importlib import import_module
+from unittest import TestCase, main
+
+import mathemagician
+
+
+class ExportsTest(TestCase):
+    def test_exports_match_all(self):
+        for module_name, names in mathemagician.__exports__.items():
+            with self.subTest(module=module_name):
+                module = import_module(f'mathemagician.{module_name}')
+                self.assertCountEqual(names, module.__all__)
+
+    def test_exports_import(self):
+        from mathemagician import EXPORTS_DIR, STATS_LOCK, in_session, run_benchmark
+        self.assertFalse(in_session())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""
+Tests for profile locks.
+"""
+
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from mathemagician import locks
+
+
+class ProcessAliveTest(TestCase):
+    def test_windows_does_not_kill(self):
+        # On Windows, os.kill terminates the process instead of probing it.
+        with patch.object(locks.os, 'name', 'nt'), \
+                patch.object(locks, 'kill') as kill:
+            self.assertTrue(locks._process_alive(12345))
+        kill.assert_not_called()
+
+    def test_posix_probe(self):
+        with patch.object(locks.os, 'name', 'posix'), \
+                patch.object(locks, 'kill', side_effect=ProcessLookupError) as kill:
+            self.assertFalse(locks._process_alive(12345))
+        kill.assert_called_once_with(12345, 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Tests for the number theory kernel, against brute force.
+"""
+
+from math import gcd, prod
+from random import Random
+from unittest import TestCase, main
+
+from mathemagician.numbertheory import (
+    SPF_LIMIT, divisor_sum, divisors, factorize, factorize_many, gcd_many,
+    is_prime, is_prime_many, lcm_many, nth_prime, primes_between, primes_up_to,
+    totient,
+)
+
+
+def brute_is_prime(number: int) -> bool:
+    if number < 2:
+        return False
+    divisor = 2
+    while divisor * divisor <= number:
+        if number % divisor == 0:
+            return False
+        divisor += 1
+    return True
+
+
+def brute_factorize(number: int) -> dict[int, int]:
+    factors = {}
+    divisor = 2
+    while divisor * divisor <= number:
+        while number % divisor == 0:
+            factors[divisor] = factors.get(divisor, 0) + 1
+            number //= divisor
+        divisor += 1
+    if number > 1:
+        factors[number] = factors.get(number, 0) + 1
+    return factors
+
+
+class NumberTheoryTest(TestCase):
+    def setUp(self):
+        self.random = Random(0)
+
+    def test_is_prime(self):
+        for number in range(-2, 5000):
+            self.assertEqual(is_prime(number), brute_is_prime(number), number)
+        numbers = [self.random.randrange(SPF_LIMIT - 1000, 1 << 34) for _ in range(300)]
+        self.assertEqual(is_prime_many(numbers), [*map(brute_is_prime, numbers)])
+
+    def test_factorize(self):
+        for number in range(1, 5000):
+            self.assertEqual(factorize(number), brute_factorize(number), number)
+        # Around the end of the smallest prime factor table and past it.
+        numbers = [*range(SPF_LIMIT - 50, SPF_LIMIT + 50),
+                   *(self.random.randrange(1, 1 << 36) for _ in range(300))]
+        self.assertEqual(factorize_many(numbers), [*map(brute_factorize, numbers)])
+        for number in numbers[::10]:
+            self.assertEqual(factorize(number), brute_factorize(number), number)
+
+    def test_factorize_large(self):
+        mersenne = 2 ** 89 - 1
+        cases = [
+            {2147483647: 1, 2305843009213693951: 1},
+            {3: 1, mersenne: 2},
+            {5: 1, mersenne: 3},
+            {2147483647: 3, 2305843009213693951: 2},
+            {1009: 6, 1013: 1},
+            {mersenne: 6},
+        ]
+        for factors in cases:
+            number = prod(prime ** exponent for prime, exponent in factors.items())
+            self.assertEqual(factorize(number), factors)
+
+    def test_factorize_invalid(self):
+        for number in [0, -1]:
+            with self.assertRaises(ValueError):
+                factorize(number)
+        with self.assertRaises(ValueError):
+            factorize_many([1, 0])
+
+    def test_primes(self):
+        brute = [number for number in range(3000) if brute_is_prime(number)]
+        self.assertEqual(list(primes_up_to(2999)), brute)
+        self.assertEqual([nth_prime(index) for index in range(1, 101)], brute[:100])
+        for start, stop in [(0, 3000), (1, 2), (2, 3), (100, 100), (997, 1010)]:
+            expected = [number for number in brute if start <= number < stop]
+            self.assertEqual(list(primes_between(start, stop)), expected)
+
+    def test_primes_between_past_sieve(self):
+        for start in [SPF_LIMIT - 500, 3 * SPF_LIMIT, (1 << 32) - 1000]:
+            stop = start + 1500
+            expected = [number for number in range(start, stop) if brute_is_prime(number)]
+            self.assertEqual(list(primes_between(start, stop)), expected)
+
+    def test_functions(self):
+        for number in range(1, 500):
+            found = [divisor for divisor in range(1, number + 1) if number % divisor == 0]
+            self.assertEqual(divisors(number), found)
+            self.assertEqual(divisor_sum(number), sum(found))
+            self.assertEqual(divisor_sum(number, 0), len(found))
+            coprime = sum(gcd(number, other) == 1 for other in range(1, number + 1))
+            self.assertEqual(totient(number), coprime)
+
+    def test_gcd_lcm_many(self):
+        firsts = [self.random.randrange(1, 2000) for _ in range(300)]
+        seconds = [self.random.randrange(1, 2000) for _ in range(300)]
+        divisors = gcd_many(firsts, seconds)
+        multiples = lcm_many(firsts, seconds)
+        for first, second, divisor, multiple in zip(firsts, seconds, divisors, multiples):
+            common = [number for number in range(1, min(first, second) + 1)
+                      if first % number == 0 and second % number == 0]
+            self.assertEqual(divisor, max(common))
+            self.assertEqual(multiple * divisor, first * second)
+
+
+if __name__ == '__main__':
+    main()
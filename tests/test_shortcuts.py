@@ -0,0 +1,130 @@
+"""
+Tests for command chaining, aliases and macros.
+"""
+
+from unittest import TestCase, main
+
+from mathemagician.cliengine import CliEngine, _takes_rest
+from mathemagician.shortcuts import Shortcuts
+
+
+def make_target() -> tuple[type, list]:
+    """Make a command target class that records the calls it gets."""
+    calls = []
+
+    class Target:
+        engine = CliEngine()
+        add_command = engine.add_command
+        parse = engine.parse
+
+    @Target.add_command('add <count:int>')
+    def add(self, count: int):
+        calls.append(('add', count))
+
+    @Target.add_command('say <message:text>')
+    def say(self, message: str):
+        calls.append(('say', message))
+
+    @Target.add_command('reset')
+    def reset(self):
+        calls.append(('reset',))
+
+    return Target, calls
+
+
+class ChainingTest(TestCase):
+    def setUp(self):
+        self.target_class, self.calls = make_target()
+        self.target = self.target_class()
+
+    def test_takes_rest(self):
+        self.assertTrue(_takes_rest('say <message:text>'))
+        self.assertTrue(_takes_rest('note [message:text]'))
+        self.assertFalse(_takes_rest('add <count:int>'))
+        self.assertFalse(_takes_rest('say <message:text> now'))
+
+    def test_chain(self):
+        self.target.parse(self.target, 'add 1; reset ;; add 2;')
+        self.assertEqual(self.calls, [('add', 1), ('reset',), ('add', 2)])
+
+    def test_text_takes_rest(self):
+        self.target.parse(self.target, 'add 1; say a; b; add 2')
+        self.assertEqual(self.calls, [('add', 1), ('say', 'a; b; add 2')])
+
+    def test_unknown_skipped(self):
+        self.target.parse(self.target, 'jump; add 3')
+        self.assertEqual(self.calls, [('add', 3)])
+
+    def test_compile(self):
+        calls = self.target_class.engine.compile('add 1; reset')
+        self.assertEqual([(format_, kwargs) for format_, _, kwargs in calls],
+                         [('add <count:int>', {'count': 1}), ('reset', {})])
+        with self.assertRaises(ValueError):
+            self.target_class.engine.compile('add 1; jump')
+
+
+class ShortcutsTest(TestCase):
+    def setUp(self):
+        self.target_class, self.calls = make_target()
+        self.target = self.target_class()
+        self.changes = 0
+        self.target.shortcuts = Shortcuts(self.target_class.engine,
+                                          on_change=self.count_change)
+
+    def count_change(self):
+        self.changes += 1
+
+    def test_alias(self):
+        self.target.shortcuts.define_alias('five', 'add 5')
+        self.target.shortcuts.define_alias('plus', 'add')
+        self.target.parse(self.target, 'five; plus 2')
+        self.assertEqual(self.calls, [('add', 5), ('add', 2)])
+        self.assertEqual(self.changes, 2)
+
+    def test_macro(self):
+        self.target.shortcuts.define_alias('five', 'add 5')
+        self.target.shortcuts.define_macro('twice', 'five; five; say done')
+        self.target.parse(self.target, 'twice; reset')
+        self.assertEqual(self.calls, [('add', 5), ('add', 5), ('say', 'done'),
+                                      ('reset',)])
+
+    def test_invalid(self):
+        shortcuts = self.target.shortcuts
+        with self.assertRaises(ValueError):
+            shortcuts.define_macro('bad', 'add 1; jump')
+        with self.assertRaises(ValueError):
+            shortcuts.define_alias('add', 'reset')
+        self.assertEqual(shortcuts.macros, {})
+        self.assertEqual(self.changes, 0)
+
+    def test_recompile(self):
+        shortcuts = self.target.shortcuts
+        shortcuts.define_alias('step', 'add 1')
+        shortcuts.define_macro('run', 'step; step')
+        # Redefining an alias recompiles the macros using it.
+        self.assertEqual(shortcuts.define_alias('step', 'add 2'), {})
+        self.target.parse(self.target, 'run')
+        self.assertEqual(self.calls, [('add', 2), ('add', 2)])
+        # Removing it makes them invalid, and defining it again fixes them.
+        errors = shortcuts.remove(shortcuts.aliases, 'step')
+        self.assertEqual([*errors], ['run'])
+        self.assertEqual(shortcuts.invalid(), {'run'})
+        shortcuts.define_alias('step', 'reset')
+        self.assertEqual(shortcuts.invalid(), set())
+        self.calls.clear()
+        self.target.parse(self.target, 'run')
+        self.assertEqual(self.calls, [('reset',), ('reset',)])
+
+    def test_remove_macro(self):
+        # Macros using a removed macro become invalid and cannot be used.
+        shortcuts = self.target.shortcuts
+        shortcuts.define_macro('inner', 'add 1')
+        shortcuts.define_macro('outer', 'inner; inner')
+        errors = shortcuts.remove(shortcuts.macros, 'inner')
+        self.assertEqual([*errors], ['outer'])
+        with self.assertRaises(ValueError):
+            shortcuts.define_macro('later', 'outer')
+
+
+if __name__ == '__main__':
+    main()